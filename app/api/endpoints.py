@@ -20,7 +20,15 @@ from app.services.websocket_service import ws_manager
 from app.services.trade_service import process_orders, store_trades
 from app.services.account_service import execute_account_fetcher
 from app.services.order_service import execute_order_fetcher
-from app.api.routes import accounts, orders, servers, websocket, manual_orders
+from app.api.routes import (
+    accounts,
+    orders,
+    servers,
+    websocket,
+    manual_orders,
+    metrics,
+    trades,
+)
 
 logger = logging.getLogger(__name__)
 security = HTTPBearer()
@@ -38,3 +46,7 @@ router.include_router(servers.router, prefix="/servers", tags=["servers"])
 router.include_router(
     manual_orders.router, prefix="/manual-orders", tags=["manual-orders"]
 )
+
+router.include_router(trades.router, prefix="/trades", tags=["trades"])
+
+router.include_router(metrics.router, prefix="/internal", tags=["internal"])
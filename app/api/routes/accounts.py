@@ -6,14 +6,19 @@ from app.core.security import create_session_token
 from app.models.trade import Credentials, AccountListResponse
 from app.services.websocket_service import ws_manager
 from app.services.account_service import execute_account_fetcher
+from app.services.account_cache_service import account_cache
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
 @router.post("", response_model=AccountListResponse)
-async def get_accounts(credentials: Credentials):
-    """Get list of available trading accounts"""
+async def get_accounts(credentials: Credentials, refresh: bool = False):
+    """Get list of available trading accounts
+
+    Account lists are cached briefly per credential fingerprint so repeated
+    calls skip the Rithmic login. Pass `refresh=true` to bypass the cache.
+    """
     try:
         # Validate server configuration
         with open("server_configurations.json", "r") as f:
@@ -32,8 +37,21 @@ async def get_accounts(credentials: Credentials):
                 detail=f"Invalid location for server type {credentials.server_type}. Available locations: {available_locations}",
             )
 
-        # Execute account list fetcher
-        success, message, accounts = await execute_account_fetcher(credentials)
+        cached_accounts = None if refresh else account_cache.get(credentials)
+        if cached_accounts is not None:
+            logger.info("Serving account list from cache")
+            success, message, accounts = (
+                True,
+                f"Successfully retrieved {len(cached_accounts)} accounts",
+                cached_accounts,
+            )
+        else:
+            # Execute account list fetcher
+            success, message, accounts = await execute_account_fetcher(credentials)
+            if success:
+                account_cache.set(credentials, accounts)
+            else:
+                account_cache.invalidate(credentials)
 
         # If not successful, return error response
         if not success:
@@ -50,7 +68,7 @@ async def get_accounts(credentials: Credentials):
         token = create_session_token(credentials.userId, session_id)
 
         # Store session state
-        ws_manager.update_session_state(
+        await ws_manager.update_session_state(
             session_id, status="initialized", credentials=credentials.dict()
         )
 
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Header, HTTPException
+import hmac
+from typing import Optional
+from app.core.config import settings
+from app.db.metrics import query_metrics
+
+router = APIRouter()
+
+
+def _check_token(token: Optional[str]) -> None:
+    """Metrics are only served once METRICS_TOKEN is set, to callers sending it"""
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    if not hmac.compare_digest(token or "", settings.METRICS_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid metrics token")
+
+
+@router.get("/metrics")
+async def get_metrics(x_metrics_token: Optional[str] = Header(None)):
+    """Query latency, rows, bytes and pool wait metrics of this process"""
+    _check_token(x_metrics_token)
+    return {"database": query_metrics.snapshot()}
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(x_metrics_token: Optional[str] = Header(None)):
+    """Most recent queries slower than DB_SLOW_QUERY_MS in this process"""
+    _check_token(x_metrics_token)
+    return {
+        "threshold_ms": query_metrics.slow_query_ms,
+        "queries": query_metrics.slow_query_log(),
+    }
@@ -1,5 +1,9 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException
+from fastapi.responses import StreamingResponse
+import asyncio
 import logging
+from typing import Optional
+from app.core.security import session_user_id
 from app.models.trade import (
     OrderRequest,
     OrderListResponse,
@@ -7,10 +11,13 @@ from app.models.trade import (
     ProcessStatusResponse,
 )
 from app.services.trade_service import process_orders, store_trades
+from app.services.result_store import result_store
+from app.services.singleflight import SyncInProgressError
+from app.utils.serialization import encode_message
 from app.services.order_service import (
     execute_order_fetcher,
     process_orders_async,
-    processing_tasks,
+    get_process_state,
 )
 
 logger = logging.getLogger(__name__)
@@ -74,6 +81,15 @@ async def process_orders(request: OrderRequest, background_tasks: BackgroundTask
             message="Order processing started successfully",
             process_id=process_id,
         )
+    except SyncInProgressError as e:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": str(e),
+                "kind": e.flight.kind,
+                "job_id": e.flight.job_id,
+            },
+        )
     except Exception as e:
         logger.error(f"Failed to start order processing: {e}")
         if isinstance(e, HTTPException):
@@ -84,10 +100,10 @@ async def process_orders(request: OrderRequest, background_tasks: BackgroundTask
 @router.get("/process/{process_id}", response_model=ProcessStatusResponse)
 async def get_process_status(process_id: str):
     """Get the status of an order processing task"""
-    if process_id not in processing_tasks:
+    task_info = await get_process_state(process_id)
+    if task_info is None:
         raise HTTPException(status_code=404, detail="Process not found")
 
-    task_info = processing_tasks[process_id]
     return ProcessStatusResponse(
         process_id=process_id,
         status=task_info["status"],
@@ -96,3 +112,27 @@ async def get_process_status(process_id: str):
         error=task_info["error"],
         result=task_info.get("result"),
     )
+
+
+@router.get("/results/{result_key}")
+async def get_order_results(
+    result_key: str, authorization: Optional[str] = Header(None)
+):
+    """Stream an order set fetched by a Celery task, one account per NDJSON line
+
+    Requires the session token of the user the orders were fetched for, as
+    `Authorization: Bearer <token>`; other users' sets are reported missing.
+    """
+    user_id = session_user_id(authorization)
+    loop = asyncio.get_running_loop()
+    order_set = await loop.run_in_executor(None, result_store.get, result_key)
+    if order_set is None or order_set.owner != user_id:
+        raise HTTPException(status_code=404, detail="Order results not found")
+
+    def lines():
+        for account_id in order_set:
+            yield encode_message(
+                {"account_id": account_id, "orders": order_set[account_id]}
+            ) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
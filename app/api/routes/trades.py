@@ -0,0 +1,146 @@
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+import logging
+from datetime import date
+from typing import List, Optional
+from app.core.security import session_user_id
+from app.models.trade import TradePageResponse
+from app.services.trade_query import (
+    InvalidCursorError,
+    SUMMARY_GROUPS,
+    TradeFilter,
+    fetch_calendar,
+    fetch_summary,
+    fetch_trades_page,
+    stream_trades,
+)
+from app.services.trade_stats import trade_stats
+from app.utils.serialization import encode_message
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+MAX_PAGE_SIZE = 1000
+
+
+def _trade_filter(
+    user_id: str,
+    account: Optional[List[str]],
+    instrument: Optional[str],
+    start_date: Optional[str],
+    end_date: Optional[str],
+) -> TradeFilter:
+    return TradeFilter(user_id, account or None, instrument, start_date, end_date)
+
+
+@router.get("", response_model=TradePageResponse)
+async def list_trades(
+    account: Optional[List[str]] = Query(None),
+    instrument: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    authorization: Optional[str] = Header(None),
+):
+    """
+    A page of a user's trades, newest first by default.
+    Pass `next_cursor` back as `cursor` to get the following page.
+    """
+    user_id = session_user_id(authorization)
+    try:
+        trades, next_cursor = await fetch_trades_page(
+            _trade_filter(user_id, account, instrument, start_date, end_date),
+            cursor,
+            limit,
+            descending=order == "desc",
+        )
+        return TradePageResponse(trades=trades, next_cursor=next_cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error listing trades: {e}")
+        logger.exception(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/export")
+async def export_trades(
+    account: Optional[List[str]] = Query(None),
+    instrument: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+):
+    """Stream all matching trades as NDJSON, oldest first"""
+    trade_filter = _trade_filter(
+        session_user_id(authorization), account, instrument, start_date, end_date
+    )
+
+    async def lines():
+        async for trade in stream_trades(trade_filter):
+            yield encode_message(trade) + b"\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="trades.ndjson"'},
+    )
+
+
+@router.get("/calendar")
+async def get_calendar(
+    account: Optional[List[str]] = Query(None),
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+    authorization: Optional[str] = Header(None),
+):
+    """Daily PnL, commissions and trade counts (end_day exclusive)"""
+    user_id = session_user_id(authorization)
+    try:
+        days = await fetch_calendar(user_id, account, start_day, end_day)
+        return {"days": days}
+    except Exception as e:
+        logger.error(f"Error fetching trade calendar: {e}")
+        logger.exception(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/summary")
+async def get_summary(
+    group_by: Optional[str] = Query(None, pattern=f"^({'|'.join(SUMMARY_GROUPS)})$"),
+    account: Optional[List[str]] = Query(None),
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+    authorization: Optional[str] = Header(None),
+):
+    """Totals over a period, overall or per accountNumber or instrument"""
+    user_id = session_user_id(authorization)
+    try:
+        rows = await fetch_summary(user_id, group_by, account, start_day, end_day)
+        return {"group_by": group_by, "rows": rows}
+    except Exception as e:
+        logger.error(f"Error fetching trade summary: {e}")
+        logger.exception(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/stats")
+async def get_stats(
+    account: Optional[List[str]] = Query(None),
+    instrument: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+):
+    """Win rate, profit factor, expectancy, drawdown and per-instrument stats"""
+    user_id = session_user_id(authorization)
+    try:
+        return await trade_stats.get(
+            _trade_filter(user_id, account, instrument, start_date, end_date)
+        )
+    except Exception as e:
+        logger.error(f"Error computing trade stats: {e}")
+        logger.exception(e)
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,12 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
 import logging
 from app.core.security import verify_token
-from app.services.websocket_service import ws_manager
+from app.services.websocket_service import (
+    ws_manager,
+    process_manager,
+    parse_flag,
+    parse_last_seq,
+)
 from app.services.order_service import process_websocket_data
 from starlette.websockets import WebSocketState
 import asyncio
@@ -39,6 +44,7 @@ async def websocket_endpoint(websocket: LoggingWebSocket, session_id: str):
         # Add connection to manager (this will handle the accept)
         try:
             await ws_manager.connect(websocket, session_id)
+            process_manager.keep_alive(session_id)
             logger.info(
                 f"WebSocket connection established and managed for session {session_id}"
             )
@@ -64,12 +70,58 @@ async def websocket_endpoint(websocket: LoggingWebSocket, session_id: str):
 
         while True:
             try:
-                data = await asyncio.wait_for(websocket.receive_json(), timeout=30)
+                # Liveness is handled by the heartbeat, which closes idle
+                # sockets and so ends this wait
+                data = await websocket.receive_json()
                 logger.debug(
                     f"Received WebSocket data for session {session_id}: {data}"
                 )
+                ws_manager.touch(websocket)
 
-                if data.get("type") == "init":
+                if data.get("type") == "pong":
+                    ws_manager.handle_pong(websocket, data.get("id"))
+                elif data.get("type") == "ping":
+                    ws_manager.send_to_client(
+                        websocket, {"type": "pong", "id": data.get("id")}
+                    )
+                elif data.get("type") == "options":
+                    # Client capability negotiation
+                    options = ws_manager.set_client_options(
+                        websocket,
+                        chunked_orders=parse_flag(data, "chunked_orders"),
+                        batch_order_updates=parse_flag(data, "batch_order_updates"),
+                        heartbeat=parse_flag(data, "heartbeat"),
+                        encoding=data.get("encoding"),
+                        compression=data.get("compression"),
+                        order_layout=data.get("order_layout"),
+                    )
+                    ws_manager.send_to_client(
+                        websocket, {"type": "options_ack", **options}
+                    )
+                elif data.get("type") == "status":
+                    ws_manager.send_to_client(
+                        websocket,
+                        {
+                            "type": "process_status",
+                            **process_manager.status(session_id),
+                        },
+                    )
+                elif data.get("type") == "cancel":
+                    cancelled = process_manager.cancel(
+                        session_id, data.get("reason") or "cancelled by client"
+                    )
+                    ws_manager.send_to_client(
+                        websocket,
+                        {
+                            "type": "process_status",
+                            "cancelled": cancelled,
+                            **process_manager.status(session_id),
+                        },
+                    )
+                elif data.get("type") == "resume":
+                    # Client asks to be brought up to date after a gap
+                    ws_manager.resync(websocket, parse_last_seq(data.get("last_seq")))
+                elif data.get("type") == "init":
                     # Verify token
                     token = data.get("token")
                     if not token:
@@ -86,6 +138,12 @@ async def websocket_endpoint(websocket: LoggingWebSocket, session_id: str):
                         await websocket.close(code=4001, reason="Invalid token")
                         return
 
+                    ws_manager.set_client_options(
+                        websocket,
+                        chunked_orders=parse_flag(data, "chunked_orders"),
+                        batch_order_updates=parse_flag(data, "batch_order_updates"),
+                    )
+
                     # Add userId from token to the data
                     data["userId"] = payload["user_id"]
                     logger.debug(f"Added userId to data: {data['userId']}")
@@ -100,12 +158,23 @@ async def websocket_endpoint(websocket: LoggingWebSocket, session_id: str):
                         await websocket.close(code=4002, reason="No accounts selected")
                         return
 
+                    if process_manager.is_running(session_id):
+                        logger.info(f"Process already running for session {session_id}")
+                        ws_manager.send_to_client(
+                            websocket,
+                            {
+                                "type": "process_status",
+                                **process_manager.status(session_id),
+                            },
+                        )
+                        continue
+
                     logger.info(
                         f"Starting process with accounts: {selected_accounts} for session {session_id}"
                     )
 
                     # Get session state
-                    state = ws_manager.get_session_state(session_id)
+                    state = await ws_manager.get_session_state(session_id)
                     if not state:
                         logger.error(f"No session state found for session {session_id}")
                         await websocket.close(
@@ -114,21 +183,20 @@ async def websocket_endpoint(websocket: LoggingWebSocket, session_id: str):
                         return
 
                     # Update session state
-                    ws_manager.update_session_state(
+                    await ws_manager.update_session_state(
                         session_id, status="running", accounts=selected_accounts
                     )
 
-                    # Start processing
-                    await process_websocket_data(session_id, selected_accounts, data)
+                    # Start processing in the background so this loop keeps
+                    # reading control messages
+                    process_manager.spawn(
+                        session_id,
+                        process_websocket_data(session_id, selected_accounts, data),
+                    )
                 else:
                     # For other message types, broadcast to all clients in the session
                     await ws_manager.broadcast_to_session(session_id, data)
 
-            except asyncio.TimeoutError:
-                logger.warning(f"WebSocket receive timeout for session {session_id}")
-                if websocket.client_state == WebSocketState.DISCONNECTED:
-                    break
-                continue
             except WebSocketDisconnect:
                 logger.info(f"Client disconnected from session {session_id}")
                 break
@@ -137,6 +205,11 @@ async def websocket_endpoint(websocket: LoggingWebSocket, session_id: str):
                     f"Error processing message for session {session_id}: {str(e)}",
                     exc_info=True,
                 )
+                if (
+                    websocket.client_state == WebSocketState.DISCONNECTED
+                    or not ws_manager.is_connected(websocket)
+                ):
+                    break
                 await ws_manager.broadcast_log(session_id, str(e), level="error")
 
     except WebSocketDisconnect:
@@ -152,3 +225,5 @@ async def websocket_endpoint(websocket: LoggingWebSocket, session_id: str):
     finally:
         logger.info(f"Cleaning up connection for session {session_id}")
         await ws_manager.disconnect(websocket, session_id)
+        if not ws_manager.has_local_clients(session_id):
+            process_manager.cancel_later(session_id)
@@ -1,7 +1,46 @@
 from celery import Celery
 from celery.schedules import crontab
+from datetime import datetime, timedelta
+from kombu import Queue
 import os
 
+# Queues, so that interactive work never waits behind long replays:
+# - accounts: account listing, answered in about a second
+# - sync: order fetches for recent dates, and merging fetched orders
+# - backfill: full-history replays
+ACCOUNTS_QUEUE = "accounts"
+SYNC_QUEUE = "sync"
+BACKFILL_QUEUE = "backfill"
+
+# Per-account fetches reaching further back than this go to the backfill queue
+BACKFILL_AFTER_DAYS = int(os.getenv("CELERY_BACKFILL_AFTER_DAYS", "7"))
+
+# Redis broker priorities: 0 is served first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 3
+PRIORITY_LOW = 6
+
+
+def is_backfill(start_date: str) -> bool:
+    """Whether a fetch starting at start_date (YYYYMMDD) is a history backfill"""
+    try:
+        start = datetime.strptime(start_date, "%Y%m%d")
+    except (TypeError, ValueError):
+        return False
+    return datetime.utcnow() - start > timedelta(days=BACKFILL_AFTER_DAYS)
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """Route each task to its queue, with a priority"""
+    if name == "app.tasks.fetch_accounts":
+        return {"queue": ACCOUNTS_QUEUE, "priority": PRIORITY_HIGH}
+    if name == "app.tasks.fetch_account_orders":
+        start_date = kwargs.get("start_date") or (args[2] if len(args) > 2 else None)
+        if is_backfill(start_date):
+            return {"queue": BACKFILL_QUEUE, "priority": PRIORITY_LOW}
+    return {"queue": SYNC_QUEUE, "priority": PRIORITY_NORMAL}
+
+
 # Initialize Celery app
 celery_app = Celery(
     "deltalytix",
@@ -19,6 +58,18 @@ celery_app.conf.update(
     enable_utc=True,
     task_track_started=True,
     task_time_limit=300,  # 5 minutes
+    task_queues=[Queue(ACCOUNTS_QUEUE), Queue(SYNC_QUEUE), Queue(BACKFILL_QUEUE)],
+    task_default_queue=SYNC_QUEUE,
+    task_routes=(route_task,),
+    task_default_priority=PRIORITY_NORMAL,
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "queue_order_strategy": "priority",
+    },
+    # Long replays: reserve one task at a time and acknowledge it once done,
+    # so a busy worker does not hold back tasks another worker could run
+    worker_prefetch_multiplier=int(os.getenv("CELERY_PREFETCH_MULTIPLIER", "1")),
+    task_acks_late=True,
 )
 
 # Optional: Configure periodic tasks if needed
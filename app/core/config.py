@@ -14,6 +14,49 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = os.getenv("POSTGRES_PASSWORD", "")
     POSTGRES_HOST: str = os.getenv("POSTGRES_HOST", "")
     POSTGRES_PORT: str = os.getenv("POSTGRES_PORT", "6543")
+    # Connection pool per process; checkouts wait up to the timeout when all
+    # connections are in use. Connections idle for longer than the health
+    # check interval are pinged before reuse, and replaced after max lifetime.
+    DB_POOL_MIN_SIZE: int = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+    DB_POOL_MAX_SIZE: int = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    DB_POOL_TIMEOUT_SECONDS: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+    DB_CONN_HEALTHCHECK_IDLE_SECONDS: float = float(
+        os.getenv("DB_CONN_HEALTHCHECK_IDLE_SECONDS", "30")
+    )
+    DB_CONN_MAX_LIFETIME_SECONDS: float = float(
+        os.getenv("DB_CONN_MAX_LIFETIME_SECONDS", "1800")
+    )
+    # Time zone in which trades are grouped into trading days for rollups
+    TRADING_DAY_TIMEZONE: str = os.getenv("TRADING_DAY_TIMEZONE", "UTC")
+
+    # Computed trade statistics per user and filter, dropped as soon as the
+    # user's trades change
+    STATS_CACHE_TTL_SECONDS: int = int(os.getenv("STATS_CACHE_TTL_SECONDS", "600"))
+    STATS_CACHE_MAX_ENTRIES: int = int(os.getenv("STATS_CACHE_MAX_ENTRIES", "1000"))
+
+    # Queries at least this slow are kept in the slow query log (most recent
+    # DB_SLOW_QUERY_LOG_SIZE), served with query metrics on /internal/metrics
+    DB_SLOW_QUERY_MS: float = float(os.getenv("DB_SLOW_QUERY_MS", "500"))
+    DB_SLOW_QUERY_LOG_SIZE: int = int(os.getenv("DB_SLOW_QUERY_LOG_SIZE", "100"))
+    # Required in the X-Metrics-Token header of /internal/metrics; the
+    # metrics endpoints are disabled while it is unset
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+
+    # Optional write-behind buffer collecting trades from all sessions of a
+    # process into one transaction, flushed at max rows or after the interval
+    TRADE_WRITE_BUFFER_ENABLED: bool = os.getenv(
+        "TRADE_WRITE_BUFFER_ENABLED", "false"
+    ).lower() in ("1", "true", "yes")
+    TRADE_WRITE_BUFFER_MAX_ROWS: int = int(
+        os.getenv("TRADE_WRITE_BUFFER_MAX_ROWS", "5000")
+    )
+    TRADE_WRITE_BUFFER_FLUSH_INTERVAL: float = float(
+        os.getenv("TRADE_WRITE_BUFFER_FLUSH_INTERVAL", "0.5")
+    )
+    # Server-side prepared statements for hot queries: "on", "off" or "auto"
+    # (off on the Supabase transaction pooler port, 6543, which does not keep
+    # a connection's prepared statements between transactions)
+    DB_PREPARED_STATEMENTS: str = os.getenv("DB_PREPARED_STATEMENTS", "auto")
 
     # Trading settings
     USERNAME_TEST: str = os.getenv("USERNAME_TEST", "")
@@ -24,6 +67,85 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "your-secret-key")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24 hours
 
+    # Account list cache
+    ACCOUNT_CACHE_TTL_SECONDS: int = int(os.getenv("ACCOUNT_CACHE_TTL_SECONDS", "60"))
+    ACCOUNT_CACHE_MAX_ENTRIES: int = int(
+        os.getenv("ACCOUNT_CACHE_MAX_ENTRIES", "10000")
+    )
+
+    # A sync (user, accounts, start date) runs once across all workers;
+    # the lease expires after this long if its owner never releases it
+    SYNC_LEASE_SECONDS: int = int(os.getenv("SYNC_LEASE_SECONDS", "1800"))
+
+    # Fetched order sets handed from Celery workers to the API: "redis" or
+    # "file" (a directory shared by all containers). Redis also serves as the
+    # Celery broker and session store, so sets are only kept there briefly.
+    RESULT_STORE_BACKEND: str = os.getenv("RESULT_STORE_BACKEND", "redis")
+    RESULT_STORE_DIR: str = os.getenv("RESULT_STORE_DIR", "orders")
+    RESULT_STORE_TTL_SECONDS: int = int(
+        os.getenv("RESULT_STORE_TTL_SECONDS", str(7 * 24 * 3600))
+    )
+    RESULT_STORE_REDIS_TTL_SECONDS: int = int(
+        os.getenv("RESULT_STORE_REDIS_TTL_SECONDS", "3600")
+    )
+
+    # WebSocket settings
+    WS_MAX_MESSAGE_SIZE: int = int(os.getenv("WS_MAX_MESSAGE_SIZE", str(1024 * 1024)))
+    WS_MAX_HEADER_SIZE: int = int(os.getenv("WS_MAX_HEADER_SIZE", str(16 * 1024)))
+    WS_CONNECTION_COOLDOWN_SECONDS: float = float(
+        os.getenv("WS_CONNECTION_COOLDOWN_SECONDS", "2")
+    )
+    WS_RATE_LIMIT_MAX_ENTRIES: int = int(
+        os.getenv("WS_RATE_LIMIT_MAX_ENTRIES", "100000")
+    )
+    # Clients are pinged every interval and closed after the idle timeout
+    WS_HEARTBEAT_INTERVAL_SECONDS: float = float(
+        os.getenv("WS_HEARTBEAT_INTERVAL_SECONDS", "20")
+    )
+    WS_IDLE_TIMEOUT_SECONDS: float = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "60"))
+    WS_RESUME_MAX_DELTA_ITEMS: int = int(os.getenv("WS_RESUME_MAX_DELTA_ITEMS", "500"))
+    WS_SEND_TIMEOUT_SECONDS: float = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "5"))
+    # Per-client outbound queue; policy when full: "coalesce", "drop" or "disconnect"
+    WS_CLIENT_QUEUE_MAX_ITEMS: int = int(os.getenv("WS_CLIENT_QUEUE_MAX_ITEMS", "256"))
+    WS_SLOW_CONSUMER_POLICY: str = os.getenv("WS_SLOW_CONSUMER_POLICY", "coalesce")
+    WS_MAX_BACKLOG_SECONDS: float = float(os.getenv("WS_MAX_BACKLOG_SECONDS", "30"))
+    # Frames at least this large are compressed for clients that negotiated it
+    WS_COMPRESSION_MIN_BYTES: int = int(os.getenv("WS_COMPRESSION_MIN_BYTES", "1024"))
+    # Orders per orders_chunk frame, and so per order_updates frame
+    WS_ORDERS_CHUNK_MAX_ITEMS: int = int(os.getenv("WS_ORDERS_CHUNK_MAX_ITEMS", "1000"))
+    WS_HISTORY_MAX_BYTES: int = int(
+        os.getenv("WS_HISTORY_MAX_BYTES", str(8 * 1024 * 1024))
+    )
+    WS_HISTORY_MAX_ITEMS: int = int(os.getenv("WS_HISTORY_MAX_ITEMS", "1000"))
+    WS_ORDERS_CACHE_MAX_ITEMS: int = int(
+        os.getenv("WS_ORDERS_CACHE_MAX_ITEMS", "50000")
+    )
+
+    # Session sharing across workers: "memory" (single worker) or "redis"
+    SESSION_BACKEND: str = os.getenv("SESSION_BACKEND", "memory")
+    SESSION_TTL_SECONDS: int = int(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+    # Memory backend: how long a session stays resumable after its last
+    # client leaves (the Redis backend keeps it for SESSION_TTL_SECONDS)
+    SESSION_RESUME_WINDOW_SECONDS: float = float(
+        os.getenv("SESSION_RESUME_WINDOW_SECONDS", "600")
+    )
+    SESSION_STATE_CACHE_SECONDS: float = float(
+        os.getenv("SESSION_STATE_CACHE_SECONDS", "5")
+    )
+    # Cancel a session's processing once it has had no clients for this long;
+    # negative to never cancel abandoned processing
+    SESSION_JOB_CANCEL_GRACE_SECONDS: float = float(
+        os.getenv("SESSION_JOB_CANCEL_GRACE_SECONDS", "60")
+    )
+
+    # Celery workers: warm Rithmic engines kept between tasks per process
+    WORKER_ENGINE_POOL_MAX_IDLE: int = int(
+        os.getenv("WORKER_ENGINE_POOL_MAX_IDLE", "4")
+    )
+    WORKER_ENGINE_IDLE_SECONDS: float = float(
+        os.getenv("WORKER_ENGINE_IDLE_SECONDS", "300")
+    )
+
     # CORS Settings
     BACKEND_CORS_ORIGINS: list = ["*"]  # In production, replace with specific origins
 
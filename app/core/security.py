@@ -1,4 +1,8 @@
+import base64
+import hashlib
+import hmac
 import jwt
+from cryptography.fernet import Fernet, InvalidToken
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import HTTPException
@@ -37,3 +41,47 @@ def verify_token(token: str, session_id: Optional[str] = None) -> dict:
     if session_id and payload.get("session_id") != session_id:
         raise HTTPException(status_code=401, detail="Token session mismatch")
     return payload
+
+
+def session_user_id(authorization: Optional[str]) -> str:
+    """User id from an "Authorization: Bearer <session token>" header"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Session token required")
+    user_id = decode_session_token(token).get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token: missing user_id")
+    return user_id
+
+
+def credential_fingerprint(*parts: str) -> str:
+    """Salted, non-reversible fingerprint of credential fields.
+
+    Used as a cache key so raw usernames and passwords never appear in cache
+    keys or logs.
+    """
+    message = "\x1f".join(str(part) for part in parts).encode("utf-8")
+    return hmac.new(
+        settings.SECRET_KEY.encode("utf-8"), message, hashlib.sha256
+    ).hexdigest()
+
+
+def _secret_box() -> Fernet:
+    """Fernet key derived from SECRET_KEY, separate from the JWT signing key"""
+    key = hmac.new(
+        settings.SECRET_KEY.encode("utf-8"), b"session-secrets", hashlib.sha256
+    ).digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def encrypt_secret(value: str) -> str:
+    """Encrypt a secret (e.g. a password) for storage outside this process"""
+    return _secret_box().encrypt(value.encode("utf-8")).decode("ascii")
+
+
+def decrypt_secret(token: str) -> str:
+    """Decrypt a secret encrypted with encrypt_secret"""
+    try:
+        return _secret_box().decrypt(token.encode("ascii")).decode("utf-8")
+    except InvalidToken:
+        raise ValueError("Secret cannot be decrypted, was SECRET_KEY changed?")
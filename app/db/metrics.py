@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional
+from app.core.config import settings
+
+# Upper bounds (milliseconds) of the latency histogram buckets
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Latency histogram over fixed buckets, with count, sum and max"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        index = len(LATENCY_BUCKETS_MS)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile, capped at the max"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        max_ms = round(self.max_ms, 3)
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if i < len(LATENCY_BUCKETS_MS):
+                    return min(LATENCY_BUCKETS_MS[i], max_ms)
+                return max_ms
+        return max_ms
+
+    def snapshot(self) -> dict:
+        labels = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["inf"]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class StatementMetrics:
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.rows = 0
+        self.bytes_sent = 0
+
+    def snapshot(self) -> dict:
+        return {
+            **self.latency.snapshot(),
+            "errors": self.errors,
+            "rows": self.rows,
+            "bytes_sent": self.bytes_sent,
+        }
+
+
+class QueryMetrics:
+    """Per-process query metrics, grouped by statement class
+
+    Records latency histograms, rows and bytes sent per statement, time
+    spent waiting for a pooled connection, and the most recent queries
+    slower than DB_SLOW_QUERY_MS. Safe to use from any thread.
+    """
+
+    def __init__(self, slow_query_ms: float, slow_query_log_size: int):
+        self.slow_query_ms = slow_query_ms
+        self.statements: Dict[str, StatementMetrics] = {}
+        self.pool_wait = Histogram()
+        self.slow_queries: Deque[dict] = deque(maxlen=slow_query_log_size)
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        statement: str,
+        ms: float,
+        rows: int = 0,
+        bytes_sent: int = 0,
+        error: Optional[str] = None,
+    ) -> None:
+        with self._lock:
+            metrics = self.statements.get(statement)
+            if metrics is None:
+                metrics = self.statements[statement] = StatementMetrics()
+            metrics.latency.observe(ms)
+            metrics.rows += max(rows, 0)
+            metrics.bytes_sent += bytes_sent
+            if error is not None:
+                metrics.errors += 1
+            if ms >= self.slow_query_ms:
+                self.slow_queries.append(
+                    {
+                        "statement": statement,
+                        "ms": round(ms, 3),
+                        "rows": rows,
+                        "bytes_sent": bytes_sent,
+                        "error": error,
+                        "at": time.time(),
+                    }
+                )
+
+    def record_pool_wait(self, ms: float) -> None:
+        with self._lock:
+            self.pool_wait.observe(ms)
+
+    @contextmanager
+    def timed(self, statement: str):
+        """Record the duration of a block as one query of a statement class
+
+        The yielded dict may be given "rows" and "bytes_sent" by the block.
+        """
+        stats = {"rows": 0, "bytes_sent": 0}
+        start = time.perf_counter()
+        try:
+            yield stats
+        except Exception as e:
+            self.record(
+                statement,
+                (time.perf_counter() - start) * 1000,
+                stats["rows"],
+                stats["bytes_sent"],
+                error=type(e).__name__,
+            )
+            raise
+        self.record(
+            statement,
+            (time.perf_counter() - start) * 1000,
+            stats["rows"],
+            stats["bytes_sent"],
+        )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "statements": {
+                    name: metrics.snapshot()
+                    for name, metrics in sorted(self.statements.items())
+                },
+                "pool_wait": self.pool_wait.snapshot(),
+                "slow_query_ms": self.slow_query_ms,
+                "slow_queries": list(self.slow_queries),
+            }
+
+    def slow_query_log(self) -> List[dict]:
+        with self._lock:
+            return list(self.slow_queries)
+
+
+query_metrics = QueryMetrics(settings.DB_SLOW_QUERY_MS, settings.DB_SLOW_QUERY_LOG_SIZE)
@@ -1,38 +1,230 @@
 import psycopg2
 import asyncpg
-from psycopg2.extras import RealDictCursor
+from psycopg2 import errors
+from psycopg2.extras import RealDictCursor, execute_batch
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
 from app.core.config import settings
+from app.db.metrics import query_metrics
+from app.db.statements import Statement
 
 logger = logging.getLogger(__name__)
 
+# Rows sent per round trip by execute_many
+BATCH_PAGE_SIZE = 500
+
+# Errors showing a connection's prepared statements are not what we cached:
+# the pooler moved us to another server connection, or the table changed
+POOLER_ERRORS = (errors.InvalidSqlStatementName, errors.DuplicatePreparedStatement)
+STALE_PREPARED_ERRORS = POOLER_ERRORS + (errors.FeatureNotSupported,)
+
+
+def prepared_statements_enabled() -> bool:
+    mode = settings.DB_PREPARED_STATEMENTS
+    if mode == "auto":
+        return str(settings.POSTGRES_PORT) != "6543"
+    return mode == "on"
+
 
 class DatabaseManager:
+    """PostgreSQL access for the process: a thread-safe psycopg2 pool plus an
+    asyncpg pool.
+
+    Connections are only held for one transaction and carry no session
+    state, so they are safe behind pgbouncer in transaction mode.
+    """
+
     def __init__(self):
-        self._connection = None
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._pool_lock = threading.Lock()
+        # ThreadedConnectionPool raises when exhausted; this makes callers wait
+        self._slots = threading.BoundedSemaphore(settings.DB_POOL_MAX_SIZE)
+        self._created_at: Dict[int, float] = {}
+        self._returned_at: Dict[int, float] = {}
+        self._prepared: Dict[int, Set[str]] = {}  # statement names per connection
+        self.use_prepared = prepared_statements_enabled()
         self._async_pool = None
 
-    def get_connection(self):
-        if self._connection is None or self._connection.closed:
+    def _get_pool(self) -> ThreadedConnectionPool:
+        with self._pool_lock:
+            if self._pool is None:
+                try:
+                    self._pool = ThreadedConnectionPool(
+                        settings.DB_POOL_MIN_SIZE,
+                        settings.DB_POOL_MAX_SIZE,
+                        dbname=settings.POSTGRES_DB,
+                        user=settings.POSTGRES_USER,
+                        password=settings.POSTGRES_PASSWORD,
+                        host=settings.POSTGRES_HOST,
+                        port=settings.POSTGRES_PORT,
+                        connect_timeout=10,
+                        keepalives=1,
+                        keepalives_idle=30,
+                        keepalives_interval=10,
+                        keepalives_count=5,
+                    )
+                    logger.info(
+                        f"Created PostgreSQL connection pool "
+                        f"({settings.DB_POOL_MIN_SIZE}-{settings.DB_POOL_MAX_SIZE})"
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to connect to PostgreSQL: {e}")
+                    raise
+            return self._pool
+
+    def _discard(self, pool: ThreadedConnectionPool, conn) -> None:
+        self._created_at.pop(id(conn), None)
+        self._returned_at.pop(id(conn), None)
+        self._prepared.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+
+    def _is_healthy(self, conn) -> bool:
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        created_at = self._created_at.setdefault(id(conn), now)
+        if now - created_at > settings.DB_CONN_MAX_LIFETIME_SECONDS:
+            return False
+        returned_at = self._returned_at.get(id(conn), now)
+        if now - returned_at > settings.DB_CONN_HEALTHCHECK_IDLE_SECONDS:
             try:
-                self._connection = psycopg2.connect(
-                    dbname=settings.POSTGRES_DB,
-                    user=settings.POSTGRES_USER,
-                    password=settings.POSTGRES_PASSWORD,
-                    host=settings.POSTGRES_HOST,
-                    port=settings.POSTGRES_PORT,
-                    # Connection pooling settings
-                    keepalives=1,
-                    keepalives_idle=30,
-                    keepalives_interval=10,
-                    keepalives_count=5,
-                )
-                self._connection.autocommit = False
-                logger.info("Successfully connected to PostgreSQL via pooler")
-            except Exception as e:
-                logger.error(f"Failed to connect to PostgreSQL: {e}")
-                raise
-        return self._connection
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def _checkout(self):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=settings.DB_POOL_TIMEOUT_SECONDS):
+            query_metrics.record_pool_wait((time.perf_counter() - start) * 1000)
+            raise PoolError(
+                f"No database connection available after "
+                f"{settings.DB_POOL_TIMEOUT_SECONDS} seconds"
+            )
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            while not self._is_healthy(conn):
+                logger.info("Replacing stale database connection")
+                self._discard(pool, conn)
+                conn = pool.getconn()
+            query_metrics.record_pool_wait((time.perf_counter() - start) * 1000)
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn) -> None:
+        try:
+            pool = self._get_pool()
+            if conn.closed:
+                self._discard(pool, conn)
+            else:
+                self._returned_at[id(conn)] = time.monotonic()
+                pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """A pooled connection for one transaction
+
+        The transaction is committed if the block succeeds and rolled back
+        otherwise; the connection is always returned to the pool.
+        """
+        conn = self._checkout()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error as e:
+                    logger.error(f"Rollback failed: {e}")
+            raise
+        finally:
+            self._checkin(conn)
+
+    def _prepare(self, cursor, statement: Statement) -> str:
+        """SQL to run the statement on this cursor's connection"""
+        if not self.use_prepared:
+            return statement.sql
+        prepared = self._prepared.setdefault(id(cursor.connection), set())
+        if statement.name not in prepared:
+            cursor.execute(statement.prepare_sql)
+            prepared.add(statement.name)
+        return statement.execute_sql
+
+    def _run(self, statement: Statement, run: Callable, cursor_factory) -> Any:
+        """Run a statement in its own transaction, falling back to plain SQL
+
+        If the server's prepared statements do not match what was cached for
+        the connection, the transaction is retried once after re-preparing;
+        errors that show a transaction pooler turn prepared statements off.
+        """
+        for attempt in range(2):
+            with self.connection() as conn:
+                try:
+                    with conn.cursor(
+                        cursor_factory=cursor_factory
+                    ) as cursor, query_metrics.timed(statement.name) as stats:
+                        return run(cursor, self._prepare(cursor, statement), stats)
+                except STALE_PREPARED_ERRORS as e:
+                    if attempt:
+                        raise
+                    conn.rollback()
+                    self._prepared.pop(id(conn), None)
+                    if isinstance(e, POOLER_ERRORS):
+                        logger.warning(
+                            "Prepared statements are not kept between "
+                            "transactions (transaction pooler?); disabling them"
+                        )
+                        self.use_prepared = False
+                    else:
+                        with conn.cursor() as cursor:
+                            cursor.execute("DEALLOCATE ALL")
+                        conn.commit()
+
+    def execute(
+        self,
+        statement: Statement,
+        params: Optional[Sequence] = None,
+        fetch: bool = False,
+        cursor_factory=RealDictCursor,
+    ) -> Optional[List[dict]]:
+        """Run a statement, returning its rows if fetch is set"""
+
+        def run(cursor, sql, stats):
+            cursor.execute(sql, params)
+            stats["bytes_sent"] = len(cursor.query or b"")
+            stats["rows"] = cursor.rowcount
+            return cursor.fetchall() if fetch else None
+
+        return self._run(statement, run, cursor_factory)
+
+    def execute_many(
+        self, statement: Statement, rows: Sequence[Sequence], cursor_factory=None
+    ) -> None:
+        """Run a statement for each row, sending rows in batches
+
+        Query metrics count the parameter sets sent, not the rows affected.
+        """
+
+        def run(cursor, sql, stats):
+            for start in range(0, len(rows), BATCH_PAGE_SIZE):
+                page = rows[start : start + BATCH_PAGE_SIZE]
+                execute_batch(cursor, sql, page, page_size=BATCH_PAGE_SIZE)
+                stats["bytes_sent"] += len(cursor.query or b"")
+            stats["rows"] = len(rows)
+
+        self._run(statement, run, cursor_factory)
 
     async def get_async_pool(self):
         """Get or create the async connection pool"""
@@ -46,6 +238,9 @@ class DatabaseManager:
                     port=settings.POSTGRES_PORT,
                     min_size=5,
                     max_size=20,
+                    # asyncpg caches prepared statements per connection,
+                    # which a transaction pooler does not support
+                    statement_cache_size=100 if prepared_statements_enabled() else 0,
                 )
                 logger.info("Successfully created async PostgreSQL connection pool")
             except Exception as e:
@@ -53,9 +248,12 @@ class DatabaseManager:
                 raise
         return self._async_pool
 
+    @contextmanager
     def get_cursor(self, cursor_factory=RealDictCursor):
-        """Get a cursor with the specified factory"""
-        return self.get_connection().cursor(cursor_factory=cursor_factory)
+        """A cursor on a pooled connection, in its own transaction"""
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=cursor_factory) as cursor:
+                yield cursor
 
     async def close_async_pool(self):
         """Close the async connection pool"""
@@ -64,10 +262,14 @@ class DatabaseManager:
             self._async_pool = None
 
     def close(self):
-        """Close the database connection"""
-        if self._connection is not None:
-            self._connection.close()
-            self._connection = None
+        """Close all pooled connections"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+                self._created_at.clear()
+                self._returned_at.clear()
+                self._prepared.clear()
 
 
 # Create a global instance of DatabaseManager
@@ -0,0 +1,85 @@
+import re
+from typing import NamedTuple
+
+_PLACEHOLDER = re.compile(r"%s")
+
+
+class Statement(NamedTuple):
+    """A hot query, prepared once per connection when prepared statements
+    are enabled and sent as plain SQL otherwise
+
+    `sql` uses psycopg2 `%s` placeholders.
+    """
+
+    name: str
+    sql: str
+
+    @property
+    def param_count(self) -> int:
+        return len(_PLACEHOLDER.findall(self.sql))
+
+    @property
+    def prepare_sql(self) -> str:
+        counter = iter(range(1, self.param_count + 1))
+        body = _PLACEHOLDER.sub(lambda match: f"${next(counter)}", self.sql)
+        return f"PREPARE {self.name} AS {body}"
+
+    @property
+    def execute_sql(self) -> str:
+        if not self.param_count:
+            return f"EXECUTE {self.name}"
+        return f"EXECUTE {self.name} ({', '.join(['%s'] * self.param_count)})"
+
+
+# Inserts a batch of trades given as one array per column, and adds exactly
+# the rows that were inserted (not those skipped as duplicates) to the daily
+# rollups of their user, account, instrument and trading day. The last
+# parameter is the time zone trading days are counted in.
+INSERT_TRADES_WITH_ROLLUPS = Statement(
+    "insert_trades_with_rollups",
+    """
+    WITH inserted AS (
+        INSERT INTO "Trade" (
+            "id", "userId", "accountNumber", "instrument",
+            "quantity", "entryPrice", "closePrice", "entryDate",
+            "closeDate", "side", "commission", "timeInPosition",
+            "pnl", "entryId", "closeId", "comment", "createdAt"
+        )
+        SELECT * FROM unnest(
+            %s::text[], %s::text[], %s::text[], %s::text[],
+            %s::int[], %s::text[], %s::text[], %s::text[],
+            %s::text[], %s::text[], %s::float8[], %s::float8[],
+            %s::float8[], %s::text[], %s::text[], %s::text[], %s::timestamp[]
+        )
+        ON CONFLICT ("id") DO NOTHING
+        RETURNING "userId", "accountNumber", "instrument", "entryDate",
+            "quantity", "commission", "pnl"
+    )
+    INSERT INTO "TradeDailyRollup" (
+        "userId", "accountNumber", "instrument", "day",
+        "pnl", "commission", "trades", "wins", "losses", "quantity", "updatedAt"
+    )
+    SELECT
+        "userId", "accountNumber", "instrument",
+        ("entryDate"::timestamptz AT TIME ZONE %s)::date,
+        SUM("pnl"), SUM("commission"), COUNT(*),
+        COUNT(*) FILTER (WHERE "pnl" - COALESCE("commission", 0) > 0),
+        COUNT(*) FILTER (WHERE "pnl" - COALESCE("commission", 0) < 0),
+        SUM("quantity"), now()
+    FROM inserted
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT ("userId", "accountNumber", "instrument", "day") DO UPDATE SET
+        "pnl" = "TradeDailyRollup"."pnl" + EXCLUDED."pnl",
+        "commission" = "TradeDailyRollup"."commission" + EXCLUDED."commission",
+        "trades" = "TradeDailyRollup"."trades" + EXCLUDED."trades",
+        "wins" = "TradeDailyRollup"."wins" + EXCLUDED."wins",
+        "losses" = "TradeDailyRollup"."losses" + EXCLUDED."losses",
+        "quantity" = "TradeDailyRollup"."quantity" + EXCLUDED."quantity",
+        "updatedAt" = EXCLUDED."updatedAt"
+    """,
+)
+
+SELECT_TICK_DETAILS = Statement(
+    "select_tick_details",
+    'SELECT * FROM "TickDetails"',
+)
@@ -10,6 +10,9 @@ from app.core.config import settings, verify_environment
 from app.utils.logging import setup_logging
 from app.api.endpoints import router as api_router
 from app.websocket import websocket_manager
+from app.services.redis_service import redis_manager
+from app.services.websocket_service import ws_manager
+from app.services.trade_writer import trade_writer
 
 # Set up logging
 setup_logging(
@@ -25,7 +28,7 @@ def create_application() -> FastAPI:
     app = FastAPI(
         title=settings.PROJECT_NAME,
         openapi_url=f"{settings.API_V1_STR}/openapi.json",
-        websocket_max_size=1024 * 1024,  # 1MB max message size
+        websocket_max_size=settings.WS_MAX_MESSAGE_SIZE,
     )
 
     # Set up CORS with specific WebSocket settings
@@ -48,10 +51,23 @@ def create_application() -> FastAPI:
             # Verify environment variables
             verify_environment()
             logger.info("Environment verification completed successfully")
+
+            # Share WebSocket sessions across workers
+            if settings.SESSION_BACKEND == "redis":
+                await redis_manager.initialize()
+                ws_manager.use_redis(redis_manager)
         except Exception as e:
             logger.error(f"Startup failed: {e}")
             raise
 
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        """Release shared resources"""
+        await ws_manager.shutdown()
+        await websocket_manager.shutdown()
+        await trade_writer.close()
+        await redis_manager.close()
+
     @app.get("/health")
     async def health_check():
         """Health check endpoint"""
@@ -205,3 +205,8 @@ class ProcessStatusResponse(BaseModel):
     completed_at: Optional[datetime]
     error: Optional[str]
     result: Optional[Dict]
+
+
+class TradePageResponse(BaseModel):
+    trades: List[dict] = []
+    next_cursor: Optional[str] = None
@@ -0,0 +1,71 @@
+import hmac
+import logging
+from typing import List, Optional
+from app.core.config import settings
+from app.core.security import credential_fingerprint
+from app.models.trade import Credentials, AccountData
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class AccountListCache:
+    """Short-lived cache of Rithmic account lists per credential fingerprint.
+
+    Entries are keyed by a salted hash of (username, server_type, location) and
+    also store a salted hash of the password, so a cached list is only served
+    to a caller who presents the same credentials that produced it.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self._cache = TTLCache(ttl_seconds, max_entries=max_entries)
+
+    @staticmethod
+    def cache_key(credentials: Credentials) -> str:
+        return credential_fingerprint(
+            credentials.username, credentials.server_type, credentials.location
+        )
+
+    @staticmethod
+    def _password_digest(credentials: Credentials) -> str:
+        return credential_fingerprint(credentials.username, credentials.password)
+
+    def get(self, credentials: Credentials) -> Optional[List[AccountData]]:
+        """Return cached accounts for these credentials, if still valid"""
+        entry = self._cache.get(self.cache_key(credentials))
+        if entry is None:
+            return None
+        if not hmac.compare_digest(
+            entry["password_digest"], self._password_digest(credentials)
+        ):
+            return None
+        return list(entry["accounts"])
+
+    def set(self, credentials: Credentials, accounts: List[AccountData]) -> None:
+        """Cache the account list returned by a successful login"""
+        self._cache.set(
+            self.cache_key(credentials),
+            {
+                "password_digest": self._password_digest(credentials),
+                "accounts": list(accounts),
+            },
+        )
+
+    def invalidate(self, credentials: Credentials) -> None:
+        """Forget the cached account list for these credentials
+
+        Only an entry cached for the same password is removed, so a failed
+        login with a wrong password cannot evict another caller's entry.
+        """
+        key = self.cache_key(credentials)
+        entry = self._cache.get(key)
+        if entry is not None and hmac.compare_digest(
+            entry["password_digest"], self._password_digest(credentials)
+        ):
+            self._cache.pop(key)
+
+
+# Create global instance
+account_cache = AccountListCache(
+    settings.ACCOUNT_CACHE_TTL_SECONDS, settings.ACCOUNT_CACHE_MAX_ENTRIES
+)
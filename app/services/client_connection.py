@@ -0,0 +1,324 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Union
+from fastapi import WebSocket
+from app.utils.serialization import WireCodec, decode_message, encode_message
+
+logger = logging.getLogger(__name__)
+
+# Slow-consumer policies, applied once a client's queue is full and its
+# status/log frames have already been dropped:
+#   "coalesce"   - drop queued sequenced frames and resync the client from the
+#                  last frame it actually received once it catches up
+#   "drop"       - drop the incoming frame; the client sees a sequence gap
+#                  and can ask to resume
+#   "disconnect" - close the connection
+SLOW_CONSUMER_POLICIES = ("coalesce", "drop", "disconnect")
+
+# Close code sent to clients disconnected for falling behind ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Close code sent to clients that stopped answering heartbeats
+IDLE_CLOSE_CODE = 4005
+
+# Unanswered pings remembered per client for RTT measurement
+MAX_OUTSTANDING_PINGS = 4
+
+
+@dataclass
+class OutboundFrame:
+    """One or more text frames queued for a client as a unit.
+
+    A batch of order updates expanded for a client without batched mode is a
+    single unit: all its frames share one sequence number. The same frame is
+    queued for every client of a session, and its wire form is computed once
+    per codec.
+    """
+
+    texts: List[str]
+    seq: Optional[int] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    _wire: Dict[WireCodec, List[Union[str, bytes]]] = field(
+        default_factory=dict, repr=False
+    )
+
+    @property
+    def ephemeral(self) -> bool:
+        return self.seq is None
+
+    def wire(self, codec: WireCodec) -> List[Union[str, bytes]]:
+        if codec.is_plain_json:
+            return self.texts
+        if codec not in self._wire:
+            self._wire[codec] = [codec.encode(text) for text in self.texts]
+        return self._wire[codec]
+
+
+class ClientConnection:
+    """Outbound side of one WebSocket client.
+
+    Producers call `enqueue`, which never blocks; a dedicated writer task
+    drains the bounded queue to the socket. Sequenced frames the client has
+    already received (e.g. through a resync) are skipped, so a resync and the
+    live stream can overlap safely. A frame larger than `max_message_size`
+    once encoded for this client is replaced by an error frame carrying the
+    same sequence number.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        session_id: str,
+        resync: Callable[["ClientConnection", Optional[int]], Awaitable[int]],
+        on_closed: Callable[["ClientConnection"], Awaitable[None]],
+        max_queue: int,
+        policy: str,
+        max_backlog_seconds: float,
+        send_timeout: float,
+        max_message_size: int = 0,
+    ):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(
+                f"Unknown slow-consumer policy {policy!r}, expected one of {SLOW_CONSUMER_POLICIES}"
+            )
+        self.websocket = websocket
+        self.session_id = session_id
+        self.client_id = uuid.uuid4().hex
+        self.options: dict = {}
+        self.codec = WireCodec()
+        self.last_seq: Optional[int] = None
+        self.dropped = 0
+        self.connected_at = time.monotonic()
+        self.last_seen = self.connected_at
+        self.rtt: Optional[float] = None
+        self.answered_ping = False
+        self._ping_id = 0
+        self._pings: Dict[int, float] = {}
+        self._resync = resync
+        self._on_closed = on_closed
+        self._max_queue = max_queue
+        self._policy = policy
+        self._max_backlog_seconds = max_backlog_seconds
+        self._send_timeout = send_timeout
+        self._max_message_size = max_message_size
+        self._queue: Deque[OutboundFrame] = deque()
+        self._wakeup = asyncio.Event()
+        self._resync_pending = False
+        self._resync_from: Optional[int] = None
+        self._closed = False
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self, last_seq: Optional[int] = None) -> None:
+        """Start the writer, bringing the client up to date first"""
+        self.request_resync(last_seq)
+        self._writer = asyncio.create_task(self._run())
+
+    @property
+    def queue_size(self) -> int:
+        return len(self._queue)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def idle_seconds(self) -> float:
+        """Seconds since anything was last received from the client"""
+        return time.monotonic() - self.last_seen
+
+    @property
+    def heartbeat(self) -> bool:
+        """True if the client takes part in the app-level heartbeat
+
+        Either it negotiated `heartbeat` through options or it has answered
+        a ping. Older clients do neither and send nothing while a sync runs,
+        so they are never considered idle.
+        """
+        return self.answered_ping or bool(self.options.get("heartbeat"))
+
+    def touch(self) -> None:
+        """Record that the client is alive"""
+        self.last_seen = time.monotonic()
+
+    def ping(self) -> bool:
+        """Queue an application-level ping; the client answers with a pong"""
+        self._ping_id += 1
+        self._pings[self._ping_id] = time.monotonic()
+        while len(self._pings) > MAX_OUTSTANDING_PINGS:
+            del self._pings[next(iter(self._pings))]
+        return self.enqueue(
+            OutboundFrame(
+                [encode_message({"type": "ping", "id": self._ping_id}).decode("utf-8")]
+            )
+        )
+
+    def pong(self, ping_id) -> Optional[float]:
+        """Record a pong and return the round-trip time, None if unknown"""
+        self.touch()
+        self.answered_ping = True
+        sent_at = self._pings.pop(ping_id, None)
+        if sent_at is None:
+            return None
+        self.rtt = time.monotonic() - sent_at
+        return self.rtt
+
+    def request_resync(self, last_seq: Optional[int]) -> None:
+        """Ask the writer to resync the client from last_seq before continuing"""
+        self._resync_pending = True
+        self._resync_from = last_seq
+        self._wakeup.set()
+
+    def enqueue(self, frame: OutboundFrame) -> bool:
+        """Queue a frame for sending; returns False if it was dropped"""
+        if self._closed:
+            return False
+
+        if (
+            self._queue
+            and time.monotonic() - self._queue[0].enqueued_at
+            > self._max_backlog_seconds
+        ):
+            logger.warning(
+                f"Client in session {self.session_id} has been backlogged for over "
+                f"{self._max_backlog_seconds}s, disconnecting"
+            )
+            self._close_soon()
+            return False
+
+        if len(self._queue) >= self._max_queue and not self._make_room(frame):
+            self.dropped += 1
+            return False
+
+        self._queue.append(frame)
+        self._wakeup.set()
+        return True
+
+    def _make_room(self, frame: OutboundFrame) -> bool:
+        """Apply the slow-consumer policy; True if frame may now be queued"""
+        # Status and log frames are always the first to go
+        for index, queued in enumerate(self._queue):
+            if queued.ephemeral:
+                del self._queue[index]
+                self.dropped += 1
+                return True
+        if frame.ephemeral:
+            return False
+
+        if self._policy == "coalesce":
+            # Everything sequenced that is queued will come back via resync
+            dropped = len(self._queue)
+            self._queue.clear()
+            self.dropped += dropped
+            if not self._resync_pending:
+                self.request_resync(self.last_seq)
+            logger.info(
+                f"Coalesced {dropped} queued frames for slow client in session {self.session_id}"
+            )
+            return False
+        if self._policy == "drop":
+            return False
+
+        logger.warning(
+            f"Send queue full for client in session {self.session_id}, disconnecting"
+        )
+        self._close_soon()
+        return False
+
+    async def _run(self) -> None:
+        try:
+            while not self._closed:
+                if self._resync_pending:
+                    self._resync_pending = False
+                    synced_to = await self._resync(self, self._resync_from)
+                    if synced_to is not None:
+                        self.last_seq = max(self.last_seq or 0, synced_to)
+                    continue
+
+                if not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                frame = self._queue.popleft()
+                if (
+                    frame.seq is not None
+                    and self.last_seq is not None
+                    and frame.seq <= self.last_seq
+                ):
+                    continue
+                for data, text in zip(frame.wire(self.codec), frame.texts):
+                    await self._send(self._fit(data, text))
+                if frame.seq is not None:
+                    self.last_seq = frame.seq
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(
+                f"Error sending to client in session {self.session_id}: {type(e).__name__} {e}"
+            )
+            await self.close()
+
+    async def send_text(self, text: str) -> None:
+        """Write a JSON frame in the client's codec; only the writer should call this"""
+        await self._send(self._fit(self.codec.encode(text), text))
+
+    def _fit(self, data: Union[str, bytes], text: str) -> Union[str, bytes]:
+        """data, or an error frame in its place if it is over the size limit"""
+        limit = self._max_message_size
+        if not limit or len(data) * 4 <= limit:
+            return data
+        size = len(data) if isinstance(data, bytes) else len(data.encode("utf-8"))
+        if size <= limit:
+            return data
+        logger.warning(
+            f"Message size ({size} bytes) exceeds limit ({limit} bytes) for client in session {self.session_id}"
+        )
+        error = {
+            "type": "error",
+            "message": "Message size exceeds limit",
+            "size": size,
+            "limit": limit,
+        }
+        seq = decode_message(text).get("seq")
+        if seq is not None:
+            error["seq"] = seq
+        return self.codec.encode(encode_message(error).decode("utf-8"))
+
+    async def _send(self, data: Union[str, bytes]) -> None:
+        send = (
+            self.websocket.send_text
+            if isinstance(data, str)
+            else self.websocket.send_bytes
+        )
+        await asyncio.wait_for(send(data), timeout=self._send_timeout)
+
+    def _close_soon(self) -> None:
+        self._closed = True
+        self._queue.clear()
+        self._wakeup.set()
+        asyncio.get_running_loop().create_task(
+            self.close(code=SLOW_CONSUMER_CLOSE_CODE, reason="Client too slow")
+        )
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        """Stop the writer, close the socket and unregister the client"""
+        self._closed = True
+        self._queue.clear()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+        await self._on_closed(self)
+
+    def stop(self) -> None:
+        """Stop the writer without touching the socket"""
+        self._closed = True
+        self._queue.clear()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
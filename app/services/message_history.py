@@ -0,0 +1,86 @@
+import heapq
+from collections import deque
+from typing import Deque, Iterable, Iterator, List, NamedTuple, Optional
+
+
+class HistoryEntry(NamedTuple):
+    seq: int
+    type: Optional[str]
+    payload: bytes
+
+
+class MessageHistory:
+    """Bounded history of encoded messages for one session.
+
+    Holds at most `max_items` messages and `max_bytes` of encoded payload.
+    When a limit is exceeded, the oldest message whose type is listed in
+    `evict_first` is dropped; only when none is left is the oldest message of
+    any other type dropped. Sizes are tracked incrementally so appends are O(1)
+    amortised.
+
+    Entries carry the session sequence number they were broadcast with, which
+    must increase with every append. `covers()` tells whether every message
+    after a given sequence number is still held, i.e. whether a client can be
+    brought up to date from deltas alone.
+    """
+
+    def __init__(self, max_bytes: int, max_items: int, evict_first: Iterable[str] = ()):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.evict_first = frozenset(evict_first)
+        self._preferred: Deque[HistoryEntry] = deque()
+        self._others: Deque[HistoryEntry] = deque()
+        self.size_bytes = 0
+        self.evicted = 0
+        self.last_seq = 0
+        self.max_evicted_seq = 0
+
+    def append(self, seq: int, message_type: Optional[str], payload: bytes) -> bool:
+        """Add an encoded message, evicting older ones to stay in budget.
+
+        Returns False if the message alone exceeds the byte budget and was not
+        stored.
+        """
+        self.last_seq = seq
+        if len(payload) > self.max_bytes:
+            self.max_evicted_seq = seq
+            return False
+
+        entry = HistoryEntry(seq, message_type, payload)
+        if message_type in self.evict_first:
+            self._preferred.append(entry)
+        else:
+            self._others.append(entry)
+        self.size_bytes += len(payload)
+
+        while len(self) > self.max_items or self.size_bytes > self.max_bytes:
+            self._evict_one()
+        return True
+
+    def _evict_one(self) -> None:
+        queue = self._preferred if self._preferred else self._others
+        entry = queue.popleft()
+        self.size_bytes -= len(entry.payload)
+        self.evicted += 1
+        self.max_evicted_seq = max(self.max_evicted_seq, entry.seq)
+
+    def covers(self, after_seq: int) -> bool:
+        """True if every message with seq > after_seq is still in the history"""
+        return self.max_evicted_seq <= after_seq <= self.last_seq
+
+    def since(self, after_seq: int) -> List[HistoryEntry]:
+        """Entries with seq > after_seq, oldest first"""
+        return [entry for entry in self if entry.seq > after_seq]
+
+    def __iter__(self) -> Iterator[HistoryEntry]:
+        """Iterate entries oldest first"""
+        return heapq.merge(self._preferred, self._others)
+
+    def __len__(self) -> int:
+        return len(self._preferred) + len(self._others)
+
+    def clear(self) -> None:
+        self._preferred.clear()
+        self._others.clear()
+        self.size_bytes = 0
+        self.max_evicted_seq = self.last_seq
@@ -2,12 +2,26 @@ import logging
 import asyncio
 import json
 import os
+import time
 import uuid
-from typing import Dict, List
+from typing import Dict, List, Optional
 from fastapi import BackgroundTasks
+from app.core.config import settings
 from app.models.trade import OrderRequest
-from app.services.websocket_service import ws_manager
+from app.services.redis_service import redis_manager
+from app.services.result_store import result_store
+from app.services.websocket_service import (
+    ws_manager,
+    OrdersStream,
+)
 from app.services.trade_service import process_orders, store_trades
+from app.services.singleflight import (
+    FOLLOW_POLL_SECONDS,
+    Flight,
+    SyncInProgressError,
+    sync_flights,
+    sync_key,
+)
 from app.services.rithmic_orders_retrieval import retrieve_rithmic_orders
 from datetime import datetime
 import shutil
@@ -17,6 +31,40 @@ logger = logging.getLogger(__name__)
 # Store background tasks state
 processing_tasks: Dict[str, dict] = {}
 
+# Fields of a background task that are safe to share with other workers
+PUBLIC_PROCESS_FIELDS = ("status", "started_at", "completed_at", "error", "result")
+
+# Statuses a session's job leaves in the session state when it ends
+FINISHED_JOB_STATUSES = ("completed", "error", "cancelled")
+
+# Seconds to wait, once a followed sync is released, for its session's job
+# to record how it ended
+FOLLOW_OUTCOME_TIMEOUT_SECONDS = 10
+
+
+async def save_process_state(process_id: str) -> None:
+    """Share a background task's public status so any worker can report it"""
+    if not redis_manager.is_initialized:
+        return
+    try:
+        task_info = processing_tasks[process_id]
+        await redis_manager.set_process_state(
+            process_id,
+            {field: task_info.get(field) for field in PUBLIC_PROCESS_FIELDS},
+            ttl=settings.SESSION_TTL_SECONDS,
+        )
+    except Exception as e:
+        logger.warning(f"Failed to share state of process {process_id}: {e}")
+
+
+async def get_process_state(process_id: str) -> Optional[dict]:
+    """Status of a background task started by this or any other worker"""
+    if process_id in processing_tasks:
+        return processing_tasks[process_id]
+    if redis_manager.is_initialized:
+        return await redis_manager.get_process_state(process_id)
+    return None
+
 
 async def execute_order_fetcher(request: OrderRequest, session_id: str = None) -> Dict:
     """Execute the Rithmic orders retrieval service"""
@@ -39,12 +87,48 @@ async def execute_order_fetcher(request: OrderRequest, session_id: str = None) -
         raise
 
 
+async def match_stored_orders(result_key: str, user_id: str) -> dict:
+    """Match an order set from the result store into trades and store them
+
+    The matcher reads the set one account at a time, so the whole set is
+    never decoded at once. Returns the trade and open position counts.
+    """
+    loop = asyncio.get_running_loop()
+    order_set = await loop.run_in_executor(None, result_store.get, result_key)
+    if order_set is None or order_set.owner != user_id:
+        raise LookupError(f"Order set {result_key} not found")
+
+    trades, open_positions = await loop.run_in_executor(
+        None, process_orders, order_set, user_id
+    )
+    if trades:
+        await store_trades(trades)
+    return {"trades_count": len(trades), "open_positions_count": len(open_positions)}
+
+
+async def followed_sync_status(leader_session_id: str) -> str:
+    """How the job of a followed session ended, "unknown" if it never says
+
+    The job records its final status in the session state just after it
+    releases the sync, from whichever worker runs it.
+    """
+    deadline = time.monotonic() + FOLLOW_OUTCOME_TIMEOUT_SECONDS
+    while True:
+        state = await ws_manager.get_session_state(leader_session_id)
+        if state is not None and state.status in FINISHED_JOB_STATUSES:
+            return state.status
+        if time.monotonic() >= deadline:
+            return "unknown"
+        await asyncio.sleep(FOLLOW_POLL_SECONDS)
+
+
 async def process_websocket_data(
     session_id: str, selected_accounts: List[str], data: dict
 ):
     """Process WebSocket data and handle order processing"""
+    flight = None
     try:
-        state = ws_manager.get_session_state(session_id)
+        state = await ws_manager.get_session_state(session_id)
         if not state or not state.credentials:
             raise ValueError("No session state or credentials found")
 
@@ -64,32 +148,51 @@ async def process_websocket_data(
             userId=data["userId"],  # Add userId from the data
         )
 
-        # Log start of processing
-        await ws_manager.broadcast_status(
+        # Run each sync once, even if requested from several sessions
+        flight = await sync_flights.claim(
+            sync_key(request.userId, selected_accounts, request.start_date),
+            "session",
             session_id,
-            f"Starting order processing for {len(selected_accounts)} accounts",
         )
+        if not flight.leader:
+            following = flight.kind == "session"
+            await ws_manager.broadcast_to_session(
+                session_id,
+                {
+                    "type": "sync_in_progress",
+                    "kind": flight.kind,
+                    "job_id": flight.job_id,
+                    "following": following,
+                    "message": "These accounts are already being synced",
+                },
+            )
+            if following:
+                # Attach to the running sync: relay its progress and orders
+                # into this session until it finishes, and end as it did
+                await ws_manager.follow(session_id, flight.job_id)
+                try:
+                    await sync_flights.wait(flight)
+                    status = await followed_sync_status(flight.job_id)
+                finally:
+                    await ws_manager.unfollow(session_id, flight.job_id)
+                if status != "completed":
+                    raise RuntimeError(
+                        f"The sync this session followed ended as {status}"
+                    )
+            return
 
-        # Use Rithmic orders retrieval service instead of executable
-        orders_data = await retrieve_rithmic_orders(request, session_id)
-
-        # Process orders and broadcast results
-        await ws_manager.broadcast_to_session(
+        # Log start of processing
+        await ws_manager.broadcast_status(
             session_id,
-            {
-                "type": "orders",
-                "data": orders_data,
-                "message": f"Retrieved orders for {len(selected_accounts)} accounts",
-            },
+            f"Starting order processing for {len(selected_accounts)} accounts",
         )
 
-        # Process each order and broadcast updates
-        for account_id, account_orders in orders_data.items():
-            if isinstance(account_orders, list):  # Skip metadata fields
-                for order in account_orders:
-                    await ws_manager.broadcast_to_session(
-                        session_id, {"type": "order_update", "order": order}
-                    )
+        # Stream each account's orders as soon as its replay finishes
+        async with OrdersStream(session_id) as stream:
+            orders_data = await retrieve_rithmic_orders(
+                request, session_id, on_account_orders=stream.send_account
+            )
+            await stream.send_remaining(orders_data)
 
         # Process orders into trades
         await ws_manager.broadcast_status(
@@ -139,13 +242,32 @@ async def process_websocket_data(
         await ws_manager.broadcast_log(
             session_id, f"Error processing orders: {str(e)}", "error"
         )
+        # Let the session's job record the failure
+        raise
+    finally:
+        if flight is not None:
+            await sync_flights.release(flight)
 
 
 async def process_orders_async(
     request: OrderRequest, background_tasks: BackgroundTasks
 ) -> str:
-    """Start asynchronous order processing and return a process ID"""
+    """Start asynchronous order processing and return a process ID
+
+    If the same sync is already running as a REST job, its process ID is
+    returned instead; if it runs in another kind of job,
+    SyncInProgressError is raised.
+    """
     process_id = str(uuid.uuid4())
+    flight = await sync_flights.claim(
+        sync_key(request.userId, request.account_ids, request.start_date),
+        "process",
+        process_id,
+    )
+    if not flight.leader:
+        if flight.kind == "process":
+            return flight.job_id
+        raise SyncInProgressError(flight)
 
     # Initialize task state
     processing_tasks[process_id] = {
@@ -156,17 +278,22 @@ async def process_orders_async(
         "error": None,
     }
 
+    await save_process_state(process_id)
+
     # Add the processing task to background tasks
-    background_tasks.add_task(process_orders_background, process_id, request)
+    background_tasks.add_task(process_orders_background, process_id, request, flight)
 
     return process_id
 
 
-async def process_orders_background(process_id: str, request: OrderRequest):
+async def process_orders_background(
+    process_id: str, request: OrderRequest, flight: Optional[Flight] = None
+):
     """Background task for processing orders"""
     try:
         processing_tasks[process_id]["status"] = "running"
         processing_tasks[process_id]["started_at"] = datetime.now()
+        await save_process_state(process_id)
 
         # Use Rithmic orders retrieval service instead of executable
         orders_data = await retrieve_rithmic_orders(request)
@@ -180,6 +307,7 @@ async def process_orders_background(process_id: str, request: OrderRequest):
                 "open_positions_count": 0,
                 "message": "No orders data returned",
             }
+            await save_process_state(process_id)
             return
 
         # Initialize variables
@@ -236,10 +364,15 @@ async def process_orders_background(process_id: str, request: OrderRequest):
             "open_positions_count": len(open_positions),
             "message": "Processing completed successfully",
         }
+        await save_process_state(process_id)
 
     except Exception as e:
         logger.error(f"Error in background processing for {process_id}: {e}")
         logger.exception(e)
         processing_tasks[process_id]["status"] = "error"
         processing_tasks[process_id]["error"] = str(e)
+        await save_process_state(process_id)
         raise
+    finally:
+        if flight is not None:
+            await sync_flights.release(flight)
@@ -1,13 +1,132 @@
 import os
-import json
+import asyncio
 import logging
-from typing import Optional, Any, Set, Dict, List
-import aioredis
-from aioredis import Redis
-from fastapi import WebSocket
+import math
+import time
+from typing import Optional, Any, Set, Dict, List, Tuple, Callable, Awaitable
+import redis.asyncio as aioredis
+from redis.asyncio import Redis
+from app.utils.serialization import encode_message, decode_message
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait before resubscribing after the pub/sub connection drops
+PUBSUB_RETRY_SECONDS = 1
+
+# Keys fetched per SCAN call when cleaning up sessions without a key index
+SCAN_BATCH_SIZE = 500
+
+# Remove a client from a session and, if it was the last one, delete every key
+# listed in the session's key index. Runs atomically in one round trip.
+# KEYS[1] = clients set, KEYS[2] = key index; ARGV[1] = client id
+REMOVE_CONNECTION_SCRIPT = """
+redis.call('SREM', KEYS[1], ARGV[1])
+local remaining = redis.call('SCARD', KEYS[1])
+if remaining == 0 then
+    local keys = redis.call('SMEMBERS', KEYS[2])
+    for i = 1, #keys, 500 do
+        redis.call('UNLINK', unpack(keys, i, math.min(i + 499, #keys)))
+    end
+    redis.call('UNLINK', KEYS[1], KEYS[2])
+end
+return remaining
+"""
+
+# Delete every key listed in a session's key index, then the index itself.
+# KEYS[1] = key index
+CLEANUP_SESSION_SCRIPT = """
+local keys = redis.call('SMEMBERS', KEYS[1])
+for i = 1, #keys, 500 do
+    redis.call('UNLINK', unpack(keys, i, math.min(i + 499, #keys)))
+end
+redis.call('UNLINK', KEYS[1])
+return #keys
+"""
+
+# Record one broadcast atomically: add a message to the session history and
+# trim it to its item and byte budgets (oldest first), merge encoded orders
+# into the order cache and trim it to its item budget (least recently updated
+# first), index every key, and publish. A budget of 0 means no limit.
+# KEYS[1] = messages, KEYS[2] = message bytes, KEYS[3] = orders,
+# KEYS[4] = order recency, KEYS[5] = key index
+# ARGV[1] = seq, ARGV[2] = member ("" for none), ARGV[3] = max items,
+# ARGV[4] = max bytes, ARGV[5] = max orders, ARGV[6] = ttl (0 for none),
+# ARGV[7] = channel ("" for none), ARGV[8] = data, ARGV[9..] = order id/value pairs
+RECORD_BROADCAST_SCRIPT = """
+local ttl = tonumber(ARGV[6])
+local function index(key)
+    redis.call('SADD', KEYS[5], key)
+    if ttl > 0 then
+        redis.call('EXPIRE', key, ttl)
+        redis.call('EXPIRE', KEYS[5], ttl)
+    end
+end
+
+if ARGV[2] ~= '' then
+    local max_items = tonumber(ARGV[3])
+    local max_bytes = tonumber(ARGV[4])
+    local size = tonumber(redis.call('GET', KEYS[2]) or '0')
+    if redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2]) == 1 then
+        size = size + string.len(ARGV[2])
+    end
+    local count = redis.call('ZCARD', KEYS[1])
+    while count > 0 and ((max_items > 0 and count > max_items)
+            or (max_bytes > 0 and size > max_bytes)) do
+        local oldest = redis.call('ZPOPMIN', KEYS[1])
+        size = size - string.len(oldest[1])
+        count = count - 1
+    end
+    redis.call('SET', KEYS[2], size)
+    index(KEYS[1])
+    index(KEYS[2])
+end
+
+if #ARGV > 8 then
+    local top = redis.call('ZRANGE', KEYS[4], -1, -1, 'WITHSCORES')
+    local recency = tonumber(top[2] or '0')
+    for i = 9, #ARGV, 2 do
+        recency = recency + 1
+        redis.call('HSET', KEYS[3], ARGV[i], ARGV[i + 1])
+        redis.call('ZADD', KEYS[4], recency, ARGV[i])
+    end
+    local max_orders = tonumber(ARGV[5])
+    local excess = redis.call('ZCARD', KEYS[4]) - max_orders
+    if max_orders > 0 and excess > 0 then
+        local evicted = redis.call('ZPOPMIN', KEYS[4], excess)
+        for i = 1, #evicted, 2 do
+            redis.call('HDEL', KEYS[3], evicted[i])
+        end
+    end
+    index(KEYS[3])
+    index(KEYS[4])
+end
+
+if ARGV[7] ~= '' then
+    redis.call('PUBLISH', ARGV[7], ARGV[8])
+end
+return 0
+"""
+
+# Delete a lease only if it is still held by the caller.
+# KEYS[1] = lease key; ARGV[1] = owner
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def redis_url() -> str:
+    """URL of the Redis server shared by API and Celery worker processes"""
+    redis_host = os.getenv("REDIS_HOST", "redis")
+    redis_port = int(os.getenv("REDIS_PORT", 6379))
+    return f"redis://{redis_host}:{redis_port}"
+
+
+def session_key(session_id: str, name: str) -> str:
+    return f"session:{session_id}:{name}"
+
 
 class RedisManager:
     _instance = None
@@ -21,17 +140,17 @@ class RedisManager:
     async def initialize(self):
         if self._redis is None:
             try:
-                redis_host = os.getenv("REDIS_HOST", "redis")
-                redis_port = int(os.getenv("REDIS_PORT", 6379))
-
-                self._redis = await aioredis.from_url(
-                    f"redis://{redis_host}:{redis_port}",
+                url = redis_url()
+                self._redis = aioredis.from_url(
+                    url,
                     encoding="utf-8",
                     decode_responses=True,
                 )
-                logger.info(f"Connected to Redis at {redis_host}:{redis_port}")
+                await self._redis.ping()
+                logger.info(f"Connected to Redis at {url}")
             except Exception as e:
                 logger.error(f"Failed to connect to Redis: {e}")
+                self._redis = None
                 raise
 
     @property
@@ -40,69 +159,315 @@ class RedisManager:
             raise RuntimeError("Redis connection not initialized")
         return self._redis
 
+    @property
+    def is_initialized(self) -> bool:
+        return self._redis is not None
+
     async def close(self):
         if self._redis:
             await self._redis.close()
             self._redis = None
+            self.__dict__.pop("_scripts", None)
+
+    def _script(self, source: str):
+        """Registered Lua script; runs via EVALSHA after its first use"""
+        scripts = self.__dict__.setdefault("_scripts", {})
+        if source not in scripts:
+            scripts[source] = self.redis.register_script(source)
+        return scripts[source]
+
+    def _index(self, pipe, session_id: str, key: str, ttl: Optional[int]) -> None:
+        """Queue adding key to the session's key index on a pipeline"""
+        index = session_key(session_id, "keys")
+        pipe.sadd(index, key)
+        if ttl:
+            pipe.expire(key, ttl)
+            pipe.expire(index, ttl)
 
     # Session Management
     async def add_session_connection(self, session_id: str, client_id: str) -> None:
         """Add a client connection to a session"""
-        await self.redis.sadd(f"session:{session_id}:clients", client_id)
+        key = session_key(session_id, "clients")
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.sadd(key, client_id)
+            self._index(pipe, session_id, key, None)
+            await pipe.execute()
 
     async def remove_session_connection(self, session_id: str, client_id: str) -> None:
-        """Remove a client connection from a session"""
-        await self.redis.srem(f"session:{session_id}:clients", client_id)
-        # Clean up session if no clients left
-        if not await self.redis.scard(f"session:{session_id}:clients"):
-            await self.cleanup_session(session_id)
+        """Remove a client connection from a session
+
+        Cleans up the session if no clients are left, atomically and in a
+        single round trip.
+        """
+        await self._script(REMOVE_CONNECTION_SCRIPT)(
+            keys=[session_key(session_id, "clients"), session_key(session_id, "keys")],
+            args=[client_id],
+        )
 
     async def get_session_connections(self, session_id: str) -> Set[str]:
         """Get all client connections for a session"""
-        return await self.redis.smembers(f"session:{session_id}:clients")
+        return await self.redis.smembers(session_key(session_id, "clients"))
+
+    async def refresh_live_clients(
+        self, session_id: str, client_ids: List[str], ttl: float
+    ) -> None:
+        """Mark clients of a session as connected for the next ttl seconds
+
+        Entries are not in the session's key index: they must outlive a
+        session cleanup only as long as their own expiry.
+        """
+        key = session_key(session_id, "live")
+        expires_at = time.time() + ttl
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(key, {client_id: expires_at for client_id in client_ids})
+            pipe.expire(key, math.ceil(ttl))
+            await pipe.execute()
+
+    async def remove_live_client(self, session_id: str, client_id: str) -> None:
+        await self.redis.zrem(session_key(session_id, "live"), client_id)
+
+    async def count_live_clients(self, session_id: str) -> int:
+        """Clients of a session connected to any worker"""
+        key = session_key(session_id, "live")
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(key, "-inf", time.time())
+            pipe.zcard(key)
+            results = await pipe.execute()
+        return results[1]
 
     # State Management
-    async def set_session_state(self, session_id: str, state: dict) -> None:
+    async def set_session_state(
+        self, session_id: str, state: dict, ttl: Optional[int] = None
+    ) -> None:
         """Store session state"""
-        await self.redis.set(f"session:{session_id}:state", json.dumps(state))
+        key = session_key(session_id, "state")
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, encode_message(state).decode("utf-8"), ex=ttl)
+            self._index(pipe, session_id, key, ttl)
+            await pipe.execute()
 
     async def get_session_state(self, session_id: str) -> Optional[dict]:
         """Retrieve session state"""
-        state = await self.redis.get(f"session:{session_id}:state")
-        return json.loads(state) if state else None
+        state = await self.redis.get(session_key(session_id, "state"))
+        return decode_message(state) if state else None
+
+    # Sequence numbers
+    async def next_sequence(self, session_id: str, ttl: Optional[int] = None) -> int:
+        """Allocate the next message sequence number for a session"""
+        key = session_key(session_id, "seq")
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.incr(key)
+            self._index(pipe, session_id, key, ttl)
+            results = await pipe.execute()
+        return results[0]
+
+    async def get_sequence(self, session_id: str) -> int:
+        """Last sequence number allocated for a session"""
+        seq = await self.redis.get(session_key(session_id, "seq"))
+        return int(seq) if seq else 0
 
     # Message Cache
-    async def cache_message(self, session_id: str, message: dict) -> None:
-        """Cache a message for a session"""
-        await self.redis.rpush(f"session:{session_id}:messages", json.dumps(message))
-        # Trim to last 1000 messages
-        await self.redis.ltrim(f"session:{session_id}:messages", -1000, -1)
+    async def record_broadcast(
+        self,
+        session_id: str,
+        seq: Optional[int] = None,
+        member: Optional[str] = None,
+        orders: Optional[Dict[str, str]] = None,
+        channel: Optional[str] = None,
+        data: Optional[str] = None,
+        max_items: int = 1000,
+        max_bytes: int = 0,
+        max_orders: int = 0,
+        ttl: Optional[int] = None,
+    ) -> None:
+        """Cache and publish one broadcast in a single round trip
+
+        Adds `member` to the session's message history under score `seq`
+        (trimmed to the newest `max_items` and `max_bytes`), merges
+        already-encoded `orders` into the session's order hash (trimmed to the
+        `max_orders` most recently updated) and publishes `data` on `channel`.
+        Every part is optional and a limit of 0 means none. Runs as one script
+        so readers never see the message without its orders.
+        """
+        has_message = member is not None and seq is not None
+        publish = channel is not None and data is not None
+        if not has_message and not orders and not publish:
+            return
+        args = [
+            seq if has_message else 0,
+            member if has_message else "",
+            max_items,
+            max_bytes,
+            max_orders,
+            ttl or 0,
+            channel if publish else "",
+            data if publish else "",
+        ]
+        for order_id, encoded in (orders or {}).items():
+            args.extend((order_id, encoded))
+        await self._script(RECORD_BROADCAST_SCRIPT)(
+            keys=[
+                session_key(session_id, "messages"),
+                session_key(session_id, "message_bytes"),
+                session_key(session_id, "orders"),
+                session_key(session_id, "order_recency"),
+                session_key(session_id, "keys"),
+            ],
+            args=args,
+        )
+
+    async def cache_message(
+        self,
+        session_id: str,
+        seq: int,
+        member: str,
+        max_items: int = 1000,
+        ttl: Optional[int] = None,
+    ) -> None:
+        """Cache an encoded message for a session, scored by sequence number"""
+        await self.record_broadcast(
+            session_id, seq=seq, member=member, max_items=max_items, ttl=ttl
+        )
+
+    async def get_cached_messages(
+        self, session_id: str, after_seq: int = 0
+    ) -> List[Tuple[str, int]]:
+        """Cached (member, seq) pairs with seq > after_seq, oldest first"""
+        return [
+            (member, int(score))
+            for member, score in await self.redis.zrangebyscore(
+                session_key(session_id, "messages"),
+                f"({after_seq}",
+                "+inf",
+                withscores=True,
+            )
+        ]
 
-    async def get_cached_messages(self, session_id: str) -> List[dict]:
-        """Get all cached messages for a session"""
-        messages = await self.redis.lrange(f"session:{session_id}:messages", 0, -1)
-        return [json.loads(msg) for msg in messages]
+    async def get_oldest_cached_sequence(self, session_id: str) -> Optional[int]:
+        """Sequence number of the oldest cached message, None if empty"""
+        oldest = await self.redis.zrange(
+            session_key(session_id, "messages"), 0, 0, withscores=True
+        )
+        return int(oldest[0][1]) if oldest else None
 
     # Order Cache
     async def cache_order(
         self, session_id: str, order_id: str, order_data: dict
     ) -> None:
         """Cache an order for a session"""
-        await self.redis.hset(
-            f"session:{session_id}:orders", order_id, json.dumps(order_data)
+        await self.cache_encoded_orders(
+            session_id, {order_id: encode_message(order_data).decode("utf-8")}
         )
 
+    async def cache_encoded_orders(
+        self, session_id: str, orders: Dict[str, str], ttl: Optional[int] = None
+    ) -> None:
+        """Cache already-encoded orders for a session, keyed by order id"""
+        if orders:
+            await self.record_broadcast(session_id, orders=orders, ttl=ttl)
+
     async def get_cached_orders(self, session_id: str) -> Dict[str, dict]:
         """Get all cached orders for a session"""
-        orders = await self.redis.hgetall(f"session:{session_id}:orders")
-        return {k: json.loads(v) for k, v in orders.items()}
+        orders = await self.redis.hgetall(session_key(session_id, "orders"))
+        return {k: decode_message(v) for k, v in orders.items()}
+
+    async def get_encoded_orders(self, session_id: str) -> List[str]:
+        """Get all cached orders for a session without decoding them"""
+        return await self.redis.hvals(session_key(session_id, "orders"))
+
+    # Process state
+    async def set_process_state(
+        self, process_id: str, state: dict, ttl: Optional[int] = None
+    ) -> None:
+        """Store the public status of a background process"""
+        await self.redis.set(
+            f"process:{process_id}:state",
+            encode_message(state).decode("utf-8"),
+            ex=ttl,
+        )
+
+    async def get_process_state(self, process_id: str) -> Optional[dict]:
+        """Retrieve the public status of a background process"""
+        state = await self.redis.get(f"process:{process_id}:state")
+        return decode_message(state) if state else None
+
+    # Leases
+    async def acquire_lease(self, key: str, owner: str, ttl: int) -> Optional[str]:
+        """Take a lease; returns None if acquired, else the current owner"""
+        while True:
+            if await self.redis.set(key, owner, nx=True, ex=ttl):
+                return None
+            current = await self.redis.get(key)
+            if current is not None:
+                return current
+            # Expired between SET and GET: try again
+
+    async def release_lease(self, key: str, owner: str) -> None:
+        await self._script(RELEASE_LEASE_SCRIPT)(keys=[key], args=[owner])
+
+    async def get_lease_owner(self, key: str) -> Optional[str]:
+        return await self.redis.get(key)
+
+    # Pub/Sub
+
+    async def publish(self, channel: str, data: str) -> None:
+        """Publish a message to a channel"""
+        await self.redis.publish(channel, data)
+
+    async def listen(
+        self, pattern: str, handler: Callable[[str, str], Awaitable[Any]]
+    ) -> None:
+        """Deliver messages on channels matching pattern to handler(channel, data).
+
+        Runs until cancelled and resubscribes if the connection drops. Meant to
+        run as one long-lived task per worker process.
+        """
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.psubscribe(pattern)
+                logger.info(f"Subscribed to Redis channels matching {pattern}")
+                async for message in pubsub.listen():
+                    if message.get("type") != "pmessage":
+                        continue
+                    try:
+                        await handler(message["channel"], message["data"])
+                    except Exception as e:
+                        logger.error(f"Error handling message on {pattern}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis subscription to {pattern} failed: {e}")
+                await asyncio.sleep(PUBSUB_RETRY_SECONDS)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
 
     # Cleanup
     async def cleanup_session(self, session_id: str) -> None:
-        """Clean up all session data"""
-        keys = await self.redis.keys(f"session:{session_id}:*")
-        if keys:
-            await self.redis.delete(*keys)
+        """Clean up all session data
+
+        Deletes the keys recorded in the session's key index. Sessions without
+        an index are cleaned up with an incremental SCAN, which unlike KEYS
+        does not block Redis while walking the keyspace.
+        """
+        index = session_key(session_id, "keys")
+        if await self.redis.exists(index):
+            await self._script(CLEANUP_SESSION_SCRIPT)(keys=[index])
+            return
+
+        batch = []
+        async for key in self.redis.scan_iter(
+            match=session_key(session_id, "*"), count=SCAN_BATCH_SIZE
+        ):
+            batch.append(key)
+            if len(batch) >= SCAN_BATCH_SIZE:
+                await self.redis.unlink(*batch)
+                batch = []
+        if batch:
+            await self.redis.unlink(*batch)
 
 
 # Global Redis manager instance
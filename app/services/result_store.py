@@ -0,0 +1,202 @@
+import hashlib
+import logging
+import os
+import re
+import time
+import zlib
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional
+import msgpack
+import redis
+from app.core.config import settings
+from app.services.redis_service import redis_url
+from app.utils.serialization import from_columnar, to_columnar
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the stored layout changes
+FORMAT_VERSION = 2
+KEY_PREFIX = "orders-"
+KEY_PATTERN = re.compile(r"^orders-[0-9a-f]{32}$")
+
+
+def encode_order_set(orders_by_account: Dict[str, List[dict]], owner: str) -> bytes:
+    """Encode a user's orders per account into a compact, deterministic blob
+
+    Each account's orders are stored columnar, MessagePack-encoded and
+    zlib-compressed on their own, so readers can decode one account at a
+    time. Accounts are sorted so the same orders always give the same bytes.
+    """
+    accounts = {
+        account_id: zlib.compress(
+            msgpack.packb(to_columnar(orders), default=str), level=6
+        )
+        for account_id, orders in sorted(orders_by_account.items())
+    }
+    return msgpack.packb({"v": FORMAT_VERSION, "owner": owner, "accounts": accounts})
+
+
+class OrderSet(Mapping):
+    """Read-only view of a stored order set: account id -> list of orders
+
+    Accounts are decompressed when first accessed, so a consumer iterating
+    over accounts (like process_orders) holds one decoded account at a time.
+    """
+
+    def __init__(self, blob: bytes):
+        payload = msgpack.unpackb(blob)
+        if payload.get("v") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported order set version: {payload.get('v')}")
+        self.owner: str = payload["owner"]
+        self._accounts: Dict[str, bytes] = payload["accounts"]
+
+    def __getitem__(self, account_id: str) -> List[dict]:
+        table = msgpack.unpackb(zlib.decompress(self._accounts[account_id]))
+        return from_columnar(table)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._accounts)
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def to_dict(self) -> dict:
+        """Orders in the retrieval services' format, with metadata fields"""
+        orders = {account_id: self[account_id] for account_id in self}
+        orders["status"] = "complete"
+        return orders
+
+
+class RedisResultBackend:
+    """Order sets stored as Redis strings that expire after the TTL"""
+
+    def __init__(self, client: redis.Redis, ttl: int):
+        self.client = client
+        self.ttl = ttl
+
+    def put(self, key: str, blob: bytes) -> None:
+        if not self.client.set(key, blob, ex=self.ttl, nx=True):
+            self.client.expire(key, self.ttl)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+
+class FileResultBackend:
+    """Order sets stored as files in a directory shared by all containers
+
+    Files older than the TTL are deleted by a purge that runs at most once
+    a minute, on writes.
+    """
+
+    PURGE_INTERVAL_SECONDS = 60
+
+    def __init__(self, directory: str, ttl: int):
+        self.directory = directory
+        self.ttl = ttl
+        self._last_purge = 0.0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def put(self, key: str, blob: bytes) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(blob)
+            os.replace(temp_path, path)
+        self.purge()
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def purge(self, force: bool = False) -> int:
+        """Delete expired order sets, returning how many were removed"""
+        now = time.time()
+        if not force and now - self._last_purge < self.PURGE_INTERVAL_SECONDS:
+            return 0
+        self._last_purge = now
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.startswith(KEY_PREFIX):
+                continue
+            try:
+                if now - entry.stat().st_mtime > self.ttl:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        if removed:
+            logger.info(f"Purged {removed} expired order sets")
+        return removed
+
+
+class ResultStore:
+    """Content-addressed store for fetched order sets
+
+    Keys are derived from the encoded orders and their owner, so storing the
+    same orders twice only refreshes their TTL.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def key(blob: bytes) -> str:
+        return KEY_PREFIX + hashlib.sha256(blob).hexdigest()[:32]
+
+    def put(self, orders_by_account: Dict[str, List[dict]], owner: str) -> str:
+        """Store a user's orders per account and return their key"""
+        blob = encode_order_set(orders_by_account, owner)
+        key = self.key(blob)
+        self.backend.put(key, blob)
+        logger.info(
+            f"Stored {len(orders_by_account)} accounts of orders as {key} "
+            f"({len(blob)} bytes)"
+        )
+        return key
+
+    def get(self, key: str) -> Optional[OrderSet]:
+        if not KEY_PATTERN.match(key):
+            return None
+        blob = self.backend.get(key)
+        return OrderSet(blob) if blob is not None else None
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
+
+
+def create_result_store() -> ResultStore:
+    """Result store for the configured backend"""
+    if settings.RESULT_STORE_BACKEND == "file":
+        backend = FileResultBackend(
+            settings.RESULT_STORE_DIR, settings.RESULT_STORE_TTL_SECONDS
+        )
+    else:
+        backend = RedisResultBackend(
+            redis.Redis.from_url(redis_url()), settings.RESULT_STORE_REDIS_TTL_SECONDS
+        )
+    return ResultStore(backend)
+
+
+result_store = create_result_store()
@@ -1,7 +1,7 @@
 import logging
 import asyncio
 import json
-from typing import Dict, List, Optional
+from typing import Awaitable, Callable, Dict, List, Optional
 from datetime import datetime
 from app.models.trade import OrderRequest
 from app.services.websocket_service import ws_manager
@@ -18,6 +18,11 @@ class RithmicOrdersRetriever:
         self.commission_rates = {}
         self.orders_data = {}
         self.processing_stats = {}
+        self._login_complete = False
+        self._accounts_received = False
+        self._orders_received = False
+        self._history_dates_received = False
+        self._history_dates = []
 
     async def initialize(self, request: OrderRequest, session_id: str):
         """Initialize the Rithmic engine and set up callbacks"""
@@ -88,8 +93,19 @@ class RithmicOrdersRetriever:
                 )
             raise
 
-    async def retrieve_orders(self, request: OrderRequest, session_id: str) -> Dict:
-        """Retrieve orders for all accounts"""
+    async def retrieve_orders(
+        self,
+        request: OrderRequest,
+        session_id: str,
+        on_account_orders: Optional[
+            Callable[[str, List[dict]], Awaitable[None]]
+        ] = None,
+    ) -> Dict:
+        """Retrieve orders for all accounts
+
+        `on_account_orders(account_id, orders)` is awaited as soon as each
+        account's replay is finished.
+        """
         try:
             # Initialize if not already done
             if not self.engine:
@@ -158,6 +174,11 @@ class RithmicOrdersRetriever:
                             },
                         )
 
+                if on_account_orders:
+                    await on_account_orders(
+                        account_id, self.orders_data.get(account_id, [])
+                    )
+
             # Process orders into trades
             if session_id:
                 await ws_manager.broadcast_status(
@@ -258,16 +279,21 @@ class RithmicOrdersRetriever:
         self._history_dates = []
 
 
-# Create a global instance
-rithmic_orders_retriever = RithmicOrdersRetriever()
-
-
 async def retrieve_rithmic_orders(
-    request: OrderRequest, session_id: str = None
+    request: OrderRequest,
+    session_id: str = None,
+    on_account_orders: Optional[Callable[[str, List[dict]], Awaitable[None]]] = None,
 ) -> Dict:
-    """Main function to retrieve Rithmic orders"""
+    """Main function to retrieve Rithmic orders
+
+    Each call gets its own retriever so concurrent sessions don't share
+    engine state; it is logged out when the call ends or is cancelled.
+    """
+    rithmic_orders_retriever = RithmicOrdersRetriever()
     try:
-        return await rithmic_orders_retriever.retrieve_orders(request, session_id)
+        return await rithmic_orders_retriever.retrieve_orders(
+            request, session_id, on_account_orders
+        )
     except Exception as e:
         logger.error(f"Error in retrieve_rithmic_orders: {e}")
         raise
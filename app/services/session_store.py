@@ -0,0 +1,329 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.core.security import decrypt_secret, encrypt_secret
+from app.services.message_history import HistoryEntry, MessageHistory
+from app.services.redis_service import RedisManager
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def seal_credentials(state: dict) -> dict:
+    """Copy of a session state with its credentials' password encrypted"""
+    credentials = state.get("credentials")
+    if not credentials or credentials.get("password") is None:
+        return state
+    sealed = {
+        **credentials,
+        "password_encrypted": encrypt_secret(credentials["password"]),
+    }
+    del sealed["password"]
+    return {**state, "credentials": sealed}
+
+
+def unseal_credentials(state: dict) -> dict:
+    """Inverse of seal_credentials"""
+    credentials = state.get("credentials")
+    if not credentials or "password_encrypted" not in credentials:
+        return state
+    unsealed = {
+        **credentials,
+        "password": decrypt_secret(credentials["password_encrypted"]),
+    }
+    del unsealed["password_encrypted"]
+    return {**state, "credentials": unsealed}
+
+
+class MemorySessionStore:
+    """Session state, message history and order cache held in this process.
+
+    Only clients connected to this worker can see a session, so this store is
+    only suitable for single-worker deployments. A session stays resumable for
+    SESSION_RESUME_WINDOW_SECONDS after its last client has left.
+    """
+
+    shared = False
+
+    def __init__(
+        self,
+        history_evict_first=(),
+        orders_max_items: int = None,
+    ):
+        self.history_evict_first = tuple(history_evict_first)
+        self.orders_max_items = orders_max_items or settings.WS_ORDERS_CACHE_MAX_ITEMS
+        self.states: Dict[str, dict] = {}
+        self.histories: Dict[str, MessageHistory] = {}
+        self.orders: Dict[str, "OrderedDict[str, bytes]"] = {}
+        self.sequences: Dict[str, int] = {}
+        self.resume_window = settings.SESSION_RESUME_WINDOW_SECONDS
+        # Sessions without clients, by time their last client left (oldest first)
+        self._closed_at: Dict[str, float] = {}
+
+    def has_session(self, session_id: str) -> bool:
+        """True if messages for the session should be recorded"""
+        return session_id in self.histories
+
+    async def open_session(self, session_id: str) -> None:
+        self._closed_at.pop(session_id, None)
+        self._expire_closed_sessions()
+        if session_id not in self.histories:
+            self.histories[session_id] = MessageHistory(
+                max_bytes=settings.WS_HISTORY_MAX_BYTES,
+                max_items=settings.WS_HISTORY_MAX_ITEMS,
+                evict_first=self.history_evict_first,
+            )
+            self.orders[session_id] = OrderedDict()
+            self.sequences.setdefault(session_id, 0)
+
+    async def close_session(self, session_id: str) -> None:
+        """Note that a session's last client has left
+
+        Its history and sequence are kept for resume_window seconds, so a
+        client reconnecting within it can still resume.
+        """
+        self._closed_at[session_id] = time.monotonic()
+        self._expire_closed_sessions()
+
+    def _expire_closed_sessions(self) -> None:
+        now = time.monotonic()
+        for session_id, closed_at in list(self._closed_at.items()):
+            if now - closed_at < self.resume_window:
+                break
+            del self._closed_at[session_id]
+            self._forget(session_id)
+
+    def _forget(self, session_id: str) -> None:
+        self.states.pop(session_id, None)
+        self.histories.pop(session_id, None)
+        self.orders.pop(session_id, None)
+        self.sequences.pop(session_id, None)
+
+    async def get_state(self, session_id: str) -> Optional[dict]:
+        return self.states.get(session_id)
+
+    async def track_clients(self, session_id: str, client_ids: List[str]) -> None:
+        pass
+
+    async def untrack_client(self, session_id: str, client_id: str) -> None:
+        pass
+
+    async def has_clients(self, session_id: str) -> bool:
+        """True if a client is connected to another worker; never, here"""
+        return False
+
+    async def set_state(self, session_id: str, state: dict) -> None:
+        self.states[session_id] = state
+
+    async def next_seq(self, session_id: str) -> int:
+        seq = self.sequences.get(session_id, 0) + 1
+        self.sequences[session_id] = seq
+        return seq
+
+    async def current_seq(self, session_id: str) -> int:
+        return self.sequences.get(session_id, 0)
+
+    async def record_message(
+        self, session_id: str, seq: int, message_type: Optional[str], payload: bytes
+    ) -> None:
+        history = self.histories.get(session_id)
+        if history is not None:
+            history.append(seq, message_type, payload)
+
+    async def commit(
+        self,
+        session_id: str,
+        seq: Optional[int],
+        message_type: Optional[str],
+        payload: bytes,
+        orders: List[dict] = (),
+        encoded_orders: List[bytes] = (),
+        envelope: Optional[str] = None,
+    ) -> None:
+        """Record a broadcast: history entry (if sequenced) and cached orders.
+
+        The envelope is only needed by shared stores, which publish it.
+        """
+        if seq is not None:
+            await self.record_message(session_id, seq, message_type, payload)
+        if orders:
+            await self.cache_orders(session_id, orders, encoded_orders)
+
+    async def cache_orders(
+        self, session_id: str, orders: List[dict], encoded_orders: List[bytes]
+    ) -> None:
+        """Cache encoded orders for replay, keeping at most orders_max_items"""
+        cache = self.orders.get(session_id)
+        if cache is None:
+            return
+        for order, encoded in zip(orders, encoded_orders):
+            order_id = order.get("order_id")
+            if order_id is None:
+                continue
+            cache.pop(order_id, None)
+            cache[order_id] = encoded
+        while len(cache) > self.orders_max_items:
+            cache.popitem(last=False)
+
+    async def messages_since(
+        self, session_id: str, last_seq: int
+    ) -> Optional[List[HistoryEntry]]:
+        """Messages after last_seq, or None if some of them were evicted"""
+        history = self.histories.get(session_id)
+        if history is None or not history.covers(last_seq):
+            return None
+        return history.since(last_seq)
+
+    async def history(self, session_id: str) -> List[HistoryEntry]:
+        return list(self.histories.get(session_id, ()))
+
+    async def encoded_orders(self, session_id: str) -> List[bytes]:
+        return list(self.orders.get(session_id, {}).values())
+
+
+class RedisSessionStore:
+    """Session state, message history and order cache shared through Redis.
+
+    Any API worker can serve any session. Session state is also cached locally
+    for SESSION_STATE_CACHE_SECONDS since it is read on every control message.
+    All keys expire SESSION_TTL_SECONDS after their last write.
+
+    Cached messages are stored as "<type>\\n<payload>" members of a sorted set
+    scored by sequence number; encoded JSON never contains a raw newline. The
+    history is kept within WS_HISTORY_MAX_ITEMS and WS_HISTORY_MAX_BYTES by
+    dropping the oldest messages, and the order cache within
+    WS_ORDERS_CACHE_MAX_ITEMS by dropping the least recently updated orders.
+
+    The credentials' password is encrypted before state is written to Redis.
+    """
+
+    shared = True
+
+    def __init__(self, redis: RedisManager):
+        self.redis = redis
+        self.ttl = settings.SESSION_TTL_SECONDS
+        # Clients count as connected until a few missed heartbeats later
+        self.client_ttl = 3 * settings.WS_HEARTBEAT_INTERVAL_SECONDS
+        self._state_cache = TTLCache(settings.SESSION_STATE_CACHE_SECONDS)
+
+    @staticmethod
+    def channel(session_id: str) -> str:
+        return f"ws:session:{session_id}"
+
+    @staticmethod
+    def session_from_channel(channel: str) -> str:
+        return channel[len("ws:session:") :]
+
+    def has_session(self, session_id: str) -> bool:
+        return True
+
+    async def open_session(self, session_id: str) -> None:
+        pass
+
+    async def close_session(self, session_id: str) -> None:
+        # Other workers may still serve this session; Redis keys expire on TTL
+        self._state_cache.pop(session_id)
+
+    async def get_state(self, session_id: str) -> Optional[dict]:
+        state = self._state_cache.get(session_id)
+        if state is None:
+            state = await self.redis.get_session_state(session_id)
+            if state is not None:
+                state = unseal_credentials(state)
+                self._state_cache.set(session_id, state)
+        return state
+
+    async def set_state(self, session_id: str, state: dict) -> None:
+        await self.redis.set_session_state(
+            session_id, seal_credentials(state), ttl=self.ttl
+        )
+        self._state_cache.set(session_id, state)
+
+    async def track_clients(self, session_id: str, client_ids: List[str]) -> None:
+        """Mark clients connected here as alive, for other workers to see"""
+        if client_ids:
+            await self.redis.refresh_live_clients(
+                session_id, client_ids, self.client_ttl
+            )
+
+    async def untrack_client(self, session_id: str, client_id: str) -> None:
+        await self.redis.remove_live_client(session_id, client_id)
+
+    async def has_clients(self, session_id: str) -> bool:
+        """True if a client of the session is connected to any worker"""
+        return await self.redis.count_live_clients(session_id) > 0
+
+    async def next_seq(self, session_id: str) -> int:
+        return await self.redis.next_sequence(session_id, ttl=self.ttl)
+
+    async def current_seq(self, session_id: str) -> int:
+        return await self.redis.get_sequence(session_id)
+
+    async def commit(
+        self,
+        session_id: str,
+        seq: Optional[int],
+        message_type: Optional[str],
+        payload: bytes,
+        orders: List[dict] = (),
+        encoded_orders: List[bytes] = (),
+        envelope: Optional[str] = None,
+    ) -> None:
+        """Record and publish a broadcast in a single Redis round trip"""
+        await self.redis.record_broadcast(
+            session_id,
+            seq=seq,
+            member=(
+                f"{message_type or ''}\n{payload.decode('utf-8')}"
+                if seq is not None
+                else None
+            ),
+            orders={
+                str(order["order_id"]): encoded.decode("utf-8")
+                for order, encoded in zip(orders, encoded_orders)
+                if order.get("order_id") is not None
+            },
+            channel=self.channel(session_id) if envelope is not None else None,
+            data=envelope,
+            max_items=settings.WS_HISTORY_MAX_ITEMS,
+            max_bytes=settings.WS_HISTORY_MAX_BYTES,
+            max_orders=settings.WS_ORDERS_CACHE_MAX_ITEMS,
+            ttl=self.ttl,
+        )
+
+    @staticmethod
+    def _to_entry(member: str, seq: int) -> HistoryEntry:
+        message_type, payload = member.split("\n", 1)
+        return HistoryEntry(seq, message_type or None, payload.encode("utf-8"))
+
+    async def messages_since(
+        self, session_id: str, last_seq: int
+    ) -> Optional[List[HistoryEntry]]:
+        """Messages after last_seq, or None if some of them were trimmed"""
+        current = await self.current_seq(session_id)
+        if last_seq > current:
+            return None
+        if last_seq < current:
+            oldest = await self.redis.get_oldest_cached_sequence(session_id)
+            if oldest is None or oldest > last_seq + 1:
+                return None
+        return [
+            self._to_entry(member, seq)
+            for member, seq in await self.redis.get_cached_messages(
+                session_id, after_seq=last_seq
+            )
+        ]
+
+    async def history(self, session_id: str) -> List[HistoryEntry]:
+        return [
+            self._to_entry(member, seq)
+            for member, seq in await self.redis.get_cached_messages(session_id)
+        ]
+
+    async def encoded_orders(self, session_id: str) -> List[bytes]:
+        return [
+            order.encode("utf-8")
+            for order in await self.redis.get_encoded_orders(session_id)
+        ]
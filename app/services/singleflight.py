@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import logging
+from typing import Dict, Iterable, NamedTuple, Optional
+from app.core.config import settings
+from app.services.redis_service import redis_manager
+
+logger = logging.getLogger(__name__)
+
+LEASE_KEY_PREFIX = "singleflight:"
+
+# Seconds between checks of whether a followed sync is still running
+FOLLOW_POLL_SECONDS = 1
+
+# Kinds of job a flight can be attached to, and how to follow its progress:
+# - process: a REST background job, polled on GET /orders/process/{id}
+# - task: a Celery task, relayed to WebSocket clients by task id
+# - session: a WebSocket session, relayed into the sessions asking for it
+FLIGHT_KINDS = ("process", "task", "session")
+
+
+class Flight(NamedTuple):
+    """The job running a sync; `leader` is True for the caller that started it"""
+
+    key: str
+    kind: str
+    job_id: str
+    leader: bool
+
+    @property
+    def owner(self) -> str:
+        return f"{self.kind}:{self.job_id}"
+
+
+class SyncInProgressError(Exception):
+    """The sync is already running as a job the caller cannot attach to"""
+
+    def __init__(self, flight: Flight):
+        super().__init__(
+            f"This sync is already running ({flight.kind} {flight.job_id})"
+        )
+        self.flight = flight
+
+
+def sync_key(user_id: str, account_ids: Optional[Iterable[str]], start_date) -> str:
+    """Key identifying a sync by user, accounts and date window"""
+    accounts = ",".join(sorted(account_ids or ()))
+    digest = hashlib.sha256(f"{user_id}|{accounts}|{start_date}".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+class SingleFlight:
+    """Coalesce duplicate syncs so each one runs once
+
+    A sync is claimed in an in-process map and, when Redis is available,
+    with a lease shared by all workers. Later callers get the running job
+    instead of starting another one, and follow its progress and result.
+    """
+
+    def __init__(self, lease_seconds: int):
+        self.lease_seconds = lease_seconds
+        self.flights: Dict[str, Flight] = {}
+
+    async def claim(self, key: str, kind: str, job_id: str) -> Flight:
+        """Claim a sync for a job, or return the job already running it"""
+        flight = self.flights.get(key)
+        if flight is not None:
+            return flight._replace(leader=False)
+
+        flight = Flight(key, kind, job_id, leader=True)
+        self.flights[key] = flight
+        if redis_manager.is_initialized:
+            try:
+                owner = await redis_manager.acquire_lease(
+                    LEASE_KEY_PREFIX + key, flight.owner, self.lease_seconds
+                )
+            except Exception as e:
+                logger.warning(f"Failed to take sync lease {key}: {e}")
+                owner = None
+            if owner is not None:
+                del self.flights[key]
+                running_kind, _, running_id = owner.partition(":")
+                logger.info(f"Sync {key} already running as {owner}")
+                return Flight(key, running_kind, running_id, leader=False)
+        return flight
+
+    async def is_running(self, flight: Flight) -> bool:
+        """True while the job of a flight still holds the sync"""
+        local = self.flights.get(flight.key)
+        if local is not None:
+            return local.owner == flight.owner
+        if not redis_manager.is_initialized:
+            return False
+        try:
+            owner = await redis_manager.get_lease_owner(LEASE_KEY_PREFIX + flight.key)
+        except Exception as e:
+            logger.warning(f"Failed to check sync lease {flight.key}: {e}")
+            return False
+        return owner == flight.owner
+
+    async def wait(self, flight: Flight) -> None:
+        """Wait until the job of a flight releases the sync"""
+        while await self.is_running(flight):
+            await asyncio.sleep(FOLLOW_POLL_SECONDS)
+
+    async def release(self, flight: Flight) -> None:
+        """Release a sync claimed by this caller"""
+        if not flight.leader or self.flights.get(flight.key) != flight:
+            return
+        del self.flights[flight.key]
+        if redis_manager.is_initialized:
+            try:
+                await redis_manager.release_lease(
+                    LEASE_KEY_PREFIX + flight.key, flight.owner
+                )
+            except Exception as e:
+                logger.warning(f"Failed to release sync lease {flight.key}: {e}")
+
+
+sync_flights = SingleFlight(settings.SYNC_LEASE_SECONDS)
@@ -0,0 +1,80 @@
+import logging
+import time
+from typing import Any, Optional
+import redis
+from celery.signals import task_failure, task_postrun, task_prerun
+from app.services.redis_service import redis_url
+from app.utils.serialization import encode_message
+
+logger = logging.getLogger(__name__)
+
+# Progress events for a Celery task are published on "task:progress:<task id>"
+PROGRESS_CHANNEL_PREFIX = "task:progress:"
+
+# Stages after which no more events are published for a task
+TERMINAL_STAGES = ("complete", "failed")
+
+_client: Optional[redis.Redis] = None
+
+
+def progress_channel(task_id: str) -> str:
+    return f"{PROGRESS_CHANNEL_PREFIX}{task_id}"
+
+
+def task_from_channel(channel: str) -> str:
+    return channel[len(PROGRESS_CHANNEL_PREFIX) :]
+
+
+def _redis() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(redis_url())
+    return _client
+
+
+def publish_progress(task_id: str, stage: str, **fields: Any) -> None:
+    """Publish a progress event for a Celery task
+
+    `stage` names the step (e.g. "login", "account", "orders", "complete");
+    fields such as account_id, days_processed, total_days and
+    orders_processed carry the details. Never raises: progress is best-effort
+    and must not fail the task.
+    """
+    if not task_id:
+        return
+    event = {"task_id": task_id, "stage": stage, "timestamp": time.time(), **fields}
+    try:
+        _redis().publish(progress_channel(task_id), encode_message(event))
+    except Exception as e:
+        logger.warning(f"Failed to publish progress for task {task_id}: {e}")
+
+
+@task_prerun.connect
+def _on_task_prerun(task_id=None, task=None, **kwargs):
+    publish_progress(task_id, "started", task=task.name if task else None)
+
+
+@task_postrun.connect
+def _on_task_postrun(task_id=None, task=None, retval=None, state=None, **kwargs):
+    """Publish the end of a task, with its result unless the task opts out
+
+    Tasks declared with `publish_result=False` (subtasks whose results are
+    large and only consumed by a chord callback) publish the stage alone.
+    """
+    if state != "SUCCESS":
+        return
+    failed = isinstance(retval, dict) and retval.get("success") is False
+    fields = {"task": task.name if task else None}
+    if getattr(task, "publish_result", True):
+        fields["result"] = retval
+    publish_progress(task_id, "failed" if failed else "complete", **fields)
+
+
+@task_failure.connect
+def _on_task_failure(task_id=None, sender=None, exception=None, **kwargs):
+    publish_progress(
+        task_id,
+        "failed",
+        task=sender.name if sender else None,
+        message=str(exception),
+    )
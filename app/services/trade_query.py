@@ -0,0 +1,228 @@
+import base64
+import logging
+from datetime import date
+from typing import AsyncIterator, List, NamedTuple, Optional, Sequence, Tuple
+from app.db.metrics import query_metrics
+from app.db.session import db
+from app.utils.serialization import decode_message, encode_message
+
+logger = logging.getLogger(__name__)
+
+TRADE_COLUMNS = (
+    "id",
+    "userId",
+    "accountNumber",
+    "instrument",
+    "quantity",
+    "entryPrice",
+    "closePrice",
+    "entryDate",
+    "closeDate",
+    "side",
+    "commission",
+    "timeInPosition",
+    "pnl",
+    "entryId",
+    "closeId",
+    "comment",
+    "createdAt",
+)
+
+# Rows fetched per round trip when streaming an export
+EXPORT_PREFETCH_ROWS = 1000
+
+# Columns a rollup summary can be grouped by
+SUMMARY_GROUPS = ("accountNumber", "instrument")
+
+ROLLUP_TOTALS = """
+    SUM("pnl") AS "pnl",
+    SUM("commission") AS "commission",
+    SUM("pnl") - SUM("commission") AS "netPnl",
+    SUM("trades")::bigint AS "trades",
+    SUM("wins")::bigint AS "wins",
+    SUM("losses")::bigint AS "losses",
+    SUM("quantity") AS "quantity"
+"""
+
+
+class InvalidCursorError(ValueError):
+    """A pagination cursor that was not produced by this API"""
+
+
+class TradeFilter(NamedTuple):
+    """Trades of a user, optionally restricted to accounts, an instrument
+    and an entry date range (`start_date` inclusive, `end_date` exclusive;
+    ISO dates or timestamps)
+    """
+
+    user_id: str
+    accounts: Optional[List[str]] = None
+    instrument: Optional[str] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+
+def encode_cursor(entry_date: str, trade_id: str) -> str:
+    return base64.urlsafe_b64encode(encode_message([entry_date, trade_id])).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        entry_date, trade_id = decode_message(base64.urlsafe_b64decode(cursor))
+    except Exception:
+        raise InvalidCursorError("Invalid cursor")
+    if not isinstance(entry_date, str) or not isinstance(trade_id, str):
+        raise InvalidCursorError("Invalid cursor")
+    return entry_date, trade_id
+
+
+def build_query(
+    trade_filter: TradeFilter,
+    after: Optional[Tuple[str, str]] = None,
+    descending: bool = True,
+    limit: Optional[int] = None,
+    columns: Sequence[str] = TRADE_COLUMNS,
+) -> Tuple[str, list]:
+    """SQL and arguments selecting trades in (entryDate, id) order
+
+    Uses the ("userId", "entryDate", "id") index: `after` continues from the
+    last row of the previous page instead of using OFFSET.
+    """
+    clauses = ['"userId" = $1']
+    args: list = [trade_filter.user_id]
+
+    def add(clause: str, *values):
+        placeholders = []
+        for value in values:
+            args.append(value)
+            placeholders.append(f"${len(args)}")
+        clauses.append(clause.format(*placeholders))
+
+    if trade_filter.accounts:
+        add('"accountNumber" = ANY({}::text[])', list(trade_filter.accounts))
+    if trade_filter.instrument:
+        add('"instrument" = {}', trade_filter.instrument)
+    if trade_filter.start_date:
+        add('"entryDate" >= {}', trade_filter.start_date)
+    if trade_filter.end_date:
+        add('"entryDate" < {}', trade_filter.end_date)
+    if after is not None:
+        operator = "<" if descending else ">"
+        add(f'("entryDate", "id") {operator} ({{}}, {{}})', *after)
+
+    direction = "DESC" if descending else "ASC"
+    selected = ", ".join(f'"{column}"' for column in columns)
+    sql = (
+        f'SELECT {selected} FROM "Trade" WHERE {" AND ".join(clauses)} '
+        f'ORDER BY "entryDate" {direction}, "id" {direction}'
+    )
+    if limit is not None:
+        args.append(limit)
+        sql += f" LIMIT ${len(args)}"
+    return sql, args
+
+
+async def fetch_trades_page(
+    trade_filter: TradeFilter,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    descending: bool = True,
+) -> Tuple[List[dict], Optional[str]]:
+    """One page of trades and the cursor of the next page (None at the end)"""
+    after = decode_cursor(cursor) if cursor else None
+    sql, args = build_query(trade_filter, after, descending, limit + 1)
+    pool = await db.get_async_pool()
+    with query_metrics.timed("select_trades_page") as stats:
+        async with pool.acquire() as conn:
+            records = await conn.fetch(sql, *args)
+        stats["rows"] = len(records)
+
+    trades = [dict(record) for record in records[:limit]]
+    next_cursor = None
+    if len(records) > limit:
+        last = trades[-1]
+        next_cursor = encode_cursor(last["entryDate"], last["id"])
+    return trades, next_cursor
+
+
+async def stream_trades(
+    trade_filter: TradeFilter, descending: bool = False
+) -> AsyncIterator[dict]:
+    """Every matching trade, read through a server-side cursor"""
+    sql, args = build_query(trade_filter, descending=descending)
+    pool = await db.get_async_pool()
+    with query_metrics.timed("export_trades") as stats:
+        async with pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                async for record in conn.cursor(
+                    sql, *args, prefetch=EXPORT_PREFETCH_ROWS
+                ):
+                    stats["rows"] += 1
+                    yield dict(record)
+
+
+def _rollup_where(
+    user_id: str,
+    accounts: Optional[List[str]],
+    start_day: Optional[date],
+    end_day: Optional[date],
+) -> Tuple[str, list]:
+    clauses = ['"userId" = $1']
+    args: list = [user_id]
+    if accounts:
+        args.append(list(accounts))
+        clauses.append(f'"accountNumber" = ANY(${len(args)}::text[])')
+    if start_day:
+        args.append(start_day)
+        clauses.append(f'"day" >= ${len(args)}')
+    if end_day:
+        args.append(end_day)
+        clauses.append(f'"day" < ${len(args)}')
+    return " AND ".join(clauses), args
+
+
+async def fetch_calendar(
+    user_id: str,
+    accounts: Optional[List[str]] = None,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+) -> List[dict]:
+    """Daily totals across instruments, read from the daily rollups"""
+    where, args = _rollup_where(user_id, accounts, start_day, end_day)
+    sql = (
+        f'SELECT "day", {ROLLUP_TOTALS} FROM "TradeDailyRollup" '
+        f'WHERE {where} GROUP BY "day" ORDER BY "day"'
+    )
+    pool = await db.get_async_pool()
+    with query_metrics.timed("select_rollup_calendar") as stats:
+        async with pool.acquire() as conn:
+            records = await conn.fetch(sql, *args)
+        stats["rows"] = len(records)
+    return [dict(record) for record in records]
+
+
+async def fetch_summary(
+    user_id: str,
+    group_by: Optional[str] = None,
+    accounts: Optional[List[str]] = None,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+) -> List[dict]:
+    """Totals over a period, overall or per account or instrument"""
+    if group_by is not None and group_by not in SUMMARY_GROUPS:
+        raise ValueError(f"Cannot group by {group_by}")
+    where, args = _rollup_where(user_id, accounts, start_day, end_day)
+    group = f'"{group_by}", ' if group_by else ""
+    sql = (
+        f'SELECT {group}MIN("day") AS "firstDay", MAX("day") AS "lastDay", '
+        f'COUNT(DISTINCT "day") AS "tradingDays", {ROLLUP_TOTALS} '
+        f'FROM "TradeDailyRollup" WHERE {where}'
+    )
+    if group_by:
+        sql += f' GROUP BY "{group_by}" ORDER BY "{group_by}"'
+    pool = await db.get_async_pool()
+    with query_metrics.timed("select_rollup_summary") as stats:
+        async with pool.acquire() as conn:
+            records = await conn.fetch(sql, *args)
+        stats["rows"] = len(records)
+    return [dict(record) for record in records if record["trades"]]
@@ -1,9 +1,15 @@
+import asyncio
 import logging
+from collections.abc import Mapping
 from typing import List, Tuple, Dict
 from datetime import datetime, timezone
 import uuid
 from app.models.trade import Trade, QueuedOrder, OpenPosition
+from app.core.config import settings
 from app.db.session import db
+from app.db.statements import SELECT_TICK_DETAILS
+from app.services.trade_writer import insert_trades, trade_writer
+from app.services.trade_stats import trade_stats
 
 logger = logging.getLogger(__name__)
 
@@ -25,13 +31,11 @@ def normalize_instrument(instrument: str) -> str:
 def fetch_tick_details() -> List[dict]:
     """Fetch tick details from the database"""
     try:
-        with db.get_cursor() as cursor:
-            cursor.execute('SELECT * FROM "TickDetails"')
-            tick_details = cursor.fetchall()
-            logger.info(
-                f"Successfully fetched {len(tick_details)} tick details from database"
-            )
-            return tick_details
+        tick_details = db.execute(SELECT_TICK_DETAILS, fetch=True)
+        logger.info(
+            f"Successfully fetched {len(tick_details)} tick details from database"
+        )
+        return tick_details
     except Exception as e:
         logger.error(f"Failed to fetch tick details: {e}")
         logger.exception(e)
@@ -88,66 +92,62 @@ def calculate_pnl(
 async def store_trades(trades: List[Trade], session_id: str = None) -> None:
     """Store trades in PostgreSQL database using transaction"""
     try:
-        with db.get_cursor() as cursor:
-            # Prepare all trade data as a list of tuples
-            trade_data = [
-                (
-                    trade.id,
-                    trade.userId,
-                    trade.accountNumber,
-                    trade.instrument,
-                    trade.quantity,
-                    trade.entryPrice,
-                    trade.closePrice,
-                    trade.entryDate,
-                    trade.closeDate,
-                    trade.side,
-                    trade.commission,
-                    trade.timeInPosition,
-                    trade.pnl,
-                    trade.entryId,
-                    trade.closeId,
-                    trade.comment,
-                    trade.createdAt,
-                )
-                for trade in trades
-            ]
-
-            # Execute batch insert
-            cursor.executemany(
-                """
-                INSERT INTO "Trade" (
-                    "id", "userId", "accountNumber", "instrument", 
-                    "quantity", "entryPrice", "closePrice", "entryDate", 
-                    "closeDate", "side", "commission", "timeInPosition",
-                    "pnl", "entryId", "closeId", "comment", "createdAt"
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT ("id") DO NOTHING
-                """,
-                trade_data,
+        # Prepare all trade data as a list of tuples
+        trade_data = [
+            (
+                trade.id,
+                trade.userId,
+                trade.accountNumber,
+                trade.instrument,
+                trade.quantity,
+                trade.entryPrice,
+                trade.closePrice,
+                trade.entryDate,
+                trade.closeDate,
+                trade.side,
+                trade.commission,
+                trade.timeInPosition,
+                trade.pnl,
+                trade.entryId,
+                trade.closeId,
+                trade.comment,
+                trade.createdAt,
             )
+            for trade in trades
+        ]
 
-            # Commit the transaction
-            cursor.connection.commit()
-            logger.info(f"Successfully processed {len(trades)} trades")
-
-            # Send final storage stats if we have a session
-            if session_id:
-                from app.services.websocket_service import ws_manager
-
-                await ws_manager.broadcast_to_session(
-                    session_id,
-                    {
-                        "type": "processing_complete",
-                        "trades_count": len(trades),
-                        "open_positions_count": 0,  # We don't have this info in store_trades
-                        "message": (
-                            "No trades found for the selected period"
-                            if not trades
-                            else f"Successfully processed {len(trades)} trades"
-                        ),
-                    },
-                )
+        # Execute batch insert, or hand the rows to the shared write-behind
+        # buffer and wait for them to commit
+        if settings.TRADE_WRITE_BUFFER_ENABLED:
+            await trade_writer.write(trade_data)
+        else:
+            insert_trades(trade_data)
+
+        # Cached statistics of these users are now stale (the version bump
+        # talks to Redis, so keep it off the event loop)
+        await asyncio.get_running_loop().run_in_executor(
+            None, trade_stats.invalidate, {trade.userId for trade in trades}
+        )
+
+        logger.info(f"Successfully processed {len(trades)} trades")
+
+        # Send final storage stats if we have a session
+        if session_id:
+            from app.services.websocket_service import ws_manager
+
+            await ws_manager.broadcast_to_session(
+                session_id,
+                {
+                    "type": "processing_complete",
+                    "trades_count": len(trades),
+                    "open_positions_count": 0,  # We don't have this info in store_trades
+                    "message": (
+                        "No trades found for the selected period"
+                        if not trades
+                        else f"Successfully processed {len(trades)} trades"
+                    ),
+                },
+            )
 
     except Exception as e:
         logger.error(f"Failed to store trades: {e}")
@@ -164,9 +164,13 @@ async def store_trades(trades: List[Trade], session_id: str = None) -> None:
 
 
 def process_orders(
-    orders_data: dict, user_id: str, tick_details: List[dict] = None
+    orders_data: Mapping, user_id: str, tick_details: List[dict] = None
 ) -> Tuple[List[Trade], List[OpenPosition]]:
-    """Process orders into trades and open positions"""
+    """Process orders into trades and open positions
+
+    orders_data maps account ids to order lists: a dict, or an OrderSet read
+    from the result store, whose accounts are decoded one at a time.
+    """
     try:
         if tick_details is None:
             tick_details = fetch_tick_details()
@@ -176,8 +180,8 @@ def process_orders(
         processed_order_ids: set = set()
         open_positions: List[OpenPosition] = []
 
-        if not isinstance(orders_data, dict):
-            logger.error("Invalid orders data format: not a dictionary")
+        if not isinstance(orders_data, Mapping):
+            logger.error("Invalid orders data format: not a mapping")
             return [], []
 
         account_ids = [
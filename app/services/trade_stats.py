@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, NamedTuple, Optional
+import numpy as np
+import redis
+from app.core.config import settings
+from app.db.metrics import query_metrics
+from app.db.session import db
+from app.services.redis_service import redis_url
+from app.services.trade_query import TradeFilter, build_query
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+STATS_COLUMNS = ("instrument", "closeDate", "pnl", "commission", "timeInPosition")
+
+# Shared per-user versions live in "stats:version:<userId>"
+VERSION_KEY_PREFIX = "stats:version:"
+VERSION_KEY_TTL_SECONDS = 30 * 24 * 3600
+
+# After a Redis error, versions are only tracked locally for this long
+REDIS_RETRY_SECONDS = 30
+
+
+class TradeColumns(NamedTuple):
+    """A user's trades as one array per column"""
+
+    instrument: np.ndarray
+    close_date: np.ndarray
+    pnl: np.ndarray
+    commission: np.ndarray
+    time_in_position: np.ndarray
+
+    @classmethod
+    def from_records(cls, records) -> "TradeColumns":
+        if not records:
+            empty = np.array([], dtype=np.float64)
+            return cls(
+                np.array([], dtype=object),
+                np.array([], dtype=object),
+                empty,
+                empty,
+                empty,
+            )
+        instrument, close_date, pnl, commission, time_in_position = zip(*records)
+        return cls(
+            np.array(instrument, dtype=object),
+            np.array(close_date, dtype=object),
+            np.array(pnl, dtype=np.float64),
+            np.nan_to_num(np.array(commission, dtype=np.float64)),
+            np.nan_to_num(np.array(time_in_position, dtype=np.float64)),
+        )
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(float(value), 2)
+
+
+def _ratio(numerator: float, denominator: float) -> Optional[float]:
+    return float(numerator) / float(denominator) if denominator else None
+
+
+def _summary(
+    count, wins, losses, gross_profit, gross_loss, pnl, commission, time_in_position
+) -> dict:
+    net_pnl = pnl - commission
+    return {
+        "trades": int(count),
+        "wins": int(wins),
+        "losses": int(losses),
+        "win_rate": _ratio(wins, count),
+        "pnl": _round(pnl),
+        "commission": _round(commission),
+        "net_pnl": _round(net_pnl),
+        "gross_profit": _round(gross_profit),
+        "gross_loss": _round(gross_loss),
+        "profit_factor": _ratio(gross_profit, gross_loss),
+        "expectancy": _round(_ratio(net_pnl, count)),
+        "average_win": _round(_ratio(gross_profit, wins)),
+        "average_loss": _round(_ratio(gross_loss, losses)),
+        "average_time_in_position": _ratio(time_in_position, count),
+    }
+
+
+def compute_stats(columns: TradeColumns) -> dict:
+    """Win rate, profit factor, expectancy, drawdown and per-instrument stats
+
+    Results use PnL net of commissions. Drawdown is measured on the equity
+    curve of trades in closing order, from a starting balance of zero.
+    """
+    net = columns.pnl - columns.commission
+    wins = net > 0
+    losses = net < 0
+    winning = np.where(wins, net, 0.0)
+    losing = np.where(losses, -net, 0.0)
+
+    stats = _summary(
+        len(net),
+        wins.sum(),
+        losses.sum(),
+        winning.sum(),
+        losing.sum(),
+        columns.pnl.sum(),
+        columns.commission.sum(),
+        columns.time_in_position.sum(),
+    )
+
+    max_drawdown = 0.0
+    stats["largest_win"] = stats["largest_loss"] = None
+    if len(net):
+        equity = np.cumsum(net[np.argsort(columns.close_date, kind="stable")])
+        peak = np.maximum.accumulate(np.maximum(equity, 0.0))
+        max_drawdown = float((peak - equity).max())
+        stats["largest_win"] = _round(net.max()) if wins.any() else None
+        stats["largest_loss"] = _round(net.min()) if losses.any() else None
+    stats["max_drawdown"] = _round(max_drawdown)
+
+    names, index = np.unique(columns.instrument.astype(str), return_inverse=True)
+    size = len(names)
+    per_instrument = zip(
+        names,
+        np.bincount(index, minlength=size),
+        np.bincount(index, weights=wins, minlength=size),
+        np.bincount(index, weights=losses, minlength=size),
+        np.bincount(index, weights=winning, minlength=size),
+        np.bincount(index, weights=losing, minlength=size),
+        np.bincount(index, weights=columns.pnl, minlength=size),
+        np.bincount(index, weights=columns.commission, minlength=size),
+        np.bincount(index, weights=columns.time_in_position, minlength=size),
+    )
+    stats["instruments"] = {
+        str(name): _summary(*totals) for name, *totals in per_instrument
+    }
+    return stats
+
+
+class StatsVersions:
+    """Per-user version of trade data, bumped whenever trades are inserted
+
+    Versions are shared through Redis so that inserts in any process
+    invalidate cached stats everywhere; a local counter keeps this
+    process's own inserts visible when Redis is unavailable.
+    """
+
+    def __init__(self):
+        self._local: Dict[str, int] = {}
+        self._client: Optional[redis.Redis] = None
+        self._retry_at = 0.0
+
+    def _redis(self) -> Optional[redis.Redis]:
+        if time.monotonic() < self._retry_at:
+            return None
+        if self._client is None:
+            self._client = redis.Redis.from_url(
+                redis_url(), socket_timeout=1, socket_connect_timeout=1
+            )
+        return self._client
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning(f"Stats versions not shared for {REDIS_RETRY_SECONDS}s: {e}")
+        self._retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+    def bump(self, user_ids: Iterable[str]) -> None:
+        user_ids = set(user_ids)
+        for user_id in user_ids:
+            self._local[user_id] = self._local.get(user_id, 0) + 1
+        client = self._redis()
+        if client is None or not user_ids:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.incr(VERSION_KEY_PREFIX + user_id)
+                pipe.expire(VERSION_KEY_PREFIX + user_id, VERSION_KEY_TTL_SECONDS)
+            pipe.execute()
+        except redis.RedisError as e:
+            self._redis_failed(e)
+
+    def get(self, user_id: str) -> str:
+        shared = None
+        client = self._redis()
+        if client is not None:
+            try:
+                shared = client.get(VERSION_KEY_PREFIX + user_id)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        shared = shared.decode() if isinstance(shared, bytes) else shared
+        return f"{shared or 0}.{self._local.get(user_id, 0)}"
+
+
+async def load_trade_columns(trade_filter: TradeFilter) -> TradeColumns:
+    sql, args = build_query(trade_filter, descending=False, columns=STATS_COLUMNS)
+    pool = await db.get_async_pool()
+    with query_metrics.timed("select_trade_stats_columns") as stats:
+        async with pool.acquire() as conn:
+            records = await conn.fetch(sql, *args)
+        stats["rows"] = len(records)
+    return TradeColumns.from_records(records)
+
+
+class TradeStatsService:
+    """Trade statistics per user and filter, cached until the user's trades
+    change (or for at most STATS_CACHE_TTL_SECONDS)
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.versions = StatsVersions()
+        self._cache = TTLCache(ttl_seconds, max_entries=max_entries)
+
+    @staticmethod
+    def cache_key(trade_filter: TradeFilter, version: str) -> tuple:
+        accounts = tuple(sorted(trade_filter.accounts or ()))
+        return (*trade_filter._replace(accounts=accounts), version)
+
+    async def get(self, trade_filter: TradeFilter) -> dict:
+        loop = asyncio.get_running_loop()
+        version = await loop.run_in_executor(
+            None, self.versions.get, trade_filter.user_id
+        )
+        key = self.cache_key(trade_filter, version)
+        stats = self._cache.get(key)
+        if stats is None:
+            columns = await load_trade_columns(trade_filter)
+            stats = await loop.run_in_executor(None, compute_stats, columns)
+            self._cache.set(key, stats)
+        return stats
+
+    def invalidate(self, user_ids: Iterable[str]) -> None:
+        """Mark users' trades as changed"""
+        self.versions.bump(user_ids)
+
+
+trade_stats = TradeStatsService(
+    settings.STATS_CACHE_TTL_SECONDS, settings.STATS_CACHE_MAX_ENTRIES
+)
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from typing import List, Optional, Sequence, Tuple
+from app.core.config import settings
+from app.db.session import db
+from app.db.statements import INSERT_TRADES_WITH_ROLLUPS
+
+logger = logging.getLogger(__name__)
+
+# Trades sent per statement, as one array parameter per column
+INSERT_BATCH_ROWS = 1000
+
+
+def insert_trades(rows: Sequence[tuple]) -> None:
+    """Insert trade rows and add them to the daily rollups, in one transaction"""
+    batches = [
+        [list(column) for column in zip(*rows[start : start + INSERT_BATCH_ROWS])]
+        + [settings.TRADING_DAY_TIMEZONE]
+        for start in range(0, len(rows), INSERT_BATCH_ROWS)
+    ]
+    db.execute_many(INSERT_TRADES_WITH_ROLLUPS, batches)
+
+
+class TradeWriteBuffer:
+    """Write-behind buffer for trade inserts, shared by all sessions of a process.
+
+    Rows from concurrent `write` calls are inserted together in one
+    transaction when `max_rows` rows are pending or `flush_interval` seconds
+    after the first one, whichever comes first. Each `write` returns only
+    once its rows have committed (or raises the flush's error), so callers
+    can notify their session afterwards. `close` flushes what is left.
+    """
+
+    def __init__(self, max_rows: int = None, flush_interval: float = None):
+        self.max_rows = max_rows or settings.TRADE_WRITE_BUFFER_MAX_ROWS
+        self.flush_interval = (
+            flush_interval
+            if flush_interval is not None
+            else settings.TRADE_WRITE_BUFFER_FLUSH_INTERVAL
+        )
+        self._pending: List[Tuple[Sequence[tuple], asyncio.Future]] = []
+        self._rows = 0
+        self._lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def write(self, rows: Sequence[tuple]) -> None:
+        """Queue trade rows and wait until they are committed"""
+        if not rows:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((rows, future))
+        self._rows += len(rows)
+
+        if self._rows >= self.max_rows:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+        await future
+
+    async def flush(self):
+        """Insert every pending row in one transaction"""
+        if self._flush_task is not None:
+            if self._flush_task is not asyncio.current_task():
+                self._flush_task.cancel()
+            self._flush_task = None
+
+        async with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending, self._rows = self._pending, [], 0
+
+            # Insert in primary key order so concurrent flushes from other
+            # processes take row locks in the same order
+            rows = sorted(
+                (row for rows, _ in pending for row in rows), key=lambda r: r[0]
+            )
+            try:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, insert_trades, rows)
+                logger.info(f"Flushed {len(rows)} trades from {len(pending)} writers")
+            except Exception as e:
+                logger.error(f"Failed to flush {len(rows)} trades: {e}")
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for _, future in pending:
+                if not future.done():
+                    future.set_result(None)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def close(self):
+        await self.flush()
+
+
+trade_writer = TradeWriteBuffer()
@@ -1,10 +1,25 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Set, Dict, Optional, List
+from typing import Coroutine, Set, Dict, Optional, List
+import asyncio
 import logging
+import math
+import uuid
 from datetime import datetime
 from app.models.websocket import WebSocketState, WebSocketMessage
 from app.models.trade import OrderRequest
 from app.services.trade_service import process_orders, store_trades
+from app.core.config import settings
+from app.services.client_connection import (
+    IDLE_CLOSE_CODE,
+    ClientConnection,
+    OutboundFrame,
+)
+from app.services.message_history import HistoryEntry
+from app.services.redis_service import RedisManager
+from app.services.session_store import MemorySessionStore, RedisSessionStore
+from app.utils.serialization import WireCodec, encode_message, decode_message
+from app.utils.ttl_cache import TTLCache
+from starlette.websockets import WebSocketState as SocketState
 import jwt
 import os
 import json
@@ -12,6 +27,31 @@ from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
 
+# Message types that are neither cached nor sequenced
+EPHEMERAL_TYPES = ("status", "log")
+
+# Message types carrying orders; a snapshot of the orders cache supersedes them
+ORDER_TYPES = (
+    "orders",
+    "order_update",
+    "order_updates",
+    "orders_chunk",
+    "orders_complete",
+)
+
+# Order stream frames, sent only to clients that negotiated `chunked_orders`.
+# Other clients get each chunk's orders as `order_update` frames (or one
+# `order_updates` frame with `batch_order_updates`) and, instead of
+# `orders_complete`, an `orders` frame carrying the whole payload.
+CHUNKED_ORDER_TYPES = ("orders_chunk", "orders_complete")
+
+# Message types dropped first when a session's history is over budget; all are
+# superseded by the orders cache and later progress frames.
+HISTORY_EVICT_FIRST = ORDER_TYPES + ("progress",)
+
+# Room left in each snapshot chunk for the frame envelope
+SNAPSHOT_ENVELOPE_BYTES = 256
+
 # JWT utilities
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
 
@@ -23,39 +63,213 @@ def decode_session_token(token: str) -> dict:
         raise WebSocketDisconnect(code=4001)
 
 
+def chunk_encoded(items: List[bytes], max_bytes: int) -> List[List[bytes]]:
+    """Split encoded items into consecutive groups of at most max_bytes each.
+
+    An item larger than max_bytes on its own gets a group to itself.
+    """
+    chunks: List[List[bytes]] = []
+    current: List[bytes] = []
+    size = 0
+    for item in items:
+        if current and size + len(item) + 1 > max_bytes:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(item)
+        size += len(item) + 1
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def contiguous_seq(entries: List[HistoryEntry], after_seq: int) -> int:
+    """Highest seq such that every message from after_seq + 1 up to it is in entries"""
+    seq = after_seq
+    for entry in entries:
+        if entry.seq != seq + 1:
+            break
+        seq = entry.seq
+    return seq
+
+
+class SessionRelay:
+    """Relay of a leader session's broadcasts into a follower session
+
+    Frames arriving while the leader's history is being replayed are held in
+    `backlog`; once `after_seq` is set, sequenced frames up to it (already
+    replayed) are skipped. While the relay exists it counts as a client of
+    the leader (as `client_id`), so the leader's job is not cancelled as
+    abandoned.
+    """
+
+    def __init__(self, follower_session_id: str):
+        self.follower_session_id = follower_session_id
+        self.client_id = f"relay:{follower_session_id}"
+        self.after_seq: Optional[int] = None
+        self.backlog: List[tuple] = []
+
+
+def parse_last_seq(value) -> Optional[int]:
+    """Parse a client-supplied last sequence number, None if absent or invalid"""
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_flag(data: dict, name: str) -> Optional[bool]:
+    """Parse a client-supplied boolean option, None if the message omits it"""
+    return bool(data[name]) if name in data else None
+
+
 class WebSocketManager:
     def __init__(self):
-        self.sessions: Dict[str, Set[WebSocket]] = {}
-        self.states: Dict[str, WebSocketState] = {}
-        self.messages: Dict[str, List[dict]] = {}  # Cache for messages
-        self.orders_cache: Dict[str, Dict[str, dict]] = (
-            {}
-        )  # session_id -> order_id -> order_data
-        self.last_connection_times: Dict[str, datetime] = (
-            {}
-        )  # Track last connection time per session
-        self.connection_cooldown = 1800  # 30 minutes in seconds
-
-    async def connect(self, websocket: WebSocket, session_id: str):
-        """Connect a WebSocket client to a session"""
+        self.sessions: Dict[str, Set[WebSocket]] = {}  # Clients on this worker
+        self.store = MemorySessionStore(history_evict_first=HISTORY_EVICT_FIRST)
+        # Last connection time per session, kept only for the cooldown period
+        self.last_connection_times = TTLCache(
+            settings.WS_CONNECTION_COOLDOWN_SECONDS,
+            max_entries=settings.WS_RATE_LIMIT_MAX_ENTRIES,
+        )
+        self.heartbeat_interval = settings.WS_HEARTBEAT_INTERVAL_SECONDS
+        self.idle_timeout = settings.WS_IDLE_TIMEOUT_SECONDS
+        self.max_message_size = settings.WS_MAX_MESSAGE_SIZE
+        self.max_header_size = settings.WS_MAX_HEADER_SIZE
+        self.send_timeout = settings.WS_SEND_TIMEOUT_SECONDS
+        self.clients: Dict[WebSocket, ClientConnection] = {}  # Outbound side
+        # leader session_id -> follower session_id -> relay, for followers
+        # whose job runs on this worker
+        self.relays: Dict[str, Dict[str, SessionRelay]] = {}
+        self._subscriber: Optional[asyncio.Task] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def use_redis(self, redis: RedisManager) -> None:
+        """Share session state and broadcasts with other workers through Redis
+
+        Must be called on startup, after the Redis connection is initialized.
+        Starts one pub/sub subscriber for this worker that delivers broadcasts
+        for any session to the clients connected here.
+        """
+        self.store = RedisSessionStore(redis)
+        self._subscriber = asyncio.create_task(
+            redis.listen(RedisSessionStore.channel("*"), self._on_published)
+        )
+        logger.info("WebSocket sessions are shared through Redis")
+
+    async def shutdown(self) -> None:
+        if self._subscriber is not None:
+            self._subscriber.cancel()
+            self._subscriber = None
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+
+    def _ensure_heartbeat(self) -> None:
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._run_heartbeat())
+
+    async def _run_heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Error in WebSocket heartbeat: {e}")
+
+    async def reap(self) -> int:
+        """Close dead or idle clients and ping the others
+
+        A client is idle once nothing, pongs included, has been received from
+        it for `idle_timeout` seconds. Only clients taking part in the
+        heartbeat (see ClientConnection.heartbeat) are closed for being idle;
+        others stay connected until their socket is closed. Returns the number
+        of clients closed.
+        """
+        reaped = 0
+        for client in list(self.clients.values()):
+            dead = (
+                client.closed
+                or getattr(client.websocket, "client_state", None)
+                == SocketState.DISCONNECTED
+            )
+            idle = client.heartbeat and client.idle_seconds > self.idle_timeout
+            if dead or idle:
+                logger.info(
+                    f"Closing {'dead' if dead else 'idle'} client in session {client.session_id}"
+                )
+                await client.close(code=IDLE_CLOSE_CODE, reason="Connection idle")
+                reaped += 1
+            else:
+                client.ping()
+        await self._track_clients()
+        self.last_connection_times.purge()
+        return reaped
+
+    async def _track_clients(self) -> None:
+        """Refresh the cross-worker liveness of clients connected here"""
+        by_session: Dict[str, List[str]] = {}
+        for client in self.clients.values():
+            if not client.closed:
+                by_session.setdefault(client.session_id, []).append(client.client_id)
+        for leader_session_id, followers in self.relays.items():
+            by_session.setdefault(leader_session_id, []).extend(
+                relay.client_id for relay in followers.values()
+            )
+        for session_id, client_ids in by_session.items():
+            try:
+                await self.store.track_clients(session_id, client_ids)
+            except Exception as e:
+                logger.warning(f"Failed to track clients of session {session_id}: {e}")
+
+    def is_connected(self, websocket: WebSocket) -> bool:
+        client = self.clients.get(websocket)
+        return client is not None and not client.closed
+
+    def touch(self, websocket: WebSocket) -> None:
+        """Record activity from a client"""
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.touch()
+
+    def handle_pong(self, websocket: WebSocket, ping_id) -> Optional[float]:
+        """Record a client's pong; returns the round-trip time in seconds"""
+        client = self.clients.get(websocket)
+        if client is None:
+            return None
+        rtt = client.pong(ping_id)
+        if rtt is not None:
+            logger.debug(
+                f"RTT for client in session {client.session_id}: {rtt * 1000:.1f} ms"
+            )
+        return rtt
+
+    async def connect(
+        self, websocket: WebSocket, session_id: str, last_seq: Optional[int] = None
+    ):
+        """Connect a WebSocket client to a session
+
+        The wire format can be negotiated with the `encoding`, `compression`
+        and `order_layout` query parameters (see set_client_options); plain
+        JSON text frames are the default.
+
+        A reconnecting client passes the last sequence number it received,
+        either as `last_seq` or as the `last_seq` query parameter, and is sent
+        only what it missed.
+        """
         try:
             # Check rate limit
             current_time = datetime.now()
             if session_id in self.last_connection_times:
-                time_since_last_connection = (
-                    current_time - self.last_connection_times[session_id]
-                ).total_seconds()
-                if time_since_last_connection < self.connection_cooldown:
-                    remaining_time = int(
-                        self.connection_cooldown - time_since_last_connection
-                    )
-                    logger.warning(
-                        f"Rate limit exceeded for session {session_id}. Please wait {remaining_time} seconds."
-                    )
-                    raise WebSocketDisconnect(
-                        code=4004,
-                        reason=f"Rate limit exceeded. Please wait {remaining_time} seconds.",
-                    )
+                remaining_time = math.ceil(
+                    self.last_connection_times.remaining(session_id)
+                )
+                logger.warning(
+                    f"Rate limit exceeded for session {session_id}. Please wait {remaining_time} seconds."
+                )
+                raise WebSocketDisconnect(
+                    code=4004,
+                    reason=f"Rate limit exceeded. Please wait {remaining_time} seconds.",
+                )
 
             # Check header size
             headers = dict(websocket.headers)
@@ -72,129 +286,561 @@ class WebSocketManager:
             await websocket.accept()
 
             # Update last connection time
-            self.last_connection_times[session_id] = current_time
+            self.last_connection_times.set(session_id, current_time)
 
             if session_id not in self.sessions:
                 self.sessions[session_id] = set()
-                self.messages[session_id] = []
-                self.orders_cache[session_id] = {}
+                await self.store.open_session(session_id)
 
             self.sessions[session_id].add(websocket)
             logger.info(f"Client connected to session {session_id}")
 
-            # Send cached messages and orders
-            if self.messages[session_id]:
-                for message in self.messages[session_id]:
-                    try:
-                        message_size = len(str(message).encode("utf-8"))
-                        if message_size > self.max_message_size:
-                            logger.warning(
-                                f"Message size ({message_size} bytes) exceeds limit ({self.max_message_size} bytes)"
-                            )
-                            continue
-                        await websocket.send_json(message)
-                    except Exception as e:
-                        logger.error(f"Error sending cached message: {e}")
-
-            if self.orders_cache[session_id]:
-                try:
-                    orders_message = {
-                        "type": "initial_data",
-                        "orders": list(self.orders_cache[session_id].values()),
-                    }
-                    message_size = len(str(orders_message).encode("utf-8"))
-                    if message_size <= self.max_message_size:
-                        await websocket.send_json(orders_message)
-                    else:
-                        logger.warning(
-                            f"Orders message size ({message_size} bytes) exceeds limit"
-                        )
-                except Exception as e:
-                    logger.error(f"Error sending initial orders data: {e}")
+            if last_seq is None:
+                last_seq = parse_last_seq(websocket.query_params.get("last_seq"))
+            client = ClientConnection(
+                websocket,
+                session_id,
+                resync=self._resync,
+                on_closed=self._on_client_closed,
+                max_queue=settings.WS_CLIENT_QUEUE_MAX_ITEMS,
+                policy=settings.WS_SLOW_CONSUMER_POLICY,
+                max_backlog_seconds=settings.WS_MAX_BACKLOG_SECONDS,
+                send_timeout=self.send_timeout,
+                max_message_size=self.max_message_size,
+            )
+            self.clients[websocket] = client
+            await self.store.track_clients(session_id, [client.client_id])
+            self.set_client_options(
+                websocket,
+                encoding=websocket.query_params.get("encoding"),
+                compression=websocket.query_params.get("compression"),
+                order_layout=websocket.query_params.get("order_layout"),
+            )
+            # The writer brings the client up to date before live frames
+            client.start(last_seq)
+            self._ensure_heartbeat()
 
         except Exception as e:
             logger.error(f"Error in WebSocket connection: {e}")
             await self.disconnect(websocket, session_id)
             raise
 
+    def resync(self, websocket: WebSocket, last_seq: Optional[int] = None) -> None:
+        """Ask for a client to be brought up to date from last_seq"""
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.request_resync(last_seq)
+
+    async def _resync(
+        self, client: ClientConnection, last_seq: Optional[int] = None
+    ) -> int:
+        """Bring one client up to date with a session, from its writer task
+
+        If the history still holds every message after `last_seq` and the gap
+        is small, only those deltas are replayed. Otherwise the client gets a
+        snapshot: a `resync` header, the cached orders as size-bounded
+        `snapshot` chunks, then the non-order messages from the history.
+        Returns the sequence number the client is now up to date with.
+
+        With a shared store a sequence number may be allocated by another
+        worker before its message is recorded, so only the unbroken run of
+        recorded messages is claimed; later ones still arrive live.
+        """
+        session_id = client.session_id
+        current_seq = await self.store.current_seq(session_id)
+
+        if last_seq is not None:
+            missing = await self.store.messages_since(session_id, last_seq)
+            if (
+                missing is not None
+                and len(missing) <= settings.WS_RESUME_MAX_DELTA_ITEMS
+            ):
+                synced_seq = (
+                    contiguous_seq(missing, last_seq)
+                    if self.store.shared
+                    else current_seq
+                )
+                missing = [entry for entry in missing if entry.seq <= synced_seq]
+                await self._send_message(
+                    client,
+                    {
+                        "type": "resync",
+                        "mode": "delta",
+                        "from_seq": last_seq,
+                        "seq": synced_seq,
+                        "count": len(missing),
+                    },
+                )
+                for entry in missing:
+                    await self._replay_entry(client, entry)
+                return synced_seq
+
+        # Read the history before the orders cache, so every order carried by
+        # a claimed message is already cached
+        history = await self.store.history(session_id)
+        if self.store.shared:
+            current_seq = contiguous_seq(history, history[0].seq - 1) if history else 0
+        encoded_orders = await self.store.encoded_orders(session_id)
+        chunks = chunk_encoded(
+            encoded_orders, self.max_message_size - SNAPSHOT_ENVELOPE_BYTES
+        )
+        await self._send_message(
+            client,
+            {
+                "type": "resync",
+                "mode": "snapshot",
+                "seq": current_seq,
+                "chunks": len(chunks),
+                "orders_count": len(encoded_orders),
+            },
+        )
+        for index, chunk in enumerate(chunks):
+            frame = (
+                b'{"type":"snapshot","seq":%d,"chunk":%d,"chunks":%d,"orders":['
+                % (current_seq, index, len(chunks))
+                + b",".join(chunk)
+                + b"]}"
+            )
+            await client.send_text(frame.decode("utf-8"))
+        for entry in history:
+            if entry.type not in ORDER_TYPES and entry.seq <= current_seq:
+                await self._replay_entry(client, entry)
+        return current_seq
+
+    async def _replay_entry(self, client: ClientConnection, entry: HistoryEntry):
+        """Send a cached message in the format this client negotiated
+
+        The history only keeps `orders_complete`, so clients without
+        `chunked_orders` do not get the `orders` frame again; they already
+        have every order through the replayed chunks.
+        """
+        text = entry.payload.decode("utf-8")
+        mode = self._order_mode(client, entry.type)
+        for frame in self._render(mode, entry.type, entry.seq, text):
+            await client.send_text(frame)
+
+    @staticmethod
+    def _order_mode(client: ClientConnection, kind: str) -> str:
+        """Frame type a client is sent for a broadcast of the given kind"""
+        chunked = bool(client.options.get("chunked_orders"))
+        batched = bool(client.options.get("batch_order_updates"))
+        if kind == "orders_chunk" and not chunked:
+            return "order_updates" if batched else "order_update"
+        if kind == "orders_complete" and not chunked:
+            return "orders"
+        return kind
+
+    @staticmethod
+    def _render(
+        mode: str,
+        kind: str,
+        seq: Optional[int],
+        text: str,
+        legacy_frames: List[str] = None,
+    ) -> List[str]:
+        """Frames of a broadcast as sent to clients in the given mode
+
+        The `orders` frame is supplied by the producer as `legacy_frames`;
+        `order_updates` and `order_update` frames are derived from the orders
+        of an `orders_chunk`.
+        """
+        if mode == kind:
+            return [text]
+        if mode == "orders":
+            return list(legacy_frames or ())
+        orders = decode_message(text).get("orders", [])
+        if mode == "order_updates":
+            frame = {
+                "type": "order_updates",
+                "seq": seq,
+                "count": len(orders),
+                "orders": orders,
+            }
+            return [encode_message(frame).decode("utf-8")]
+        return [
+            encode_message({"type": "order_update", "seq": seq, "order": order}).decode(
+                "utf-8"
+            )
+            for order in orders
+        ]
+
+    async def _send_message(self, client: ClientConnection, message: dict):
+        await client.send_text(encode_message(message).decode("utf-8"))
+
+    def send_to_client(self, websocket: WebSocket, message: dict) -> bool:
+        """Queue an unsequenced message for one client"""
+        client = self.clients.get(websocket)
+        if client is None:
+            return False
+        return client.enqueue(OutboundFrame([encode_message(message).decode("utf-8")]))
+
+    async def _on_client_closed(self, client: ClientConnection):
+        await self.disconnect(client.websocket, client.session_id)
+
+    def has_local_clients(self, session_id: str) -> bool:
+        """True if a client of the session is connected to this worker"""
+        return bool(self.sessions.get(session_id))
+
+    async def has_clients(self, session_id: str) -> bool:
+        """True if a client of the session, or a session following it, is
+        connected to any worker
+        """
+        return (
+            self.has_local_clients(session_id)
+            or bool(self.relays.get(session_id))
+            or await self.store.has_clients(session_id)
+        )
+
     async def disconnect(self, websocket: WebSocket, session_id: str):
         """Disconnect a WebSocket client from a session"""
+        client = self.clients.pop(websocket, None)
+        if client is not None:
+            client.stop()
+            try:
+                await self.store.untrack_client(session_id, client.client_id)
+            except Exception as e:
+                logger.warning(f"Failed to untrack client of session {session_id}: {e}")
         if session_id in self.sessions:
-            self.sessions[session_id].remove(websocket)
+            self.sessions[session_id].discard(websocket)
             if not self.sessions[session_id]:
                 # Clean up session data when last client disconnects
                 del self.sessions[session_id]
-                if session_id in self.states:
-                    del self.states[session_id]
-                if session_id in self.messages:
-                    del self.messages[session_id]
-                if session_id in self.orders_cache:
-                    del self.orders_cache[session_id]
-                # Don't delete last_connection_times as we want to maintain the rate limit
+                await self.store.close_session(session_id)
+                # last_connection_times entries expire on their own after the cooldown
             logger.info(f"Client disconnected from session {session_id}")
 
     async def broadcast_to_session(self, session_id: str, message: dict):
-        """Broadcast a message to all clients in a session"""
-        if session_id not in self.sessions:
+        """Broadcast a message to all clients in a session
+
+        Messages other than status and log updates are stamped with the next
+        per-session sequence number and kept in the session history. With a
+        shared store the message is published so every worker delivers it to
+        its own clients.
+
+        The size limit (WS_MAX_MESSAGE_SIZE) applies to each client's encoded
+        frame, so a message that only fits once compressed still reaches the
+        clients that negotiated compression; other clients get an error frame
+        in its place (see ClientConnection).
+        """
+        if not self.store.has_session(session_id):
             return
 
-        # Check message size
-        message_size = len(str(message).encode("utf-8"))
-        if message_size > self.max_message_size:
-            logger.warning(
-                f"Message size ({message_size} bytes) exceeds limit ({self.max_message_size} bytes)"
-            )
-            message = {
-                "type": "error",
-                "message": "Message size exceeds limit",
-                "size": message_size,
-                "limit": self.max_message_size,
-            }
+        cacheable = message.get("type") not in EPHEMERAL_TYPES
+        seq = await self.store.next_seq(session_id) if cacheable else None
+        if seq is not None:
+            message = {**message, "seq": seq}
 
-        # Cache message if it's not a temporary status update
-        if message.get("type") not in ["status", "log"]:
-            self.messages[session_id].append(message)
+        # Encode once; each client's writer encodes it for the wire
+        payload = encode_message(message)
 
-        # Cache orders if it's an order update
+        # Cache message if it's not a temporary status update, and orders if
+        # it's an order update
+        text = payload.decode("utf-8")
+        orders = []
         if message.get("type") == "order_update" and "order" in message:
-            order_data = message["order"]
-            if "order_id" in order_data:
-                self.orders_cache[session_id][order_data["order_id"]] = order_data
+            orders = [message["order"]]
+        await self._commit_and_deliver(
+            session_id,
+            seq,
+            message.get("type"),
+            payload,
+            "message",
+            text,
+            orders=orders,
+            encoded_orders=[encode_message(order) for order in orders],
+        )
 
-        disconnected = set()
-        for connection in self.sessions[session_id]:
+    async def _commit_and_deliver(
+        self,
+        session_id: str,
+        seq: Optional[int],
+        message_type: Optional[str],
+        payload: bytes,
+        kind: str,
+        text: str,
+        orders: List[dict] = (),
+        encoded_orders: List[bytes] = (),
+        legacy_frames: List[str] = None,
+    ):
+        """Record a broadcast in the store and hand it to every serving worker
+
+        A shared store records and publishes in one operation and each worker's
+        subscriber delivers to its own clients; otherwise clients connected
+        here are sent the frame directly. `legacy_frames` are published along
+        with the frame (one per line; encoded JSON has no raw newlines) but
+        are not kept in the history.
+        """
+        envelope = None
+        if self.store.shared:
+            envelope = "\n".join([kind, str(seq or ""), text, *(legacy_frames or ())])
+        await self.store.commit(
+            session_id,
+            seq,
+            message_type,
+            payload,
+            orders=orders,
+            encoded_orders=encoded_orders,
+            envelope=envelope,
+        )
+        if not self.store.shared:
+            self._deliver(session_id, kind, seq, text, legacy_frames)
+            await self._relay(session_id, seq, text, legacy_frames)
+
+    async def _on_published(self, channel: str, data: str):
+        """Deliver a frame published by any worker to local clients"""
+        session_id = RedisSessionStore.session_from_channel(channel)
+        if session_id not in self.sessions and session_id not in self.relays:
+            return
+        kind, seq, text, *legacy_frames = data.split("\n")
+        seq = int(seq) if seq else None
+        legacy_frames = legacy_frames or None
+        self._deliver(session_id, kind, seq, text, legacy_frames)
+        await self._relay(session_id, seq, text, legacy_frames)
+
+    async def follow(self, session_id: str, leader_session_id: str) -> None:
+        """Relay another session's broadcasts into this session
+
+        Used when a session asks for a sync another session is already
+        running: the leader's history so far is replayed, then its live
+        frames are relayed (from any worker, with a shared store) until
+        `unfollow` is called. Relayed frames get this session's sequence
+        numbers and are cached in its history like its own broadcasts.
+        """
+        relay = SessionRelay(session_id)
+        self.relays.setdefault(leader_session_id, {})[session_id] = relay
+        try:
+            await self.store.track_clients(leader_session_id, [relay.client_id])
+        except Exception as e:
+            logger.warning(
+                f"Failed to track follower of session {leader_session_id}: {e}"
+            )
+        after_seq = await self.store.current_seq(leader_session_id)
+        for entry in await self.store.history(leader_session_id):
+            if entry.seq <= after_seq:
+                await self._relay_frame(session_id, entry.payload.decode("utf-8"))
+        while relay.backlog:
+            seq, text, legacy_frames = relay.backlog.pop(0)
+            if seq is None or seq > after_seq:
+                await self._relay_frame(session_id, text, legacy_frames)
+        relay.after_seq = after_seq
+
+    async def unfollow(self, session_id: str, leader_session_id: str) -> None:
+        followers = self.relays.get(leader_session_id, {})
+        relay = followers.pop(session_id, None)
+        if not followers:
+            self.relays.pop(leader_session_id, None)
+        if relay is not None:
             try:
-                await connection.send_json(message)
+                await self.store.untrack_client(leader_session_id, relay.client_id)
             except Exception as e:
-                logger.error(f"Error broadcasting to client: {e}")
-                disconnected.add(connection)
+                logger.warning(
+                    f"Failed to untrack follower of session {leader_session_id}: {e}"
+                )
 
-        # Clean up disconnected clients
-        for conn in disconnected:
-            await self.disconnect(conn, session_id)
+    async def _relay(
+        self,
+        session_id: str,
+        seq: Optional[int],
+        text: str,
+        legacy_frames: List[str] = None,
+    ) -> None:
+        """Relay a frame of session_id to the sessions following it"""
+        for relay in list(self.relays.get(session_id, {}).values()):
+            if relay.after_seq is None:
+                relay.backlog.append((seq, text, legacy_frames))
+                continue
+            if seq is not None and seq <= relay.after_seq:
+                continue
+            try:
+                await self._relay_frame(relay.follower_session_id, text, legacy_frames)
+            except Exception as e:
+                logger.error(
+                    f"Failed to relay session {session_id} to {relay.follower_session_id}: {e}"
+                )
 
-    def update_session_state(self, session_id: str, **kwargs) -> None:
-        """Update the state of a session"""
-        if session_id not in self.states:
-            self.states[session_id] = WebSocketState(
-                session_id=session_id, status="initialized"
+    async def _relay_frame(
+        self, session_id: str, text: str, legacy_frames: List[str] = None
+    ) -> None:
+        """Broadcast a frame of another session to this session"""
+        message = decode_message(text)
+        message.pop("seq", None)
+        if message.get("type") == "orders_chunk":
+            orders = message.pop("orders", [])
+            message.pop("count", None)
+            await self.broadcast_orders_chunk(
+                session_id,
+                message,
+                [encode_message(order) for order in orders],
+                orders,
+            )
+        elif message.get("type") == "orders_complete":
+            orders_data = (
+                decode_message(legacy_frames[0]).get("data") if legacy_frames else None
             )
+            await self.broadcast_orders_complete(session_id, message, orders_data)
+        else:
+            await self.broadcast_to_session(session_id, message)
+
+    def _deliver(
+        self,
+        session_id: str,
+        kind: str,
+        seq: Optional[int],
+        text: str,
+        legacy_frames: List[str] = None,
+    ):
+        """Queue a frame for the clients of a session connected to this worker
+
+        Never waits on the network: each client's writer task does the
+        sending, and a client that falls behind is handled by its slow-consumer
+        policy. Order frames are sent in the form each client negotiated (see
+        CHUNKED_ORDER_TYPES); every form shares the frame's sequence number.
+        """
+        clients = [
+            self.clients[connection]
+            for connection in self.sessions.get(session_id, ())
+            if connection in self.clients
+        ]
+        if not clients:
+            return
+
+        # One frame per mode, shared by every client so each wire encoding is
+        # computed once
+        frames_by_mode: Dict[str, OutboundFrame] = {}
+        for client in clients:
+            mode = self._order_mode(client, kind)
+            if mode not in frames_by_mode:
+                frames_by_mode[mode] = OutboundFrame(
+                    self._render(mode, kind, seq, text, legacy_frames), seq
+                )
+            client.enqueue(frames_by_mode[mode])
+
+    def set_client_options(self, websocket: WebSocket, **options) -> dict:
+        """Record options negotiated by a client
+
+        Supported options are `chunked_orders` (orders arrive as
+        `orders_chunk` frames and an `orders_complete` marker),
+        `batch_order_updates` (otherwise, orders arrive as `order_updates`
+        frames rather than one `order_update` frame per order), `heartbeat`
+        (the client answers pings, so it may be closed once idle) and the
+        wire format:
+        `encoding` ("json" or "msgpack"), `compression` ("none" or "zlib") and
+        `order_layout` ("rows" or "columnar"). Returns the effective options.
+        """
+        client = self.clients.get(websocket)
+        if client is None:
+            return {}
+        client.options.update(
+            {key: value for key, value in options.items() if value is not None}
+        )
+        client.codec = WireCodec.from_options(
+            client.options, settings.WS_COMPRESSION_MIN_BYTES
+        )
+        client.options.update(
+            encoding=client.codec.encoding,
+            compression=client.codec.compression,
+            order_layout=client.codec.order_layout,
+        )
+        return client.options
+
+    async def broadcast_orders_chunk(
+        self,
+        session_id: str,
+        header: dict,
+        encoded_orders: List[bytes],
+        orders: List[dict] = (),
+    ):
+        """Broadcast one chunk of a streamed orders payload
+
+        The frame is `header` plus `seq`, `count` and the already-encoded
+        `orders`, assembled without re-encoding the orders. `orders` (the
+        decoded orders, in the same order) are cached for replay on resync.
+        """
+        if not self.store.has_session(session_id):
+            return
+
+        seq = await self.store.next_seq(session_id)
+        frame = (
+            encode_message({**header, "seq": seq, "count": len(encoded_orders)})[:-1]
+            + b',"orders":['
+            + b",".join(encoded_orders)
+            + b"]}"
+        )
+        await self._commit_and_deliver(
+            session_id,
+            seq,
+            "orders_chunk",
+            frame,
+            "orders_chunk",
+            frame.decode("utf-8"),
+            orders=orders,
+            encoded_orders=encoded_orders,
+        )
+
+    async def broadcast_orders_complete(
+        self, session_id: str, message: dict, orders_data: Optional[Dict] = None
+    ):
+        """Broadcast the end of a streamed orders payload
+
+        Clients without `chunked_orders` are sent, in its place, an `orders`
+        frame with the whole payload (`orders_data`, as returned by the
+        fetcher), or nothing if it is not given.
+        """
+        if not self.store.has_session(session_id):
+            return
 
-        current_state = self.states[session_id]
+        seq = await self.store.next_seq(session_id)
+        message = {**message, "seq": seq}
+        payload = encode_message(message)
+        legacy_frames = []
+        if orders_data is not None:
+            orders_frame = {
+                "type": "orders",
+                "seq": seq,
+                "data": orders_data,
+                "message": message.get("message"),
+            }
+            legacy_frames.append(encode_message(orders_frame).decode("utf-8"))
+        await self._commit_and_deliver(
+            session_id,
+            seq,
+            "orders_complete",
+            payload,
+            "orders_complete",
+            payload.decode("utf-8"),
+            legacy_frames=legacy_frames,
+        )
+
+    async def update_session_state(self, session_id: str, **kwargs) -> None:
+        """Update the state of a session"""
+        state = await self.store.get_state(session_id)
+        current_state = (
+            WebSocketState(**state)
+            if state
+            else WebSocketState(session_id=session_id, status="initialized")
+        )
         for key, value in kwargs.items():
             setattr(current_state, key, value)
+        await self.store.set_state(session_id, current_state.model_dump())
 
-    def get_session_state(self, session_id: str) -> Optional[WebSocketState]:
+    async def get_session_state(self, session_id: str) -> Optional[WebSocketState]:
         """Get the state of a session"""
-        return self.states.get(session_id)
+        state = await self.store.get_state(session_id)
+        return WebSocketState(**state) if state else None
 
-    def get_messages(self, session_id: str) -> List[dict]:
+    async def get_messages(self, session_id: str) -> List[dict]:
         """Get cached messages for a session"""
-        return self.messages.get(session_id, [])
+        return [
+            decode_message(entry.payload)
+            for entry in await self.store.history(session_id)
+        ]
 
-    def get_orders(self, session_id: str) -> List[dict]:
+    async def get_orders(self, session_id: str) -> List[dict]:
         """Get cached orders for a session"""
-        return list(self.orders_cache.get(session_id, {}).values())
+        return [
+            decode_message(order)
+            for order in await self.store.encoded_orders(session_id)
+        ]
 
     async def broadcast_status(
         self, session_id: str, message: str, status: str = "info"
@@ -221,15 +867,242 @@ class WebSocketManager:
 ws_manager = WebSocketManager()
 
 
+class OrdersStream:
+    """Streams an orders payload to a session in size-bounded chunks.
+
+    Each account's orders are sent as `orders_chunk` frames of at most
+    `max_items` orders and `max_bytes` of encoded data, as soon as the
+    account is available, so no payload is too large to deliver. Chunks carry
+    a stream-wide index and a per-account index; the stream ends with an
+    `orders_complete` frame giving the totals, with status "aborted" if the
+    producer failed. Clients that did not negotiate chunked orders receive the
+    same orders in the original format (see CHUNKED_ORDER_TYPES). Use as an
+    async context manager.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        manager: WebSocketManager = None,
+        max_items: int = None,
+        max_bytes: int = None,
+    ):
+        self.session_id = session_id
+        self.manager = manager or ws_manager
+        self.max_items = max_items or settings.WS_ORDERS_CHUNK_MAX_ITEMS
+        self.max_bytes = max_bytes or (
+            self.manager.max_message_size - SNAPSHOT_ENVELOPE_BYTES
+        )
+        self.stream_id = uuid.uuid4().hex
+        self.chunks = 0
+        self.accounts: Dict[str, int] = {}
+        self.data: Dict = {}  # The payload streamed so far, for other clients
+        self._completed = False
+
+    async def send_account(self, account_id: str, orders: List[dict]):
+        """Stream one account's orders"""
+        if account_id in self.accounts:
+            return
+        self.accounts[account_id] = len(orders)
+        self.data[account_id] = orders
+
+        encoded = [encode_message(order) for order in orders]
+        chunks = [
+            group[start : start + self.max_items]
+            for group in chunk_encoded(encoded, self.max_bytes)
+            for start in range(0, len(group), self.max_items)
+        ] or [[]]
+        offset = 0
+        for index, chunk in enumerate(chunks):
+            await self.manager.broadcast_orders_chunk(
+                self.session_id,
+                {
+                    "type": "orders_chunk",
+                    "stream_id": self.stream_id,
+                    "chunk": self.chunks,
+                    "account_id": account_id,
+                    "account_chunk": index,
+                    "account_chunks": len(chunks),
+                },
+                chunk,
+                orders[offset : offset + len(chunk)],
+            )
+            offset += len(chunk)
+            self.chunks += 1
+
+    async def send_remaining(self, orders_data: Dict):
+        """Stream every account in orders_data not streamed yet"""
+        for account_id, account_orders in orders_data.items():
+            if isinstance(account_orders, list):
+                await self.send_account(account_id, account_orders)
+            else:  # Metadata fields are only part of the whole payload
+                self.data[account_id] = account_orders
+
+    async def complete(self, status: str = "complete", message: str = None):
+        """Send the completion marker; later calls are ignored"""
+        if self._completed:
+            return
+        self._completed = True
+        await self.manager.broadcast_orders_complete(
+            self.session_id,
+            {
+                "type": "orders_complete",
+                "stream_id": self.stream_id,
+                "status": status,
+                "chunks": self.chunks,
+                "accounts": self.accounts,
+                "orders_count": sum(self.accounts.values()),
+                "message": message
+                or (
+                    f"Retrieved orders for {len(self.accounts)} accounts"
+                    if status == "complete"
+                    else f"Orders stream {status} after {len(self.accounts)} accounts"
+                ),
+            },
+            self.data if status == "complete" else None,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.complete("aborted" if exc_type else "complete")
+
+
 # Process Manager for handling messages
 class ProcessManager:
+    """Tracks session processing, run as one background job per session.
+
+    Jobs run as asyncio tasks so the WebSocket receive loop stays responsive
+    while a sync is in progress. A job can be cancelled on request, and is
+    cancelled once no client of its session has been connected to any worker
+    for `cancel_grace` seconds.
+    """
+
     def __init__(self):
         self.processes: Dict[str, dict] = {}  # session_id -> process info
         self.messages: Dict[str, List[dict]] = {}  # session_id -> messages queue
+        self.jobs: Dict[str, asyncio.Task] = {}  # session_id -> running job
+        self.cancel_grace = settings.SESSION_JOB_CANCEL_GRACE_SECONDS
+        self._pending_cancels: Dict[str, asyncio.TimerHandle] = {}
 
     def get_messages(self, session_id: str) -> List[dict]:
         return self.messages.get(session_id, [])
 
+    def is_running(self, session_id: str) -> bool:
+        job = self.jobs.get(session_id)
+        return job is not None and not job.done()
+
+    def spawn(self, session_id: str, job: Coroutine) -> bool:
+        """Run job as the session's background job
+
+        Returns False, without running it, if the session already has one.
+        """
+        if self.is_running(session_id):
+            job.close()
+            return False
+
+        self.processes.setdefault(session_id, {}).update(
+            {
+                "status": "running",
+                "started_at": datetime.now(),
+                "completed_at": None,
+                "error": None,
+                "cancel_reason": None,
+            }
+        )
+        self.jobs[session_id] = asyncio.create_task(self._run_job(session_id, job))
+        return True
+
+    async def _run_job(self, session_id: str, job: Coroutine):
+        process = self.processes[session_id]
+        try:
+            await job
+            if process.get("status") == "running":
+                process["status"] = "completed"
+        except asyncio.CancelledError:
+            process["status"] = "cancelled"
+            logger.info(
+                f"Processing cancelled for session {session_id}: {process.get('cancel_reason')}"
+            )
+            await ws_manager.broadcast_status(
+                session_id, "Processing cancelled", "warning"
+            )
+        except Exception as e:
+            logger.error(f"Background job failed for session {session_id}: {e}")
+            logger.exception(e)
+            process["status"] = "error"
+            process["error"] = str(e)
+        finally:
+            process["completed_at"] = datetime.now()
+            if self.jobs.get(session_id) is asyncio.current_task():
+                del self.jobs[session_id]
+            try:
+                await ws_manager.update_session_state(
+                    session_id, status=process["status"]
+                )
+            except Exception as e:
+                logger.warning(f"Failed to update state of session {session_id}: {e}")
+
+    def status(self, session_id: str) -> dict:
+        """Public status of the session's job"""
+        process = self.processes.get(session_id, {})
+        return {
+            "status": process.get("status", "idle"),
+            "running": self.is_running(session_id),
+            "started_at": process.get("started_at"),
+            "completed_at": process.get("completed_at"),
+            "error": process.get("error"),
+            "cancel_reason": process.get("cancel_reason"),
+        }
+
+    def cancel(self, session_id: str, reason: str = "cancelled by client") -> bool:
+        """Cancel the session's job; False if none is running"""
+        self.keep_alive(session_id)
+        if not self.is_running(session_id):
+            return False
+        self.processes[session_id]["cancel_reason"] = reason
+        self.jobs[session_id].cancel()
+        return True
+
+    def cancel_later(self, session_id: str, delay: float = None) -> None:
+        """Cancel the session's job after a grace period, unless kept alive
+
+        A negative grace period disables cancellation of abandoned jobs.
+        """
+        delay = self.cancel_grace if delay is None else delay
+        if delay < 0 or not self.is_running(session_id):
+            return
+        self.keep_alive(session_id)
+        self._pending_cancels[session_id] = asyncio.get_running_loop().call_later(
+            delay,
+            lambda: asyncio.create_task(self._cancel_if_abandoned(session_id, delay)),
+        )
+
+    async def _cancel_if_abandoned(self, session_id: str, delay: float) -> None:
+        """Cancel the session's job unless a client is connected to any worker
+
+        Sessions following the job count as clients. Clients may have
+        reconnected to another worker; check again after another grace period
+        in that case.
+        """
+        self._pending_cancels.pop(session_id, None)
+        try:
+            connected = await ws_manager.has_clients(session_id)
+        except Exception as e:
+            logger.warning(f"Failed to check clients of session {session_id}: {e}")
+            connected = False
+        if connected:
+            self.cancel_later(session_id, delay)
+        else:
+            self.cancel(session_id, "no clients connected")
+
+    def keep_alive(self, session_id: str) -> None:
+        """Call off a pending cancellation, e.g. when a client reconnects"""
+        handle = self._pending_cancels.pop(session_id, None)
+        if handle is not None:
+            handle.cancel()
+
     async def start_process(
         self,
         session_id: str,
@@ -243,19 +1116,12 @@ class ProcessManager:
             logger.info(f"=== Starting process for session {session_id} ===")
             logger.info(f"Selected accounts: {selected_accounts}")
 
-            # Check if process is already running
-            if (
-                session_id in self.processes
-                and self.processes[session_id]["status"] == "running"
-            ):
-                logger.info(f"Process already running for session {session_id}")
-                return
-
             selected_accounts = selected_accounts or []
 
-            # Update process status to running
+            # Update process status to running; spawn() guards against
+            # concurrent runs
             self.messages[session_id] = []
-            self.processes[session_id].update(
+            self.processes.setdefault(session_id, {}).update(
                 {
                     "status": "running",
                     "started_at": datetime.now(),
@@ -284,26 +1150,15 @@ class ProcessManager:
                     f"Starting order processing for {len(selected_accounts)} accounts",
                 )
 
+                # Imported here, order_service depends on this module
+                from app.services.order_service import execute_order_fetcher
+
                 # Execute order fetcher with session_id for real-time logging
                 orders_data = await execute_order_fetcher(request, session_id)
 
-                # Process orders and broadcast results
-                await ws_manager.broadcast_to_session(
-                    session_id,
-                    {
-                        "type": "orders",
-                        "data": orders_data,
-                        "message": f"Retrieved orders for {len(selected_accounts)} accounts",
-                    },
-                )
-
-                # Process each order and broadcast updates
-                for account_id, account_orders in orders_data.items():
-                    if isinstance(account_orders, list):  # Skip metadata fields
-                        for order in account_orders:
-                            await ws_manager.broadcast_to_session(
-                                session_id, {"type": "order_update", "order": order}
-                            )
+                # Stream orders to the session in size-bounded chunks
+                async with OrdersStream(session_id) as stream:
+                    await stream.send_remaining(orders_data)
 
                 # Process orders into trades
                 await ws_manager.broadcast_status(
@@ -382,10 +1237,14 @@ async def handle_websocket_connection(
 ):
     try:
         await manager.connect(websocket, session_id)
+        process_manager.keep_alive(session_id)
         while True:
             data = await websocket.receive_json()
+            manager.touch(websocket)
 
-            if data.get("type") == "init":
+            if data.get("type") == "pong":
+                manager.handle_pong(websocket, data.get("id"))
+            elif data.get("type") == "init":
                 try:
                     # Verify token
                     token = data.get("token")
@@ -394,6 +1253,12 @@ async def handle_websocket_connection(
                         await websocket.close(code=4001)
                         return
 
+                    manager.set_client_options(
+                        websocket,
+                        chunked_orders=parse_flag(data, "chunked_orders"),
+                        batch_order_updates=parse_flag(data, "batch_order_updates"),
+                    )
+
                     # Get selected accounts and ensure it's a list
                     selected_accounts = data.get("accounts", [])
                     if not isinstance(selected_accounts, list):
@@ -414,7 +1279,7 @@ async def handle_websocket_connection(
                         return
 
                     # Check if process is already running
-                    if process_info.get("status") == "running":
+                    if process_manager.is_running(session_id):
                         logger.info(f"Process already running for session {session_id}")
                         continue
 
@@ -425,9 +1290,12 @@ async def handle_websocket_connection(
                     if start_date:
                         credentials.start_date = start_date
 
-                    # Start processing for selected accounts
-                    await process_manager.start_process(
-                        session_id, credentials, selected_accounts
+                    # Start processing for selected accounts in the background
+                    process_manager.spawn(
+                        session_id,
+                        process_manager.start_process(
+                            session_id, credentials, selected_accounts
+                        ),
                     )
                 except Exception as e:
                     logger.error(f"Error processing init message: {e}")
@@ -442,3 +1310,5 @@ async def handle_websocket_connection(
     except Exception as e:
         logger.error(f"Error in websocket connection: {e}")
         await manager.disconnect(websocket, session_id)
+    if not manager.has_local_clients(session_id):
+        process_manager.cancel_later(session_id)
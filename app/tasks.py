@@ -1,15 +1,18 @@
+from celery import chord, group
 from app.celery_app import celery_app
-from app.services.account_service import execute_account_fetcher
 from app.models.trade import Credentials
+from app.services.result_store import result_store
+from app.services.task_progress import publish_progress
+from app.worker_runtime import runtime
 import logging
-import json
-import os
-from datetime import datetime
 import asyncio
 import rapi
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait for a single engine request (account list, order replay)
+ENGINE_REPLY_TIMEOUT_SECONDS = 60
+
 
 class OrderData:
     def __init__(
@@ -65,62 +68,153 @@ def fetch_accounts(self, credentials: dict):
     try:
         # Convert dict to Credentials model
         creds = Credentials(**credentials)
+        publish_progress(self.request.id, "accounts", message="Fetching accounts")
 
-        # Execute account fetcher
-        success, message, accounts = execute_account_fetcher(creds)
-
-        if not success:
-            logger.error(f"Failed to fetch accounts: {message}")
-            return {"success": False, "message": message, "accounts": []}
-
-        # Convert accounts to dict for serialization
-        accounts_dict = [
-            {"account_id": acc.account_id, "fcm_id": acc.fcm_id, "ib_id": acc.ib_id}
-            for acc in accounts
-        ]
-
-        return {"success": True, "message": message, "accounts": accounts_dict}
+        accounts = runtime.run(_fetch_accounts(creds.model_dump()))
+        return {
+            "success": True,
+            "message": f"Successfully retrieved {len(accounts)} accounts",
+            "accounts": accounts,
+        }
 
     except Exception as e:
         logger.error(f"Error in fetch_accounts task: {str(e)}")
         return {"success": False, "message": str(e), "accounts": []}
 
 
+async def _fetch_accounts(credentials: dict) -> list:
+    """List the accounts of a login, on a warm engine"""
+    async with runtime.engine_pool.lease(credentials) as pooled:
+        accounts = []
+        received = asyncio.Event()
+
+        def on_account_list(account_list):
+            """Callback for when account list is received"""
+            logger.info(f"Received account list with {len(account_list)} accounts")
+            accounts.extend(
+                {"account_id": acc.account_id, "fcm_id": acc.fcm_id, "ib_id": acc.ib_id}
+                for acc in account_list
+            )
+            received.set()
+
+        pooled.handle(account_list=on_account_list)
+        if not pooled.engine.get_accounts():
+            error_code = pooled.engine.get_error_code()
+            raise RuntimeError(
+                f"Failed to get accounts: {rapi.REngine.get_error_string(error_code)}"
+            )
+        await asyncio.wait_for(received.wait(), ENGINE_REPLY_TIMEOUT_SECONDS)
+        return accounts
+
+
 @celery_app.task(bind=True)
-async def fetch_orders(self, credentials: dict, account_ids: list, start_date: str):
+def fetch_orders(self, credentials: dict, account_ids: list, start_date: str):
     """
     Celery task to fetch orders for specified accounts
+
+    Replaces itself with a chord: one fetch_account_orders subtask per
+    account, run in parallel across workers, and a merge_orders callback
+    that inherits this task's id, so callers watching it get the merged
+    result.
+    """
+    if not account_ids:
+        return {"success": False, "message": "No accounts to fetch"}
+
+    publish_progress(
+        self.request.id,
+        "accounts",
+        total_accounts=len(account_ids),
+        message=f"Fetching orders for {len(account_ids)} accounts",
+    )
+    retrievals = group(
+        fetch_account_orders.s(credentials, account_id, start_date, self.request.id)
+        for account_id in account_ids
+    )
+    return self.replace(chord(retrievals, merge_orders.s(credentials)))
+
+
+@celery_app.task(bind=True, publish_result=False)
+def fetch_account_orders(
+    self, credentials: dict, account_id: str, start_date: str, parent_id: str
+):
+    """
+    Celery subtask fetching the orders of a single account
+
+    Progress is published under the parent fetch_orders task; the orders
+    themselves only go to the merge_orders callback, never over pub/sub.
+    Failures are returned rather than raised so that one bad account does
+    not fail the whole chord.
     """
-    engine = None
     try:
-        # Load connection parameters
-        connection_params = load_connection_params(
-            credentials["server_type"], credentials["location"]
+        orders = runtime.run(
+            _fetch_account_orders(parent_id, credentials, account_id, start_date)
         )
-        logger.info("Successfully loaded connection parameters")
-
-        # Create REngine instance
-        engine = rapi.REngine(
-            "DeltalytixRithmicAPI",
-            "1.0.0.0",
-            connection_params,
-            credentials["server_type"],
-            credentials["location"],
+        publish_progress(
+            parent_id, "account_complete", account_id=account_id, orders=len(orders)
         )
-        logger.info("Successfully created REngine instance")
+        return {"account_id": account_id, "orders": orders}
+
+    except Exception as e:
+        logger.error(f"Error fetching orders for account {account_id}: {str(e)}")
+        publish_progress(
+            parent_id, "account_failed", account_id=account_id, message=str(e)
+        )
+        return {"account_id": account_id, "orders": [], "error": str(e)}
+
+
+@celery_app.task(bind=True)
+def merge_orders(self, results: list, credentials: dict):
+    """
+    Chord callback merging per-account orders into the result store
+
+    The API worker that started the sync streams the stored set into the
+    matcher and stores the trades (see match_stored_orders).
+    """
+    try:
+        orders_by_account = {
+            result["account_id"]: result["orders"] for result in results
+        }
+        failed = {
+            result["account_id"]: result["error"]
+            for result in results
+            if result.get("error")
+        }
+        if len(failed) == len(results):
+            return {
+                "success": False,
+                "message": "Failed to retrieve orders for all accounts",
+                "failed_accounts": failed,
+            }
+
+        # Share the orders with API workers, which match them into trades
+        result_key = result_store.put(orders_by_account, owner=credentials["userId"])
+
+        return {
+            "success": True,
+            "message": f"Successfully retrieved orders for {len(results) - len(failed)} accounts",
+            "result_key": result_key,
+            "orders_count": sum(len(orders) for orders in orders_by_account.values()),
+            "failed_accounts": failed,
+        }
+
+    except Exception as e:
+        logger.error(f"Error in merge_orders task: {str(e)}")
+        return {"success": False, "message": str(e)}
+
+
+async def _fetch_account_orders(
+    task_id: str, credentials: dict, account_id: str, start_date: str
+) -> list:
+    """Replay the filled orders of one account since start_date, on a warm engine"""
+    async with runtime.engine_pool.lease(credentials) as pooled:
+        engine = pooled.engine
+        publish_progress(task_id, "login", account_id=account_id, message="Logged in")
 
         # Set up callbacks and state
-        orders_by_account = {}
+        orders = []
         commission_rates = {}
-        login_completed = asyncio.Event()
-        account_list_received = asyncio.Event()
         order_replay_completed = asyncio.Event()
 
-        def on_account_list(account_list):
-            """Callback for when account list is received"""
-            logger.info(f"Received account list with {len(account_list)} accounts")
-            account_list_received.set()
-
         def on_product_rms_list(product_rms_list):
             """Callback for RMS product list"""
             for rms_info in product_rms_list:
@@ -137,138 +231,92 @@ async def fetch_orders(self, credentials: dict, account_ids: list, start_date: s
 
         def on_order_replay(order_replay_info):
             """Callback for order replay"""
-            if not order_replay_info or not order_replay_info.line_info_array:
-                return
-
-            for line_info in order_replay_info.line_info_array:
-                if line_info.filled <= 0:
-                    continue
-
-                # Create order data
-                order = OrderData(
-                    order_id=line_info.order_num,
-                    account_id=line_info.account.account_id,
-                    symbol=line_info.ticker,
-                    exchange=line_info.exchange,
-                    side=line_info.buy_sell_type,
-                    order_type=line_info.order_type,
-                    status=line_info.status,
-                    quantity=line_info.quantity_to_fill,
-                    filled_quantity=line_info.filled,
-                    price=line_info.avg_fill_price,
-                    commission=0.0,  # Will be calculated later
-                    timestamp=line_info.ssboe,
-                )
-
-                # Calculate commission
-                product_code = (
-                    order.symbol[:-2] if len(order.symbol) > 2 else order.symbol
-                )
-                if (
-                    product_code in commission_rates
-                    and commission_rates[product_code]["is_valid"]
-                ):
-                    commission_rate = commission_rates[product_code]["rate"]
-                    order.commission = order.filled_quantity * commission_rate
-
-                # Store order
-                if order.account_id not in orders_by_account:
-                    orders_by_account[order.account_id] = []
-                orders_by_account[order.account_id].append(order)
+            if order_replay_info and order_replay_info.line_info_array:
+                for line_info in order_replay_info.line_info_array:
+                    if line_info.filled <= 0:
+                        continue
+
+                    # Create order data
+                    order = OrderData(
+                        order_id=line_info.order_num,
+                        account_id=line_info.account.account_id,
+                        symbol=line_info.ticker,
+                        exchange=line_info.exchange,
+                        side=line_info.buy_sell_type,
+                        order_type=line_info.order_type,
+                        status=line_info.status,
+                        quantity=line_info.quantity_to_fill,
+                        filled_quantity=line_info.filled,
+                        price=line_info.avg_fill_price,
+                        commission=0.0,  # Will be calculated later
+                        timestamp=line_info.ssboe,
+                    )
+
+                    # Calculate commission
+                    product_code = (
+                        order.symbol[:-2] if len(order.symbol) > 2 else order.symbol
+                    )
+                    if (
+                        product_code in commission_rates
+                        and commission_rates[product_code]["is_valid"]
+                    ):
+                        commission_rate = commission_rates[product_code]["rate"]
+                        order.commission = order.filled_quantity * commission_rate
+
+                    orders.append(order)
 
             order_replay_completed.set()
 
-        def on_alert(alert_type, message):
-            """Callback for alerts"""
-            logger.info(f"Alert {alert_type}: {message}")
-            if alert_type == rapi.ALERT_LOGIN_COMPLETE:
-                login_completed.set()
-
-        # Set up callbacks
-        engine.set_callbacks(
-            on_account_list,
-            on_order_replay,
-            None,  # on_order_history_dates
-            on_product_rms_list,
-            on_alert,
+        pooled.handle(
+            order_replay=on_order_replay, product_rms_list=on_product_rms_list
         )
 
-        # Login to the system
-        if not engine.login(credentials["username"], credentials["password"]):
-            error_code = engine.get_error_code()
-            error_message = rapi.REngine.get_error_string(error_code)
-            return {
-                "success": False,
-                "message": f"Failed to initiate login: {error_message}",
-            }
-
-        # Wait for login completion
-        await login_completed.wait()
-
-        # Process each account
-        for account_id in account_ids:
-            # Get RMS info for the account
-            account = {"account_id": account_id}
-            if not engine.get_product_rms_info(account):
-                logger.error(f"Failed to get RMS info for account {account_id}")
-                continue
-
-            # Subscribe to orders
-            if not engine.subscribe_order(account):
-                logger.error(f"Failed to subscribe to orders for account {account_id}")
+        async def replay(request) -> bool:
+            """Issue a replay request and wait for its orders"""
+            order_replay_completed.clear()
+            if not request():
+                return False
+            await asyncio.wait_for(
+                order_replay_completed.wait(), ENGINE_REPLY_TIMEOUT_SECONDS
+            )
+            return True
+
+        publish_progress(task_id, "account", account_id=account_id)
+        account = {"account_id": account_id}
+
+        # Get RMS info for the account
+        if not engine.get_product_rms_info(account):
+            raise RuntimeError(f"Failed to get RMS info for account {account_id}")
+
+        # Subscribe to orders
+        if not engine.subscribe_order(account):
+            raise RuntimeError(
+                f"Failed to subscribe to orders for account {account_id}"
+            )
+
+        # Get current session orders
+        if not await replay(lambda: engine.replay_all_orders(account, 0, 0)):
+            raise RuntimeError(
+                f"Failed to get current session orders for account {account_id}"
+            )
+
+        # Get historical orders
+        if not engine.list_order_history_dates(account):
+            raise RuntimeError(f"Failed to get history dates for account {account_id}")
+
+        # Process each historical date
+        dates = [date for date in engine.get_history_dates() if date >= start_date]
+        for days_processed, date in enumerate(dates, start=1):
+            if not await replay(lambda: engine.replay_historical_orders(account, date)):
+                logger.error(f"Failed to get historical orders for date {date}")
                 continue
-
-            # Get current session orders
-            if not engine.replay_all_orders(account, 0, 0):
-                logger.error(
-                    f"Failed to get current session orders for account {account_id}"
-                )
-                continue
-
-            # Wait for order replay completion
-            await order_replay_completed.wait()
-
-            # Get historical orders
-            if not engine.list_order_history_dates(account):
-                logger.error(f"Failed to get history dates for account {account_id}")
-                continue
-
-            # Process each historical date
-            for date in engine.get_history_dates():
-                if date >= start_date:
-                    if not engine.replay_historical_orders(account, date):
-                        logger.error(f"Failed to get historical orders for date {date}")
-                        continue
-                    await order_replay_completed.wait()
-
-        # Convert orders to JSON format
-        orders_json = {
-            account_id: [order.to_dict() for order in orders]
-            for account_id, orders in orders_by_account.items()
-        }
-
-        # Add metadata
-        orders_json["status"] = "complete"
-        orders_json["timestamp"] = int(datetime.now().timestamp())
-
-        # Save to file
-        filename = f"orders/orders_{int(datetime.now().timestamp())}.json"
-        os.makedirs("orders", exist_ok=True)
-        with open(filename, "w") as f:
-            json.dump(orders_json, f, indent=2)
-
-        return {
-            "success": True,
-            "message": f"Successfully retrieved orders for {len(account_ids)} accounts",
-            "orders_file": filename,
-        }
-
-    except Exception as e:
-        logger.error(f"Error in fetch_orders task: {str(e)}")
-        return {"success": False, "message": str(e)}
-    finally:
-        if engine:
-            try:
-                engine.logout()
-            except Exception as e:
-                logger.error(f"Error during logout: {e}")
+            publish_progress(
+                task_id,
+                "orders",
+                account_id=account_id,
+                days_processed=days_processed,
+                total_days=len(dates),
+                orders_processed=len(orders),
+            )
+
+        return [order.to_dict() for order in orders]
@@ -0,0 +1,130 @@
+import zlib
+import msgpack
+import orjson
+from typing import Any, Dict, List, NamedTuple, Union
+
+# Wire encodings a WebSocket client can negotiate; JSON text is the default
+ENCODINGS = ("json", "msgpack")
+COMPRESSIONS = ("none", "zlib")
+ORDER_LAYOUTS = ("rows", "columnar")
+
+# Header byte of binary frames: the body is zlib-compressed and/or MessagePack
+# (otherwise JSON). Text frames are always plain JSON.
+FLAG_COMPRESSED = 0x01
+FLAG_MSGPACK = 0x02
+
+
+def encode_message(message: Any) -> bytes:
+    """Encode a WebSocket message to compact JSON bytes"""
+    return orjson.dumps(message, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def decode_message(payload: Union[bytes, str]) -> Any:
+    """Decode a JSON message produced by encode_message"""
+    return orjson.loads(payload)
+
+
+def to_columnar(rows: List[dict]) -> dict:
+    """Turn a list of orders into {"columns": [...], "rows": [[...], ...]}
+
+    Columns are keys in first-seen order; a key missing from a row is null.
+    """
+    columns: Dict[str, None] = {}
+    for row in rows:
+        for key in row:
+            columns.setdefault(key)
+    names = list(columns)
+    return {
+        "columns": names,
+        "rows": [[row.get(name) for name in names] for row in rows],
+    }
+
+
+def from_columnar(table: dict) -> List[dict]:
+    """Inverse of to_columnar"""
+    names = table["columns"]
+    return [dict(zip(names, row)) for row in table["rows"]]
+
+
+def _is_order_list(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and isinstance(value[0], dict)
+
+
+def columnar_orders(message: dict) -> dict:
+    """Message with its order lists in columnar layout
+
+    Covers `orders` lists (order_updates and snapshot frames) and the
+    per-account lists in the `data` of an orders frame.
+    """
+    if _is_order_list(message.get("orders")):
+        message = {**message, "orders": to_columnar(message["orders"])}
+    data = message.get("data")
+    if message.get("type") == "orders" and isinstance(data, dict):
+        message = {
+            **message,
+            "data": {
+                key: to_columnar(value) if _is_order_list(value) else value
+                for key, value in data.items()
+            },
+        }
+    return message
+
+
+class WireCodec(NamedTuple):
+    """How frames are put on the wire for one client
+
+    Frames are produced as JSON text; a codec re-encodes them only when the
+    client negotiated something other than plain JSON. Compression applies
+    to frames of at least `min_compress_bytes` encoded bytes.
+    """
+
+    encoding: str = "json"
+    compression: str = "none"
+    order_layout: str = "rows"
+    min_compress_bytes: int = 1024
+
+    @classmethod
+    def from_options(cls, options: dict, min_compress_bytes: int) -> "WireCodec":
+        """Codec for negotiated options, ignoring unsupported values"""
+        encoding = options.get("encoding", "json")
+        compression = options.get("compression", "none")
+        order_layout = options.get("order_layout", "rows")
+        return cls(
+            encoding if encoding in ENCODINGS else "json",
+            compression if compression in COMPRESSIONS else "none",
+            order_layout if order_layout in ORDER_LAYOUTS else "rows",
+            min_compress_bytes,
+        )
+
+    @property
+    def is_plain_json(self) -> bool:
+        return (
+            self.encoding == "json"
+            and self.compression == "none"
+            and self.order_layout == "rows"
+        )
+
+    def encode(self, text: str) -> Union[str, bytes]:
+        """Encode a JSON text frame for the wire: str for text, bytes for binary"""
+        if self.is_plain_json:
+            return text
+
+        flags = 0
+        if self.encoding == "msgpack" or self.order_layout == "columnar":
+            message = decode_message(text)
+            if self.order_layout == "columnar" and isinstance(message, dict):
+                message = columnar_orders(message)
+            if self.encoding == "msgpack":
+                body = msgpack.packb(message, default=str)
+                flags |= FLAG_MSGPACK
+            else:
+                body = encode_message(message)
+        else:
+            body = text.encode("utf-8")
+
+        if self.compression == "zlib" and len(body) >= self.min_compress_bytes:
+            body = zlib.compress(body)
+            flags |= FLAG_COMPRESSED
+        if not flags:
+            return body.decode("utf-8")
+        return bytes([flags]) + body
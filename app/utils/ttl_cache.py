@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterator, Optional, Tuple
+
+
+class TTLCache:
+    """In-memory mapping whose entries expire a fixed number of seconds after
+    they were last written.
+
+    Entries are kept in write order, so the oldest entry is always the next to
+    expire and purging only ever looks at the front of the dict.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value and reset its expiry"""
+        self._data.pop(key, None)
+        self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+        self.purge()
+        if self.max_entries is not None:
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value for key if present and not expired"""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove key and return its value if it had not expired"""
+        entry = self._data.pop(key, None)
+        if entry is None or entry[0] <= time.monotonic():
+            return default
+        return entry[1]
+
+    def remaining(self, key: Hashable) -> float:
+        """Seconds until key expires, 0 if absent or expired"""
+        entry = self._data.get(key)
+        if entry is None:
+            return 0.0
+        return max(0.0, entry[0] - time.monotonic())
+
+    def purge(self) -> int:
+        """Drop expired entries and return how many were removed"""
+        now = time.monotonic()
+        removed = 0
+        while self._data:
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            del self._data[key]
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def keys(self) -> Iterator[Hashable]:
+        self.purge()
+        return iter(list(self._data.keys()))
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        self.purge()
+        return len(self._data)
+
+
+_MISSING = object()
@@ -1,8 +1,19 @@
 import json
 import logging
+import uuid
+from typing import Optional
 from fastapi import WebSocket
 from app.tasks import fetch_accounts, fetch_orders
 from app.celery_app import celery_app
+from app.services.order_service import match_stored_orders
+from app.services.redis_service import redis_manager
+from app.services.singleflight import Flight, sync_flights, sync_key
+from app.services.task_progress import (
+    PROGRESS_CHANNEL_PREFIX,
+    TERMINAL_STAGES,
+    task_from_channel,
+)
+from app.utils.serialization import decode_message
 import asyncio
 
 logger = logging.getLogger(__name__)
@@ -12,6 +23,10 @@ class WebSocketManager:
     def __init__(self):
         self.active_connections: dict[str, WebSocket] = {}
         self.task_states: dict[str, dict] = {}
+        self.task_clients: dict[str, set] = {}  # task_id -> watching client ids
+        self.task_flights: dict[str, Flight] = {}  # task_id -> sync it runs
+        self.task_users: dict[str, str] = {}  # task_id -> user it fetches for
+        self._subscriber: Optional[asyncio.Task] = None
 
     async def connect(self, websocket: WebSocket, client_id: str):
         await websocket.accept()
@@ -22,6 +37,7 @@ class WebSocketManager:
         if client_id in self.active_connections:
             del self.active_connections[client_id]
         if client_id in self.task_states:
+            self._unwatch(client_id, self.task_states[client_id]["task_id"])
             del self.task_states[client_id]
         logger.info(f"Client {client_id} disconnected")
 
@@ -31,6 +47,9 @@ class WebSocketManager:
 
     async def handle_credentials(self, client_id: str, credentials: dict):
         try:
+            # Subscribe before starting so no progress event is missed
+            await self.ensure_subscriber()
+
             # Start Celery task
             task = fetch_accounts.delay(credentials)
 
@@ -48,8 +67,8 @@ class WebSocketManager:
                 },
             )
 
-            # Start monitoring task
-            self.monitor_task(client_id, task.id)
+            # Relay the task's progress to this client
+            await self.monitor_task(client_id, task.id)
 
         except Exception as e:
             logger.error(f"Error handling credentials for client {client_id}: {str(e)}")
@@ -66,11 +85,48 @@ class WebSocketManager:
                     "Missing required fields: credentials, account_ids, or start_date"
                 )
 
+            # Subscribe before starting so no progress event is missed
+            await self.ensure_subscriber()
+
+            # Attach to the same sync if it is already running
+            flight = await sync_flights.claim(
+                sync_key(
+                    credentials.get("userId") or credentials.get("username"),
+                    account_ids,
+                    start_date,
+                ),
+                "task",
+                str(uuid.uuid4()),
+            )
+            if not flight.leader and flight.kind != "task":
+                await self.send_message(
+                    client_id,
+                    {
+                        "type": "sync_in_progress",
+                        "kind": flight.kind,
+                        "job_id": flight.job_id,
+                        "message": "These accounts are already being synced",
+                    },
+                )
+                return
+
             # Start Celery task
-            task = fetch_orders.delay(credentials, account_ids, start_date)
+            task_id = flight.job_id
+            if flight.leader:
+                self.task_flights[task_id] = flight
+                self.task_users[task_id] = credentials.get("userId")
+                try:
+                    fetch_orders.apply_async(
+                        (credentials, account_ids, start_date), task_id=task_id
+                    )
+                except Exception:
+                    del self.task_flights[task_id]
+                    del self.task_users[task_id]
+                    await sync_flights.release(flight)
+                    raise
 
             # Store task ID
-            self.task_states[client_id] = {"task_id": task.id, "status": "PENDING"}
+            self.task_states[client_id] = {"task_id": task_id, "status": "PENDING"}
 
             # Send initial status
             await self.send_message(
@@ -78,13 +134,17 @@ class WebSocketManager:
                 {
                     "type": "task_status",
                     "status": "PENDING",
-                    "message": "Order retrieval started",
-                    "task_id": task.id,
+                    "message": (
+                        "Order retrieval started"
+                        if flight.leader
+                        else "Attached to running order retrieval"
+                    ),
+                    "task_id": task_id,
                 },
             )
 
-            # Start monitoring task
-            self.monitor_task(client_id, task.id)
+            # Relay the task's progress to this client
+            await self.monitor_task(client_id, task_id)
 
         except Exception as e:
             logger.error(
@@ -92,37 +152,33 @@ class WebSocketManager:
             )
             await self.send_message(client_id, {"type": "error", "message": str(e)})
 
-    async def monitor_task(self, client_id: str, task_id: str):
-        """Monitor Celery task and send updates to client"""
-        try:
-            while True:
-                task = celery_app.AsyncResult(task_id)
-
-                if task.ready():
-                    result = task.get()
-                    await self.send_message(
-                        client_id,
-                        {
-                            "type": "task_complete",
-                            "status": "COMPLETED",
-                            "result": result,
-                        },
-                    )
-                    break
+    async def ensure_subscriber(self):
+        """Start this worker's single subscriber to Celery progress events"""
+        if self._subscriber is None or self._subscriber.done():
+            await redis_manager.initialize()
+            self._subscriber = asyncio.create_task(
+                redis_manager.listen(f"{PROGRESS_CHANNEL_PREFIX}*", self._on_progress)
+            )
 
-                # Send progress update
-                await self.send_message(
-                    client_id,
-                    {
-                        "type": "task_status",
-                        "status": task.status,
-                        "message": "Processing...",
-                    },
-                )
+    async def shutdown(self):
+        if self._subscriber is not None:
+            self._subscriber.cancel()
+            self._subscriber = None
 
-                # Wait before next check
-                await asyncio.sleep(1)
+    async def monitor_task(self, client_id: str, task_id: str):
+        """Relay a Celery task's progress events to a client
 
+        Events are pushed by the task through Redis and delivered by the
+        shared subscriber. The result backend is checked once, in case the
+        task finished before the subscription was in place.
+        """
+        self.task_clients.setdefault(task_id, set()).add(client_id)
+        try:
+            loop = asyncio.get_running_loop()
+            task = celery_app.AsyncResult(task_id)
+            if await loop.run_in_executor(None, task.ready):
+                result = await loop.run_in_executor(None, task.get, None, False)
+                await self._complete(task_id, result)
         except Exception as e:
             logger.error(f"Error monitoring task {task_id}: {str(e)}")
             await self.send_message(
@@ -130,6 +186,69 @@ class WebSocketManager:
                 {"type": "error", "message": f"Task monitoring error: {str(e)}"},
             )
 
+    async def _on_progress(self, channel: str, data: str):
+        """Deliver a progress event to the clients watching its task"""
+        task_id = task_from_channel(channel)
+        if task_id not in self.task_clients and task_id not in self.task_flights:
+            return
+        event = decode_message(data)
+        stage = event.get("stage")
+        if stage in TERMINAL_STAGES:
+            await self._complete(task_id, event.get("result"), event)
+            return
+
+        for client_id in list(self.task_clients.get(task_id, ())):
+            if client_id in self.task_states:
+                self.task_states[client_id]["status"] = "PROGRESS"
+            await self.send_message(
+                client_id, {"type": "task_progress", "status": "PROGRESS", **event}
+            )
+
+    async def _complete(self, task_id: str, result, event: dict = None):
+        """Send the final result of a task to its clients and stop watching it
+
+        The worker that started an order fetch matches the stored orders into
+        trades first and adds the counts to the result; clients attached
+        through other workers get the fetch result alone.
+        """
+        flight = self.task_flights.pop(task_id, None)
+        user_id = self.task_users.pop(task_id, None)
+        if flight is not None:
+            try:
+                if user_id and isinstance(result, dict) and result.get("result_key"):
+                    result = {
+                        **result,
+                        **await match_stored_orders(result["result_key"], user_id),
+                    }
+            except Exception as e:
+                logger.error(f"Error matching orders of task {task_id}: {str(e)}")
+                result = {
+                    **result,
+                    "success": False,
+                    "message": f"Error processing orders: {str(e)}",
+                }
+            finally:
+                await sync_flights.release(flight)
+        clients = self.task_clients.pop(task_id, set())
+        failed = (event or {}).get("stage") == "failed" or (
+            isinstance(result, dict) and result.get("success") is False
+        )
+        status = "FAILED" if failed else "COMPLETED"
+        for client_id in clients:
+            if client_id in self.task_states:
+                self.task_states[client_id]["status"] = status
+            message = {"type": "task_complete", "status": status, "result": result}
+            if failed and event and event.get("message"):
+                message["message"] = event["message"]
+            await self.send_message(client_id, message)
+
+    def _unwatch(self, client_id: str, task_id: str):
+        clients = self.task_clients.get(task_id)
+        if clients is not None:
+            clients.discard(client_id)
+            if not clients:
+                del self.task_clients[task_id]
+
 
 # Create global WebSocket manager instance
 websocket_manager = WebSocketManager()
@@ -0,0 +1,293 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Coroutine, Dict, List, Optional
+from celery.signals import worker_process_init, worker_process_shutdown
+from app.core.config import settings
+from app.core.security import credential_fingerprint
+from app.services.trade_writer import trade_writer
+from app.services.account_service import (
+    LOGIN_TIMEOUT_SECONDS,
+    LoginError,
+    load_connection_params,
+)
+import rapi
+
+logger = logging.getLogger(__name__)
+
+# Engine callbacks, in the order REngine.set_callbacks takes them
+CALLBACK_NAMES = (
+    "account_list",
+    "order_replay",
+    "order_history_dates",
+    "product_rms_list",
+    "alert",
+)
+
+
+class PooledEngine:
+    """A logged-in REngine that can be reused by consecutive tasks.
+
+    The engine's callbacks are bound once to trampolines that hand each
+    event to the handlers of the task currently using the engine, on the
+    worker's event loop (REngine calls back from its own threads).
+    """
+
+    def __init__(self, key: str, credentials: dict, loop: asyncio.AbstractEventLoop):
+        self.key = key
+        self.loop = loop
+        self.alive = False
+        self.last_used = time.monotonic()
+        self._handlers: Dict[str, Callable] = {}
+        self._login_result: Optional[asyncio.Future] = None
+        self.engine = rapi.REngine(
+            "DeltalytixRithmicAPI",
+            "1.0.0.0",
+            load_connection_params(credentials["server_type"], credentials["location"]),
+            credentials["server_type"],
+            credentials["location"],
+        )
+        self.engine.set_callbacks(*(self._trampoline(name) for name in CALLBACK_NAMES))
+
+    def _trampoline(self, name: str) -> Callable:
+        def callback(*args):
+            self.loop.call_soon_threadsafe(self._dispatch, name, args)
+
+        return callback
+
+    def _dispatch(self, name: str, args: tuple):
+        if name == "alert":
+            self._on_alert(*args)
+        handler = self._handlers.get(name)
+        if handler is not None:
+            try:
+                handler(*args)
+            except Exception as e:
+                logger.error(f"Error in {name} handler: {e}")
+
+    def _on_alert(self, alert_type, message):
+        is_trading_system = "Trading System" in str(message)
+        if alert_type == rapi.ALERT_LOGIN_COMPLETE:
+            self.alive = True
+            if self._login_result is not None and not self._login_result.done():
+                self._login_result.set_result(True)
+        elif alert_type in (rapi.ALERT_LOGIN_FAILED, rapi.ALERT_CONNECTION_CLOSED):
+            if not is_trading_system and alert_type == rapi.ALERT_LOGIN_FAILED:
+                return
+            self.alive = False
+            if self._login_result is not None and not self._login_result.done():
+                self._login_result.set_exception(LoginError(str(message)))
+
+    async def login(self, username: str, password: str):
+        self._login_result = self.loop.create_future()
+        if not self.engine.login(username, password):
+            error_message = rapi.REngine.get_error_string(self.engine.get_error_code())
+            raise LoginError(f"Failed to initiate login: {error_message}")
+        try:
+            await asyncio.wait_for(self._login_result, LOGIN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise LoginError(f"Login timed out after {LOGIN_TIMEOUT_SECONDS} seconds")
+
+    def handle(self, **handlers: Callable) -> None:
+        """Route engine callbacks (by name, e.g. order_replay) to handlers"""
+        self._handlers = handlers
+
+    def logout(self):
+        self.alive = False
+        self._handlers = {}
+        try:
+            self.engine.logout()
+        except Exception as e:
+            logger.error(f"Error during logout: {e}")
+
+
+class EnginePool:
+    """Warm, logged-in Rithmic engines kept between tasks in one worker process.
+
+    Engines are keyed by a fingerprint of the full credentials, so an engine
+    is only ever reused for the same login. At most `max_idle` engines are
+    kept idle, each for at most `idle_seconds`.
+    """
+
+    def __init__(self, max_idle: int, idle_seconds: float):
+        self.max_idle = max_idle
+        self.idle_seconds = idle_seconds
+        self._idle: Dict[str, List[PooledEngine]] = {}
+
+    @staticmethod
+    def key(credentials: dict) -> str:
+        return credential_fingerprint(
+            credentials["username"],
+            credentials["password"],
+            credentials["server_type"],
+            credentials["location"],
+        )
+
+    async def acquire(self, credentials: dict) -> PooledEngine:
+        """A warm engine for these credentials, logging in a new one if needed"""
+        self.purge()
+        key = self.key(credentials)
+        idle = self._idle.get(key)
+        while idle:
+            pooled = idle.pop()
+            if pooled.alive:
+                logger.info("Reusing warm Rithmic engine")
+                return pooled
+            pooled.logout()
+
+        pooled = PooledEngine(key, credentials, asyncio.get_running_loop())
+        try:
+            await pooled.login(credentials["username"], credentials["password"])
+        except Exception:
+            pooled.logout()
+            raise
+        logger.info("Logged in new Rithmic engine")
+        return pooled
+
+    def release(self, pooled: PooledEngine, reusable: bool = True) -> None:
+        """Return an engine to the pool, or log it out"""
+        pooled.handle()
+        if not reusable or not pooled.alive or self.max_idle <= 0:
+            pooled.logout()
+            return
+        pooled.last_used = time.monotonic()
+        self._idle.setdefault(pooled.key, []).append(pooled)
+        while self.idle_count > self.max_idle:
+            self._evict_oldest()
+
+    @asynccontextmanager
+    async def lease(self, credentials: dict):
+        """Use a warm engine for the duration of a block
+
+        The engine is returned to the pool only if the block succeeds; after
+        an error its state is unknown, so it is logged out.
+        """
+        pooled = await self.acquire(credentials)
+        try:
+            yield pooled
+        except BaseException:
+            self.release(pooled, reusable=False)
+            raise
+        self.release(pooled)
+
+    @property
+    def idle_count(self) -> int:
+        return sum(len(engines) for engines in self._idle.values())
+
+    def _evict_oldest(self):
+        key, index = min(
+            (
+                (key, index)
+                for key, engines in self._idle.items()
+                for index in range(len(engines))
+            ),
+            key=lambda item: self._idle[item[0]][item[1]].last_used,
+        )
+        self._idle[key].pop(index).logout()
+        if not self._idle[key]:
+            del self._idle[key]
+
+    def purge(self) -> None:
+        """Log out engines idle for longer than idle_seconds"""
+        now = time.monotonic()
+        for key in list(self._idle):
+            keep = []
+            for pooled in self._idle[key]:
+                if pooled.alive and now - pooled.last_used < self.idle_seconds:
+                    keep.append(pooled)
+                else:
+                    pooled.logout()
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+
+    def close(self) -> None:
+        for engines in self._idle.values():
+            for pooled in engines:
+                pooled.logout()
+        self._idle.clear()
+
+
+class WorkerRuntime:
+    """One long-lived asyncio event loop per Celery worker process.
+
+    The loop runs in a background thread started on worker_process_init;
+    tasks submit coroutines to it with `run`, so async services and the warm
+    engine pool live across tasks instead of being rebuilt for each one.
+    """
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.engine_pool = EnginePool(
+            max_idle=settings.WORKER_ENGINE_POOL_MAX_IDLE,
+            idle_seconds=settings.WORKER_ENGINE_IDLE_SECONDS,
+        )
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=self._run_loop, name="worker-runtime", daemon=True
+            )
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._purge_idle_engines(), self.loop)
+            logger.info("Worker event loop started")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _purge_idle_engines(self):
+        while True:
+            await asyncio.sleep(max(1.0, self.engine_pool.idle_seconds / 2))
+            self.engine_pool.purge()
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the worker loop and wait for its result"""
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def stop(self) -> None:
+        with self._lock:
+            if self.loop is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(
+                    trade_writer.close(), self.loop
+                ).result(timeout=30)
+            except Exception as e:
+                logger.error(f"Failed to flush buffered trades: {e}")
+            self.loop.call_soon_threadsafe(self.engine_pool.close)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            if self._thread is not None:
+                self._thread.join(timeout=10)
+            if not self.loop.is_running():
+                self.loop.close()
+            self.loop = None
+            self._thread = None
+            logger.info("Worker event loop stopped")
+
+
+runtime = WorkerRuntime()
+
+
+@worker_process_init.connect
+def _start_runtime(**kwargs):
+    runtime.start()
+
+
+@worker_process_shutdown.connect
+def _stop_runtime(**kwargs):
+    runtime.stop()
@@ -0,0 +1,61 @@
+import time
+from app.models.trade import AccountData, Credentials
+from app.services.account_cache_service import AccountListCache
+
+ACCOUNTS = [AccountData(account_id="A1", fcm_id="F", ib_id="I")]
+
+
+def credentials(password="secret", **fields):
+    return Credentials(
+        **{
+            "username": "trader",
+            "password": password,
+            "server_type": "Rithmic Paper Trading",
+            "location": "Chicago Area",
+            "userId": "user-1",
+            **fields,
+        }
+    )
+
+
+def test_serves_cached_accounts_to_the_same_credentials():
+    cache = AccountListCache(ttl_seconds=60, max_entries=10)
+    cache.set(credentials(), ACCOUNTS)
+
+    assert cache.get(credentials()) == ACCOUNTS
+    assert cache.get(credentials(location="Europe")) is None
+
+
+def test_does_not_serve_another_password():
+    cache = AccountListCache(ttl_seconds=60, max_entries=10)
+    cache.set(credentials(), ACCOUNTS)
+
+    assert cache.get(credentials(password="wrong")) is None
+
+
+def test_entries_expire(monkeypatch):
+    cache = AccountListCache(ttl_seconds=60, max_entries=10)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache.set(credentials(), ACCOUNTS)
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 59)
+    assert cache.get(credentials()) == ACCOUNTS
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    assert cache.get(credentials()) is None
+
+
+def test_invalidate_forgets_the_entry():
+    cache = AccountListCache(ttl_seconds=60, max_entries=10)
+    cache.set(credentials(), ACCOUNTS)
+    cache.invalidate(credentials())
+
+    assert cache.get(credentials()) is None
+
+
+def test_wrong_password_cannot_invalidate():
+    cache = AccountListCache(ttl_seconds=60, max_entries=10)
+    cache.set(credentials(), ACCOUNTS)
+    cache.invalidate(credentials(password="wrong"))
+
+    assert cache.get(credentials()) == ACCOUNTS
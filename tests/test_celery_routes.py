@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+from app.celery_app import (
+    ACCOUNTS_QUEUE,
+    BACKFILL_QUEUE,
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    SYNC_QUEUE,
+    route_task,
+)
+
+
+def days_ago(days):
+    return (datetime.utcnow() - timedelta(days=days)).strftime("%Y%m%d")
+
+
+def test_account_listing_goes_first():
+    route = route_task("app.tasks.fetch_accounts", (), {}, {})
+    assert route == {"queue": ACCOUNTS_QUEUE, "priority": PRIORITY_HIGH}
+
+
+def test_recent_fetch_stays_on_sync():
+    route = route_task(
+        "app.tasks.fetch_account_orders", (), {"start_date": days_ago(1)}, {}
+    )
+    assert route == {"queue": SYNC_QUEUE, "priority": PRIORITY_NORMAL}
+
+
+def test_old_fetch_goes_to_backfill():
+    route = route_task(
+        "app.tasks.fetch_account_orders", (), {"start_date": days_ago(365)}, {}
+    )
+    assert route == {"queue": BACKFILL_QUEUE, "priority": PRIORITY_LOW}
+
+
+def test_start_date_read_from_positional_args():
+    args = ("credentials", "account", days_ago(365))
+    route = route_task("app.tasks.fetch_account_orders", args, {}, {})
+    assert route["queue"] == BACKFILL_QUEUE
+
+
+def test_unparseable_start_date_is_not_a_backfill():
+    for kwargs in ({}, {"start_date": "yesterday"}):
+        route = route_task("app.tasks.fetch_account_orders", (), kwargs, {})
+        assert route["queue"] == SYNC_QUEUE
+
+
+def test_other_tasks_go_to_sync():
+    route = route_task("app.tasks.merge_orders", (), {}, {})
+    assert route == {"queue": SYNC_QUEUE, "priority": PRIORITY_NORMAL}
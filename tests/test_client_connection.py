@@ -0,0 +1,191 @@
+import asyncio
+import pytest
+from app.services.client_connection import (
+    SLOW_CONSUMER_CLOSE_CODE,
+    ClientConnection,
+    OutboundFrame,
+)
+from app.utils.serialization import WireCodec
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    async def send_text(self, data):
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = code
+
+
+def make_client(policy="coalesce", max_queue=3, **kwargs):
+    resyncs = []
+    closed = []
+
+    async def resync(client, last_seq):
+        resyncs.append(last_seq)
+        return last_seq
+
+    async def on_closed(client):
+        closed.append(client)
+
+    client = ClientConnection(
+        FakeWebSocket(),
+        "session",
+        resync=resync,
+        on_closed=on_closed,
+        max_queue=max_queue,
+        policy=policy,
+        max_backlog_seconds=kwargs.pop("max_backlog_seconds", 30),
+        send_timeout=1,
+        **kwargs,
+    )
+    return client, resyncs, closed
+
+
+def frame(seq=None, text=None):
+    return OutboundFrame([text or f'{{"seq":{seq}}}'], seq)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        make_client(policy="block")
+
+
+def test_drops_ephemeral_frames_first():
+    async def scenario():
+        client, _, _ = make_client(policy="drop")
+        client.enqueue(frame(1))
+        client.enqueue(frame(text="status"))
+        client.enqueue(frame(2))
+        assert client.enqueue(frame(3))
+        assert [queued.seq for queued in client._queue] == [1, 2, 3]
+        assert client.dropped == 1
+        # With only sequenced frames queued, an ephemeral frame is dropped
+        assert not client.enqueue(frame(text="log"))
+
+    run(scenario())
+
+
+def test_drop_policy_drops_incoming_frame():
+    async def scenario():
+        client, _, _ = make_client(policy="drop")
+        for seq in (1, 2, 3):
+            client.enqueue(frame(seq))
+        assert not client.enqueue(frame(4))
+        assert [queued.seq for queued in client._queue] == [1, 2, 3]
+        assert client.dropped == 1
+
+    run(scenario())
+
+
+def test_coalesce_policy_clears_queue_and_resyncs():
+    async def scenario():
+        client, resyncs, _ = make_client(policy="coalesce")
+        client.last_seq = 7
+        for seq in (8, 9, 10):
+            client.enqueue(frame(seq))
+        assert not client.enqueue(frame(11))
+        assert client.queue_size == 0
+        # The queued frames and the incoming one
+        assert client.dropped == 4
+        assert client._resync_pending
+        assert client._resync_from == 7
+
+    run(scenario())
+
+
+def test_disconnect_policy_closes_client():
+    async def scenario():
+        client, _, closed = make_client(policy="disconnect")
+        for seq in (1, 2, 3):
+            client.enqueue(frame(seq))
+        assert not client.enqueue(frame(4))
+        await asyncio.sleep(0)
+        assert client.closed
+        assert closed == [client]
+        assert client.websocket.closed_with == SLOW_CONSUMER_CLOSE_CODE
+
+    run(scenario())
+
+
+def test_backlogged_client_is_disconnected():
+    async def scenario():
+        client, _, closed = make_client(max_backlog_seconds=0)
+        client.enqueue(frame(1))
+        await asyncio.sleep(0.01)
+        assert not client.enqueue(frame(2))
+        await asyncio.sleep(0)
+        assert closed == [client]
+
+    run(scenario())
+
+
+def test_writer_skips_frames_already_received():
+    async def scenario():
+        client, resyncs, _ = make_client(max_queue=10)
+        client.start(last_seq=2)
+        for seq in (1, 2, 3):
+            client.enqueue(frame(seq))
+        client.enqueue(frame(text="status"))
+        await asyncio.sleep(0.01)
+        client.stop()
+        assert resyncs == [2]
+        assert client.websocket.sent == ['{"seq":3}', "status"]
+        assert client.last_seq == 3
+
+    run(scenario())
+
+
+def test_oversize_frame_replaced_by_error_with_same_seq():
+    async def scenario():
+        client, _, _ = make_client(max_queue=10, max_message_size=100)
+        client.start()
+        big = '{"type":"x","seq":5,"data":"' + "a" * 200 + '"}'
+        client.enqueue(OutboundFrame([big], 5))
+        await asyncio.sleep(0.01)
+        client.stop()
+        [sent] = client.websocket.sent
+        assert '"type":"error"' in sent
+        assert '"seq":5' in sent
+
+    run(scenario())
+
+
+def test_compressed_frame_under_limit_is_sent():
+    async def scenario():
+        client, _, _ = make_client(max_queue=10, max_message_size=100)
+        client.codec = WireCodec.from_options({"compression": "zlib"}, 10)
+        client.start()
+        big = '{"type":"x","seq":5,"data":"' + "a" * 200 + '"}'
+        client.enqueue(OutboundFrame([big], 5))
+        await asyncio.sleep(0.01)
+        client.stop()
+        [sent] = client.websocket.sent
+        assert isinstance(sent, bytes) and len(sent) < 100
+
+    run(scenario())
+
+
+def test_heartbeat_only_after_pong_or_negotiation():
+    async def scenario():
+        client, _, _ = make_client()
+        assert not client.heartbeat
+        client.ping()
+        assert client.pong(1) is not None
+        assert client.heartbeat
+
+        other, _, _ = make_client()
+        other.options["heartbeat"] = True
+        assert other.heartbeat
+
+    run(scenario())
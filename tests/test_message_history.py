@@ -0,0 +1,103 @@
+from app.services.message_history import MessageHistory
+
+
+def payload(size: int) -> bytes:
+    return b"x" * size
+
+
+def test_keeps_at_most_max_items():
+    history = MessageHistory(max_bytes=1000, max_items=3)
+    for seq in range(1, 6):
+        history.append(seq, "status", payload(10))
+
+    assert [entry.seq for entry in history] == [3, 4, 5]
+    assert history.evicted == 2
+    assert history.size_bytes == 30
+
+
+def test_keeps_within_max_bytes():
+    history = MessageHistory(max_bytes=25, max_items=100)
+    for seq in range(1, 5):
+        history.append(seq, "status", payload(10))
+
+    assert [entry.seq for entry in history] == [3, 4]
+    assert history.size_bytes == 20
+
+
+def test_evicts_preferred_types_first():
+    history = MessageHistory(max_bytes=1000, max_items=3, evict_first=("orders",))
+    history.append(1, "status", payload(1))
+    history.append(2, "orders", payload(1))
+    history.append(3, "status", payload(1))
+    history.append(4, "orders", payload(1))
+    history.append(5, "trades_processed", payload(1))
+
+    assert [(entry.seq, entry.type) for entry in history] == [
+        (1, "status"),
+        (3, "status"),
+        (5, "trades_processed"),
+    ]
+
+
+def test_falls_back_to_oldest_of_any_type():
+    history = MessageHistory(max_bytes=1000, max_items=2, evict_first=("orders",))
+    for seq in range(1, 4):
+        history.append(seq, "status", payload(1))
+
+    assert [entry.seq for entry in history] == [2, 3]
+
+
+def test_rejects_message_over_byte_budget():
+    history = MessageHistory(max_bytes=10, max_items=10)
+    history.append(1, "status", payload(5))
+
+    assert history.append(2, "status", payload(11)) is False
+    assert [entry.seq for entry in history] == [1]
+    assert not history.covers(1)
+    assert history.covers(2)
+
+
+def test_covers_only_unbroken_suffix():
+    history = MessageHistory(max_bytes=1000, max_items=3)
+    for seq in range(1, 6):
+        history.append(seq, "status", payload(1))
+
+    assert not history.covers(0)
+    assert not history.covers(1)
+    assert history.covers(2)
+    assert history.covers(5)
+    # A client claiming to be ahead of the history cannot be resumed
+    assert not history.covers(6)
+
+
+def test_covers_after_preferred_eviction():
+    history = MessageHistory(max_bytes=1000, max_items=2, evict_first=("orders",))
+    history.append(1, "status", payload(1))
+    history.append(2, "orders", payload(1))
+    history.append(3, "status", payload(1))
+
+    # seq 2 was evicted, so only clients past it can get deltas
+    assert not history.covers(1)
+    assert history.covers(2)
+    assert [entry.seq for entry in history.since(2)] == [3]
+
+
+def test_since_returns_entries_in_sequence_order():
+    history = MessageHistory(max_bytes=1000, max_items=10, evict_first=("orders",))
+    history.append(1, "orders", payload(1))
+    history.append(2, "status", payload(1))
+    history.append(3, "orders", payload(1))
+
+    assert [entry.seq for entry in history.since(1)] == [2, 3]
+
+
+def test_clear_forgets_entries_but_not_sequence():
+    history = MessageHistory(max_bytes=1000, max_items=10)
+    history.append(1, "status", payload(1))
+    history.append(2, "status", payload(1))
+    history.clear()
+
+    assert len(history) == 0
+    assert history.size_bytes == 0
+    assert not history.covers(1)
+    assert history.covers(2)
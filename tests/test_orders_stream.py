@@ -0,0 +1,174 @@
+import asyncio
+from app.services.client_connection import ClientConnection
+from app.services.websocket_service import OrdersStream, WebSocketManager
+from app.utils.serialization import decode_message, encode_message
+
+SESSION = "session"
+
+
+class FakeWebSocket:
+    async def send_text(self, data):
+        pass
+
+
+def add_client(manager, **options):
+    websocket = FakeWebSocket()
+    client = ClientConnection(
+        websocket,
+        SESSION,
+        resync=None,
+        on_closed=None,
+        max_queue=1000,
+        policy="drop",
+        max_backlog_seconds=60,
+        send_timeout=1,
+    )
+    client.options.update(options)
+    manager.sessions.setdefault(SESSION, set()).add(websocket)
+    manager.clients[websocket] = client
+    return client
+
+
+def received(client):
+    return [
+        (frame.seq, decode_message(text))
+        for frame in client._queue
+        for text in frame.texts
+    ]
+
+
+def orders(account_id, count, size=10):
+    return [
+        {"order_id": f"{account_id}-{i}", "account_id": account_id, "x": "y" * size}
+        for i in range(count)
+    ]
+
+
+def stream(payload, clients=None, fail=False, **limits):
+    """Stream payload to one client per option set; returns what each client
+    was sent and the cached orders
+    """
+
+    async def run():
+        manager = WebSocketManager()
+        await manager.store.open_session(SESSION)
+        connected = {
+            name: add_client(manager, **options)
+            for name, options in (
+                clients or {"chunked": {"chunked_orders": True}}
+            ).items()
+        }
+        try:
+            async with OrdersStream(SESSION, manager, **limits) as orders_stream:
+                await orders_stream.send_remaining(payload)
+                if fail:
+                    raise RuntimeError("fetch failed")
+        except RuntimeError:
+            pass
+        sent = {name: received(client) for name, client in connected.items()}
+        return sent, await manager.get_orders(SESSION)
+
+    return asyncio.run(run())
+
+
+def chunks_of(frames):
+    return [message for _, message in frames if message["type"] == "orders_chunk"]
+
+
+def test_splits_accounts_by_item_count():
+    frames, _ = stream({"A": orders("A", 5), "B": orders("B", 1)}, max_items=2)
+    chunks = chunks_of(frames["chunked"])
+
+    assert [(c["account_id"], c["count"]) for c in chunks] == [
+        ("A", 2),
+        ("A", 2),
+        ("A", 1),
+        ("B", 1),
+    ]
+    assert [c["chunk"] for c in chunks] == [0, 1, 2, 3]
+    assert [(c["account_chunk"], c["account_chunks"]) for c in chunks] == [
+        (0, 3),
+        (1, 3),
+        (2, 3),
+        (0, 1),
+    ]
+
+
+def test_splits_accounts_by_encoded_size():
+    account = orders("A", 6)
+    size = len(encode_message(account[0])) + 1
+    frames, _ = stream({"A": account}, max_items=100, max_bytes=size * 2)
+
+    assert [c["count"] for c in chunks_of(frames["chunked"])] == [2, 2, 2]
+
+
+def test_oversized_order_gets_a_chunk_of_its_own():
+    account = orders("A", 1) + orders("B", 1, size=1000) + orders("C", 1)
+    frames, _ = stream({"A": account}, max_items=100, max_bytes=200)
+
+    assert [c["count"] for c in chunks_of(frames["chunked"])] == [1, 1, 1]
+
+
+def test_empty_account_is_one_empty_chunk():
+    frames, _ = stream({"A": []})
+
+    assert [c["count"] for c in chunks_of(frames["chunked"])] == [0]
+
+
+def test_completion_marker_gives_totals():
+    frames, _ = stream({"A": orders("A", 3), "B": orders("B", 2)}, max_items=2)
+    complete = frames["chunked"][-1][1]
+
+    assert complete["type"] == "orders_complete"
+    assert complete["status"] == "complete"
+    assert complete["chunks"] == 3
+    assert complete["accounts"] == {"A": 3, "B": 2}
+    assert complete["orders_count"] == 5
+
+
+def test_clients_without_chunked_orders_get_the_original_frames():
+    payload = {"A": orders("A", 3), "status": "success"}
+    frames, cached = stream(
+        payload,
+        max_items=2,
+        clients={
+            "chunked": {"chunked_orders": True},
+            "batched": {"batch_order_updates": True},
+            "legacy": {},
+        },
+    )
+
+    legacy = frames["legacy"]
+    assert [message["type"] for _, message in legacy] == [
+        "order_update",
+        "order_update",
+        "order_update",
+        "orders",
+    ]
+    assert [message["order"] for _, message in legacy[:3]] == payload["A"]
+    assert legacy[-1][1]["data"] == payload
+
+    batched = frames["batched"]
+    assert [(m["type"], m.get("count")) for _, m in batched] == [
+        ("order_updates", 2),
+        ("order_updates", 1),
+        ("orders", None),
+    ]
+
+    # Every form of a frame carries the same sequence number, and the
+    # orders are cached once
+    chunked_seqs = [seq for seq, _ in frames["chunked"]]
+    assert chunked_seqs == [seq for seq, _ in batched]
+    assert [m["seq"] for _, m in legacy] == [seq for seq, _ in legacy]
+    assert len(cached) == 3
+
+
+def test_aborted_stream_sends_no_orders_frame():
+    frames, _ = stream(
+        {"A": orders("A", 1)},
+        fail=True,
+        clients={"chunked": {"chunked_orders": True}, "legacy": {}},
+    )
+
+    assert frames["chunked"][-1][1]["status"] == "aborted"
+    assert [message["type"] for _, message in frames["legacy"]] == ["order_update"]
@@ -0,0 +1,150 @@
+from contextlib import contextmanager
+import pytest
+from psycopg2 import errors
+from app.core.config import settings
+from app.db.session import DatabaseManager, prepared_statements_enabled
+from app.db.statements import Statement
+
+STATEMENT = Statement("select_trade", 'SELECT * FROM "Trade" WHERE "id" = %s')
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.connection = conn
+        self.query = b""
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.connection.executed.append(sql)
+        if sql.startswith("EXECUTE") and self.connection.failures:
+            raise self.connection.failures.pop(0)
+
+    def fetchall(self):
+        return []
+
+
+class FakeConnection:
+    """Records the SQL sent, raising the queued errors on EXECUTE"""
+
+    closed = False
+
+    def __init__(self, *failures):
+        self.executed = []
+        self.failures = list(failures)
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def db():
+    manager = DatabaseManager()
+    manager.use_prepared = True
+    return manager
+
+
+def connect(db, conn):
+    @contextmanager
+    def connection():
+        yield conn
+
+    db.connection = connection
+
+
+def test_prepares_once_per_connection(db):
+    conn = FakeConnection()
+    connect(db, conn)
+
+    db.execute(STATEMENT, ("t1",), fetch=True)
+    db.execute(STATEMENT, ("t2",), fetch=True)
+
+    assert conn.executed == [
+        STATEMENT.prepare_sql,
+        STATEMENT.execute_sql,
+        STATEMENT.execute_sql,
+    ]
+
+
+def test_plain_sql_when_disabled(db):
+    conn = FakeConnection()
+    connect(db, conn)
+    db.use_prepared = False
+
+    db.execute(STATEMENT, ("t1",))
+
+    assert conn.executed == [STATEMENT.sql]
+
+
+def test_pooler_errors_fall_back_to_plain_sql(db):
+    conn = FakeConnection(errors.InvalidSqlStatementName("no such statement"))
+    connect(db, conn)
+
+    db.execute(STATEMENT, ("t1",))
+
+    assert not db.use_prepared
+    assert conn.executed == [
+        STATEMENT.prepare_sql,
+        STATEMENT.execute_sql,
+        STATEMENT.sql,
+    ]
+
+
+def test_stale_plans_are_prepared_again(db):
+    conn = FakeConnection(errors.FeatureNotSupported("cached plan changed"))
+    connect(db, conn)
+
+    db.execute(STATEMENT, ("t1",))
+
+    assert db.use_prepared
+    assert conn.executed == [
+        STATEMENT.prepare_sql,
+        STATEMENT.execute_sql,
+        "DEALLOCATE ALL",
+        STATEMENT.prepare_sql,
+        STATEMENT.execute_sql,
+    ]
+
+
+def test_retries_only_once(db):
+    conn = FakeConnection(
+        errors.FeatureNotSupported("cached plan changed"),
+        errors.FeatureNotSupported("cached plan changed"),
+    )
+    connect(db, conn)
+
+    with pytest.raises(errors.FeatureNotSupported):
+        db.execute(STATEMENT, ("t1",))
+
+
+@pytest.mark.parametrize(
+    "mode, port, enabled",
+    [
+        ("auto", "6543", False),
+        ("auto", "5432", True),
+        ("on", "6543", True),
+        ("off", "5432", False),
+    ],
+)
+def test_prepared_statements_setting(monkeypatch, mode, port, enabled):
+    monkeypatch.setattr(settings, "DB_PREPARED_STATEMENTS", mode)
+    monkeypatch.setattr(settings, "POSTGRES_PORT", port)
+    assert prepared_statements_enabled() is enabled
+
+
+def test_statement_placeholders():
+    assert STATEMENT.prepare_sql == (
+        'PREPARE select_trade AS SELECT * FROM "Trade" WHERE "id" = $1'
+    )
+    assert STATEMENT.execute_sql == "EXECUTE select_trade (%s)"
@@ -0,0 +1,51 @@
+import msgpack
+import pytest
+from app.services.result_store import (
+    FileResultBackend,
+    OrderSet,
+    ResultStore,
+    encode_order_set,
+)
+
+ORDERS = {
+    "A": [{"order_id": "1", "price": 10.5}, {"order_id": "2", "price": 11.0}],
+    "B": [{"order_id": "3", "price": 9.0}],
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultStore(FileResultBackend(str(tmp_path), ttl=3600))
+
+
+def test_round_trip_keeps_owner_and_orders(store):
+    key = store.put(ORDERS, owner="user-1")
+    order_set = store.get(key)
+
+    assert order_set.owner == "user-1"
+    assert sorted(order_set) == ["A", "B"]
+    assert order_set["A"] == ORDERS["A"]
+
+
+def test_keys_depend_on_orders_and_owner(store):
+    key = store.put(ORDERS, owner="user-1")
+
+    assert store.put(ORDERS, owner="user-1") == key
+    assert store.put(ORDERS, owner="user-2") != key
+
+
+def test_rejects_malformed_keys(store):
+    assert store.get("../etc/passwd") is None
+
+
+def test_rejects_sets_without_an_owner():
+    blob = msgpack.packb({"v": 1, "accounts": {}})
+
+    with pytest.raises(ValueError):
+        OrderSet(blob)
+
+
+def test_encoding_is_deterministic():
+    reordered = {"B": ORDERS["B"], "A": ORDERS["A"]}
+
+    assert encode_order_set(ORDERS, "u") == encode_order_set(reordered, "u")
@@ -0,0 +1,94 @@
+import zlib
+import msgpack
+from app.utils.serialization import (
+    FLAG_COMPRESSED,
+    FLAG_MSGPACK,
+    WireCodec,
+    columnar_orders,
+    decode_message,
+    encode_message,
+    from_columnar,
+    to_columnar,
+)
+
+ORDERS = [
+    {"order_id": "1", "price": 4500.25, "side": "B"},
+    {"order_id": "2", "price": 4501.0, "commission": 1.5},
+]
+MESSAGE = {"type": "order_updates", "seq": 3, "count": 2, "orders": ORDERS}
+
+
+def decode_wire(data):
+    """Decode a frame as a client would"""
+    if isinstance(data, str):
+        return decode_message(data)
+    flags, body = data[0], data[1:]
+    if flags & FLAG_COMPRESSED:
+        body = zlib.decompress(body)
+    if flags & FLAG_MSGPACK:
+        return msgpack.unpackb(body)
+    return decode_message(body)
+
+
+def test_message_round_trip():
+    message = {"type": "status", "message": "héllo", "nested": {"n": [1, 2.5]}}
+    assert decode_message(encode_message(message)) == message
+
+
+def test_columnar_round_trip_fills_missing_keys():
+    table = to_columnar(ORDERS)
+    assert table["columns"] == ["order_id", "price", "side", "commission"]
+    assert table["rows"][1] == ["2", 4501.0, None, 1.5]
+    assert from_columnar(table) == [
+        {"order_id": "1", "price": 4500.25, "side": "B", "commission": None},
+        {"order_id": "2", "price": 4501.0, "side": None, "commission": 1.5},
+    ]
+
+
+def test_columnar_orders_covers_orders_frames():
+    message = {"type": "orders", "data": {"A1": ORDERS, "status": "ok"}}
+    converted = columnar_orders(message)
+    assert from_columnar(converted["data"]["A1"])[0]["order_id"] == "1"
+    assert converted["data"]["status"] == "ok"
+    assert columnar_orders({"type": "status"}) == {"type": "status"}
+
+
+def test_plain_json_codec_is_passthrough():
+    text = encode_message(MESSAGE).decode("utf-8")
+    codec = WireCodec()
+    assert codec.is_plain_json
+    assert codec.encode(text) is text
+
+
+def test_codec_round_trips():
+    text = encode_message(MESSAGE).decode("utf-8")
+    for encoding in ("json", "msgpack"):
+        for compression in ("none", "zlib"):
+            codec = WireCodec.from_options(
+                {"encoding": encoding, "compression": compression}, 0
+            )
+            assert decode_wire(codec.encode(text)) == MESSAGE
+
+
+def test_columnar_codec_round_trip():
+    text = encode_message(MESSAGE).decode("utf-8")
+    codec = WireCodec.from_options({"order_layout": "columnar"}, 0)
+    decoded = decode_wire(codec.encode(text))
+    assert from_columnar(decoded["orders"])[0] == {**ORDERS[0], "commission": None}
+
+
+def test_small_frames_are_not_compressed():
+    text = encode_message({"type": "status"}).decode("utf-8")
+    codec = WireCodec.from_options({"compression": "zlib"}, 1024)
+    assert codec.encode(text) == text
+    msgpack_codec = WireCodec.from_options(
+        {"encoding": "msgpack", "compression": "zlib"}, 1024
+    )
+    assert msgpack_codec.encode(text)[0] == FLAG_MSGPACK
+
+
+def test_unsupported_options_fall_back_to_defaults():
+    codec = WireCodec.from_options(
+        {"encoding": "cbor", "compression": "brotli", "order_layout": "tree"}, 0
+    )
+    assert codec.is_plain_json
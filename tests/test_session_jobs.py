@@ -0,0 +1,66 @@
+import asyncio
+from app.services.websocket_service import (
+    ProcessManager,
+    SessionRelay,
+    WebSocketManager,
+    ws_manager,
+)
+
+LEADER = "leader"
+FOLLOWER = "follower"
+
+
+async def start_job(manager: ProcessManager, session_id: str) -> asyncio.Event:
+    finished = asyncio.Event()
+
+    async def job():
+        await finished.wait()
+
+    manager.spawn(session_id, job())
+    await asyncio.sleep(0)
+    return finished
+
+
+def test_abandoned_job_is_cancelled():
+    async def run():
+        manager = ProcessManager()
+        await start_job(manager, LEADER)
+        await manager._cancel_if_abandoned(LEADER, delay=60)
+        await asyncio.sleep(0)
+        return manager.status(LEADER)
+
+    status = asyncio.run(run())
+
+    assert status["status"] == "cancelled"
+    assert status["cancel_reason"] == "no clients connected"
+
+
+def test_followed_job_is_kept_running():
+    async def run():
+        manager = ProcessManager()
+        finished = await start_job(manager, LEADER)
+        ws_manager.relays[LEADER] = {FOLLOWER: SessionRelay(FOLLOWER)}
+        try:
+            await manager._cancel_if_abandoned(LEADER, delay=60)
+            await asyncio.sleep(0)
+            running = manager.is_running(LEADER)
+            rescheduled = LEADER in manager._pending_cancels
+        finally:
+            ws_manager.relays.pop(LEADER, None)
+            manager.keep_alive(LEADER)
+            finished.set()
+        return running, rescheduled
+
+    assert asyncio.run(run()) == (True, True)
+
+
+def test_unfollow_forgets_the_relay():
+    async def run():
+        manager = WebSocketManager()
+        await manager.store.open_session(LEADER)
+        await manager.follow(FOLLOWER, LEADER)
+        following = await manager.has_clients(LEADER)
+        await manager.unfollow(FOLLOWER, LEADER)
+        return following, await manager.has_clients(LEADER), manager.relays
+
+    assert asyncio.run(run()) == (True, False, {})
@@ -0,0 +1,162 @@
+import asyncio
+import pytest
+from app.services import singleflight
+from app.services.singleflight import SingleFlight, sync_key
+
+
+class FakeLeases:
+    """Redis leases as used by SingleFlight, with a controllable clock"""
+
+    is_initialized = True
+
+    def __init__(self):
+        self.now = 0.0
+        self.leases = {}  # key -> (owner, expires_at)
+
+    def _owner(self, key):
+        lease = self.leases.get(key)
+        if lease is None or lease[1] <= self.now:
+            self.leases.pop(key, None)
+            return None
+        return lease[0]
+
+    async def acquire_lease(self, key, owner, ttl):
+        current = self._owner(key)
+        if current is not None:
+            return current
+        self.leases[key] = (owner, self.now + ttl)
+        return None
+
+    async def release_lease(self, key, owner):
+        if self._owner(key) == owner:
+            del self.leases[key]
+
+    async def get_lease_owner(self, key):
+        return self._owner(key)
+
+
+class BrokenLeases(FakeLeases):
+    async def acquire_lease(self, key, owner, ttl):
+        raise ConnectionError("Redis is down")
+
+
+@pytest.fixture
+def leases(monkeypatch):
+    fake = FakeLeases()
+    monkeypatch.setattr(singleflight, "redis_manager", fake)
+    monkeypatch.setattr(singleflight, "FOLLOW_POLL_SECONDS", 0)
+    return fake
+
+
+KEY = sync_key("user-1", ["B", "A"], "2024-01-01")
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_sync_key_ignores_account_order():
+    assert KEY == sync_key("user-1", ["A", "B"], "2024-01-01")
+    assert KEY != sync_key("user-1", ["A"], "2024-01-01")
+    assert KEY != sync_key("user-2", ["A", "B"], "2024-01-01")
+
+
+def test_second_claim_follows_the_first(leases):
+    async def scenario():
+        flights = SingleFlight(lease_seconds=60)
+        leader = await flights.claim(KEY, "session", "s1")
+        follower = await flights.claim(KEY, "process", "p1")
+        return leader, follower
+
+    leader, follower = run(scenario())
+
+    assert leader.leader and not follower.leader
+    assert (follower.kind, follower.job_id) == ("session", "s1")
+
+
+def test_claim_on_another_worker_follows_the_lease(leases):
+    async def scenario():
+        first, second = SingleFlight(60), SingleFlight(60)
+        leader = await first.claim(KEY, "task", "t1")
+        follower = await second.claim(KEY, "session", "s2")
+        running = await second.is_running(follower)
+        await first.release(leader)
+        return follower, running, await second.is_running(follower)
+
+    follower, running, still_running = run(scenario())
+
+    assert not follower.leader
+    assert (follower.kind, follower.job_id) == ("task", "t1")
+    assert running and not still_running
+
+
+def test_release_lets_the_next_claim_lead(leases):
+    async def scenario():
+        flights = SingleFlight(60)
+        first = await flights.claim(KEY, "session", "s1")
+        await flights.release(first)
+        return await flights.claim(KEY, "session", "s2"), leases.leases
+
+    second, held = run(scenario())
+
+    assert second.leader and second.job_id == "s2"
+    assert held[singleflight.LEASE_KEY_PREFIX + KEY][0] == "session:s2"
+
+
+def test_followers_cannot_release(leases):
+    async def scenario():
+        flights = SingleFlight(60)
+        leader = await flights.claim(KEY, "session", "s1")
+        follower = await flights.claim(KEY, "session", "s2")
+        await flights.release(follower)
+        return await flights.is_running(leader)
+
+    assert run(scenario())
+
+
+def test_expired_lease_is_taken_over(leases):
+    async def scenario():
+        first, second = SingleFlight(60), SingleFlight(60)
+        stale = await first.claim(KEY, "session", "s1")
+        follower = await second.claim(KEY, "session", "s2")
+        leases.now += 61
+        expired = not await second.is_running(follower)
+        await second.wait(follower)
+        takeover = await second.claim(KEY, "session", "s2")
+        # The first worker finishing late must not drop the new lease
+        await first.release(stale)
+        return expired, takeover, await first.is_running(takeover)
+
+    expired, takeover, running = run(scenario())
+
+    assert expired
+    assert takeover.leader
+    assert running
+
+
+def test_wait_returns_once_released(leases):
+    async def scenario():
+        flights = SingleFlight(60)
+        leader = await flights.claim(KEY, "session", "s1")
+        follower = await flights.claim(KEY, "session", "s2")
+        waiter = asyncio.create_task(flights.wait(follower))
+        await asyncio.sleep(0)
+        waiting = not waiter.done()
+        await flights.release(leader)
+        await asyncio.wait_for(waiter, 1)
+        return waiting
+
+    assert run(scenario())
+
+
+def test_claims_locally_when_redis_fails(monkeypatch):
+    monkeypatch.setattr(singleflight, "redis_manager", BrokenLeases())
+
+    async def scenario():
+        flights = SingleFlight(60)
+        leader = await flights.claim(KEY, "session", "s1")
+        return leader, await flights.claim(KEY, "session", "s2")
+
+    leader, follower = run(scenario())
+
+    assert leader.leader and not follower.leader
@@ -0,0 +1,63 @@
+import pytest
+from app.services import task_progress
+from app.utils.serialization import decode_message
+
+
+class FakeRedis:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, channel, data):
+        self.published.append((channel, decode_message(data)))
+
+
+class FakeTask:
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.__dict__.update(attributes)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(task_progress, "_client", fake)
+    return fake
+
+
+def test_publishes_result_on_success(redis):
+    task_progress._on_task_postrun(
+        "t1", FakeTask("merge_orders"), {"success": True, "result_key": "k"}, "SUCCESS"
+    )
+
+    channel, event = redis.published[0]
+    assert channel == "task:progress:t1"
+    assert event["stage"] == "complete"
+    assert event["result"] == {"success": True, "result_key": "k"}
+
+
+def test_unsuccessful_result_is_a_failure(redis):
+    task_progress._on_task_postrun(
+        "t1", FakeTask("fetch_accounts"), {"success": False}, "SUCCESS"
+    )
+
+    assert redis.published[0][1]["stage"] == "failed"
+
+
+def test_tasks_can_keep_their_result_off_pubsub(redis):
+    orders = [{"order_id": i} for i in range(1000)]
+    task_progress._on_task_postrun(
+        "t2",
+        FakeTask("fetch_account_orders", publish_result=False),
+        {"account_id": "A", "orders": orders},
+        "SUCCESS",
+    )
+
+    event = redis.published[0][1]
+    assert event["stage"] == "complete"
+    assert "result" not in event
+
+
+def test_ignores_tasks_that_did_not_succeed(redis):
+    task_progress._on_task_postrun("t1", FakeTask("x"), None, "FAILURE")
+
+    assert redis.published == []
@@ -0,0 +1,66 @@
+import pytest
+from app.services.trade_query import (
+    InvalidCursorError,
+    TradeFilter,
+    build_query,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+def test_first_page_filters_by_user_only():
+    sql, args = build_query(TradeFilter("user-1"))
+
+    assert 'WHERE "userId" = $1 ORDER BY "entryDate" DESC, "id" DESC' in sql
+    assert "LIMIT" not in sql
+    assert args == ["user-1"]
+
+
+def test_filters_are_numbered_in_order():
+    trade_filter = TradeFilter("user-1", ["A1", "A2"], "ES", "2024-01-01", "2024-02-01")
+    sql, args = build_query(trade_filter)
+
+    assert (
+        '"userId" = $1 AND "accountNumber" = ANY($2::text[]) AND "instrument" = $3 '
+        'AND "entryDate" >= $4 AND "entryDate" < $5'
+    ) in sql
+    assert args == ["user-1", ["A1", "A2"], "ES", "2024-01-01", "2024-02-01"]
+
+
+def test_descending_cursor_continues_below_last_row():
+    sql, args = build_query(
+        TradeFilter("user-1"), after=("2024-01-05", "t9"), limit=101
+    )
+
+    assert '("entryDate", "id") < ($2, $3)' in sql
+    assert sql.endswith('ORDER BY "entryDate" DESC, "id" DESC LIMIT $4')
+    assert args == ["user-1", "2024-01-05", "t9", 101]
+
+
+def test_ascending_cursor_continues_above_last_row():
+    sql, _ = build_query(
+        TradeFilter("user-1", instrument="NQ"),
+        after=("2024-01-05", "t9"),
+        descending=False,
+    )
+
+    assert '("entryDate", "id") > ($3, $4)' in sql
+    assert sql.endswith('ORDER BY "entryDate" ASC, "id" ASC')
+
+
+def test_selects_requested_columns():
+    sql, _ = build_query(TradeFilter("user-1"), columns=("id", "pnl"))
+
+    assert sql.startswith('SELECT "id", "pnl" FROM "Trade"')
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2024-01-05T10:00:00+00:00", "t9")
+
+    assert decode_cursor(cursor) == ("2024-01-05T10:00:00+00:00", "t9")
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", encode_cursor("x", "y")[:-4]])
+def test_rejects_foreign_cursors(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
@@ -0,0 +1,77 @@
+import pytest
+from app.services.trade_query import TradeFilter
+from app.services.trade_stats import TradeColumns, TradeStatsService, compute_stats
+
+# (instrument, closeDate, pnl, commission, timeInPosition)
+RECORDS = [
+    ("ES", "2024-01-02", 100.0, 5.0, 60.0),
+    ("NQ", "2024-01-01", -50.0, 5.0, 120.0),
+    ("ES", "2024-01-03", -200.0, 5.0, 30.0),
+    ("ES", "2024-01-04", 80.0, None, None),
+]
+
+
+def test_totals_are_net_of_commission():
+    stats = compute_stats(TradeColumns.from_records(RECORDS))
+
+    assert stats["trades"] == 4
+    assert stats["wins"] == 2
+    assert stats["losses"] == 2
+    assert stats["win_rate"] == 0.5
+    assert stats["pnl"] == -70
+    assert stats["commission"] == 15
+    assert stats["net_pnl"] == -85
+    assert stats["gross_profit"] == 175
+    assert stats["gross_loss"] == 260
+    assert stats["profit_factor"] == pytest.approx(175 / 260)
+    assert stats["expectancy"] == -21.25
+    assert stats["largest_win"] == 95
+    assert stats["largest_loss"] == -205
+    assert stats["average_time_in_position"] == 52.5
+
+
+def test_drawdown_follows_closing_order():
+    # Net equity in closing order: -55, 40, -165, -85
+    stats = compute_stats(TradeColumns.from_records(RECORDS))
+
+    assert stats["max_drawdown"] == 205
+
+
+def test_per_instrument_breakdown():
+    instruments = compute_stats(TradeColumns.from_records(RECORDS))["instruments"]
+
+    assert set(instruments) == {"ES", "NQ"}
+    assert instruments["ES"]["trades"] == 3
+    assert instruments["ES"]["wins"] == 2
+    assert instruments["ES"]["net_pnl"] == -30
+    assert instruments["NQ"]["losses"] == 1
+    assert instruments["NQ"]["win_rate"] == 0
+
+
+def test_ratios_are_none_without_losses():
+    stats = compute_stats(TradeColumns.from_records(RECORDS[:1]))
+
+    assert stats["profit_factor"] is None
+    assert stats["average_loss"] is None
+    assert stats["largest_loss"] is None
+    assert stats["max_drawdown"] == 0
+
+
+def test_empty():
+    stats = compute_stats(TradeColumns.from_records([]))
+
+    assert stats["trades"] == 0
+    assert stats["win_rate"] is None
+    assert stats["expectancy"] is None
+    assert stats["max_drawdown"] == 0
+    assert stats["instruments"] == {}
+
+
+def test_cache_key_ignores_account_order():
+    first = TradeStatsService.cache_key(TradeFilter("user-1", ["B", "A"]), "1.0")
+    second = TradeStatsService.cache_key(TradeFilter("user-1", ["A", "B"]), "1.0")
+
+    assert first == second
+    assert first != TradeStatsService.cache_key(
+        TradeFilter("user-1", ["A", "B"]), "2.0"
+    )